@@ -2,5 +2,11 @@
 from .acquisition_data import NotebookAcquisitionData
 from .acquisition_loop import AcquisitionLoop
 from .acquisition_manager import AcquisitionManager
-from .analysis_data import AnalysisData, FigureProtocol
+from .analysis_data import AnalysisData, FigureProtocol, RasterizeOptions
 from .analysis_loop import AnalysisLoop
+from .bulk import LoadedRuns, load_many
+from .catalog import AcquisitionRecord, Catalog
+from .config_store import ConfigStore, inline_configs
+from .lazy_array import LazyArray, LazyReduction
+from .repack import RepackResult, repack_directory, repack_file, repack_files
+from .stack import StackedArray, stack
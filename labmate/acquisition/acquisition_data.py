@@ -1,11 +1,15 @@
 """Module that contains NotebookAcquisitionData class."""
 
-from typing import Dict, List, Optional, Union
+import time
+from typing import Dict, Iterable, List, Optional, Union
 
 from dh5 import DH5
+from dh5.errors import FileLockedError
 
 from ..logger import logger
+from ..utils import h5_utils
 from ..utils.file_read import read_files
+from .config_store import CONFIG_REFS_KEY, ConfigStore
 
 
 class NotebookAcquisitionData(DH5):
@@ -17,6 +21,7 @@ class NotebookAcquisitionData(DH5):
 
     _current_step: int
     _cells: Dict[int, Optional[str]]
+    _versions_to_bump: Iterable[str] = ()
 
     def __init__(
         self,
@@ -27,6 +32,7 @@ class NotebookAcquisitionData(DH5):
         save_on_edit: bool = True,
         save_files: bool = True,
         experiment_name: Optional[str] = None,
+        config_store: Optional[ConfigStore] = None,
     ):
         """Create file.
         This class is a DH5 object that saves code and config files.
@@ -46,6 +52,9 @@ class NotebookAcquisitionData(DH5):
              inside h5 file. Defaults to True.
             experiment_name (Optional[str], optional): Completely optional property for
              external use. Never used internally. Defaults to None.
+            config_store (ConfigStore, optional): If provided, configs are kept in the store and
+             only their references are saved under `config_refs` key. Files are not copied next
+             to the h5 file in this case. Defaults to None.
         """
         super().__init__(
             filepath=filepath,
@@ -58,6 +67,7 @@ class NotebookAcquisitionData(DH5):
             configs = read_files(configs)
 
         self._save_files = save_files
+        self._config_store = config_store
 
         self._config = configs
         self.save_configs()
@@ -76,7 +86,8 @@ class NotebookAcquisitionData(DH5):
         """Save the configuration files to the h5 file and possibly to files.
 
         If `save_files` during init was set to True, then it will create copy of the files near
-         the h5 file.
+         the h5 file. If `config_store` was set, the contents go to the store and only the
+         references are saved.
 
         Args:
             configs (dict[str, str], optional): Dictionary that contains config files with keys as
@@ -89,6 +100,10 @@ class NotebookAcquisitionData(DH5):
         if configs is None:
             return
 
+        if self._config_store is not None:
+            self[CONFIG_REFS_KEY] = self._config_store.put_many(configs)
+            return
+
         self["configs"] = configs
 
         if not self._save_files:
@@ -165,6 +180,51 @@ class NotebookAcquisitionData(DH5):
             self.save()
         return self
 
+    def save(
+        self,
+        only_update: Union[bool, Iterable[str]] = True,
+        filepath: Optional[str] = None,
+        force: Optional[bool] = None,
+    ):
+        """Save the data to the file and bump the versions of the saved keys.
+
+        Versions allow `AnalysisData.pull` to reload only the keys that were changed.
+        See `DH5.save` for the arguments.
+        """
+        if force is True or filepath is not None or only_update is False:
+            keys = set(self.keys())
+        elif only_update is True:
+            keys = set(self._last_update)
+        else:
+            keys = self._last_update.intersection(only_update)
+
+        # The versions are written by `_DH5__h5py_utils_save_dict_with_retry` below, i.e.
+        # inside the same opening of the file as the data.
+        self._versions_to_bump = keys
+        try:
+            super().save(only_update=only_update, filepath=filepath, force=force)
+        finally:
+            self._versions_to_bump = ()
+        return self
+
+    def _DH5__h5py_utils_save_dict_with_retry(self, filepath: str, data: dict):  # noqa: N802
+        """Replace the writer of `DH5.save`, so the versions are bumped in the same opening."""
+        for i in range(self._retry_on_file_locked_error):
+            try:
+                self._file_modified_time = h5_utils.save_dict(
+                    filepath + ".h5",
+                    data,
+                    key_prefix=self._key_prefix,
+                    versions=self._versions_to_bump,
+                )
+                return
+            except FileLockedError:
+                if self._raise_file_locked_error:
+                    raise
+                logger.info("File is locked. Waiting 1s and %d more retrying.", i)
+                time.sleep(1)
+        raise FileLockedError(f"Even after {self._retry_on_file_locked_error} data was not saved")
+
     @property
     def current_step(self):
         """Return the current step of the acquisition."""
@@ -1,34 +1,62 @@
 import os
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterable,
     List,
     NamedTuple,
     Optional,
+    Sequence,
     Tuple,
     Union,
 )
 
-from dh5 import jsn
 from dh5.path import Path
 
+from .. import utils
+from ..logger import logger
 from ..parsing.saving import append_values_from_modules_to_files
 from ..utils import get_timestamp
-from ..utils.file_read import read_file, read_files
+from ..utils.file_read import FileSnapshotCache, SnapshotCacheInfo, read_file, read_files  # noqa: F401
+from ..utils.json_file import JsonFile
 from .acquisition_data import NotebookAcquisitionData
+from .bulk import LoadedRuns, load_many
+from .catalog import AcquisitionRecord, Catalog
+from .config_store import ConfigStore
+from .layout import Layout, check_layout, find_existing, get_directory, reserve_filepath
+from .stack import DEFAULT_MAX_CACHE_SIZE, STACK_CACHE_DIRNAME, StackedArray, stack
 
 
 class AcquisitionTmpData(NamedTuple):
-    """Temporary data that stores inside temp.json."""
+    """Temporary data that stores inside temp.json.
+
+    With the config store (`config_store=True`), `configs` are replaced inside the file by
+    `config_refs`, i.e. the hashes of the config files kept in the store, so the file stays
+    small. Such files cannot be read by labmate versions that do not know `config_refs`.
+    """
 
     experiment_name: str
     time_stamp: str
     configs: Dict[str, str] = {}
     directory: Optional[Union[str, Path]] = None
+    config_refs: Dict[str, str] = {}
 
     def asdict(self):
         return self._asdict()  # pylint: disable=no-member
 
+    def slim(self, store: ConfigStore) -> "AcquisitionTmpData":
+        """Return a copy where configs are saved to the store and only referenced."""
+        if not self.configs:
+            return self
+        return self._replace(configs={}, config_refs=store.put_many(self.configs))
+
+    def resolve(self, store: ConfigStore) -> "AcquisitionTmpData":
+        """Return a copy where the referenced configs are read from the store."""
+        if self.configs or not self.config_refs:
+            return self
+        return self._replace(configs=store.resolve(self.config_refs), config_refs={})
+
 
 class AcquisitionManager:
     """AcquisitionManager."""
@@ -37,12 +65,16 @@ class AcquisitionManager:
     config_files: List[str] = []
     config_files_eval: Dict[str, str] = {}
     _configs_last_modified: List[float] = []
+    _config_snapshots: FileSnapshotCache
 
     _current_acquisition: Optional[NotebookAcquisitionData] = None
     _current_filepath: Optional[str] = None
 
     _save_files: bool = False
     _save_on_edit: bool = True
+    _use_config_store: bool = False
+    _layout: Layout = "flat"
+    _catalog: Optional[Catalog] = None
     _init_code = None
     _once_saved: bool
 
@@ -55,13 +87,22 @@ class AcquisitionManager:
         config_files: Optional[List[str]] = None,
         save_files: Optional[bool] = None,
         save_on_edit: Optional[bool] = None,
+        config_store: Optional[bool] = None,
+        catalog: Optional[bool] = None,
+        layout: Optional[Layout] = None,
     ):
         if save_files is not None:
             self._save_files = save_files
 
+        if config_store is not None:
+            self._use_config_store = config_store
+
         if save_on_edit is not None:
             self._save_on_edit = save_on_edit
 
+        if layout is not None:
+            self._layout = check_layout(layout)
+
         self._current_acquisition = None
         self._acquisition_tmp_data = None
         self._once_saved = False
@@ -69,6 +110,7 @@ class AcquisitionManager:
         self.config_files = []
         self.config_files_eval = {}
         self._configs_last_modified = []
+        self._config_snapshots = FileSnapshotCache()
 
         if data_directory is not None:
             self.data_directory = (
@@ -82,6 +124,13 @@ class AcquisitionManager:
             raise ValueError("No data directory specified")
 
         self.temp_file_path = self.data_directory / "temp.json"
+        self._temp_file = JsonFile(self.temp_file_path)
+        # Used only to resolve `config_refs` written by managers that use the config store.
+        self._temp_configs_store = ConfigStore.from_data_directory(self.data_directory)
+        self._temp_data_cache: Optional[Tuple[dict, AcquisitionTmpData]] = None
+
+        if catalog:
+            self._catalog = Catalog.from_data_directory(self.data_directory)
 
         if config_files is not None:
             self.set_config_file(config_files)
@@ -108,11 +157,165 @@ class AcquisitionManager:
         """
         self._data_directory = directory.makedirs()
 
+    @property
+    def config_store(self) -> Optional[ConfigStore]:
+        """Store of config files in `data_directory` if it's used, i.e. `config_store=True`.
+
+        With the store, every config file is kept once and acquisitions save only references.
+        """
+        if not self._use_config_store:
+            return None
+        return ConfigStore.from_data_directory(self.data_directory)
+
+    @property
+    def catalog(self) -> Optional[Catalog]:
+        """SQLite catalog of the acquisitions if it's used, i.e. `catalog=True`.
+
+        It's updated on every new and saved acquisition. See `rebuild_catalog` to add
+        the files that already exist.
+        """
+        return self._catalog
+
+    def rebuild_catalog(
+        self,
+        workers: Optional[int] = None,
+        full: bool = False,
+        progress: Optional[Callable[[int, int], Any]] = None,
+    ) -> int:
+        """Scan the data directory in parallel and update the catalog. See `Catalog.rebuild`.
+
+        The catalog is enabled if it was not.
+        """
+        if self._catalog is None:
+            self._catalog = Catalog.from_data_directory(self.data_directory)
+        return self._catalog.rebuild(workers=workers, full=full, progress=progress)
+
+    def find(
+        self,
+        name: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        **kwds,
+    ) -> List[AcquisitionRecord]:
+        """Find acquisitions in the catalog without opening the files.
+
+        Examples:
+            >>> aqm.find(name="^rabi", where={"qubit_freq": (">", 5e9), "readout_power": -30})
+
+        Args:
+            name (str, optional): Regular expression searched in the experiment name.
+            where (dict, optional): Conditions on the values of config parameters.
+            **kwds: Other arguments of `Catalog.query`, i.e. `useful`, `since`, `until`,
+                `with_params`.
+        """
+        if self._catalog is None:
+            raise ValueError(
+                "Catalog is not used. Create the manager with `catalog=True` "
+                "or call `rebuild_catalog()`."
+            )
+        return self._catalog.query(name=name, where=where, **kwds)
+
+    def _get_full_filename(self, filename: Union[str, Path]) -> str:
+        """Return the path to the file given by its name, e.g. `2024_01_01__00_00_00__name`."""
+        if filename is None:
+            raise ValueError("Filename cannot be None")
+
+        filepath = utils.get_path_from_filename(filename)
+        if isinstance(filepath, tuple):
+            return find_existing(os.path.join(self.data_directory, *filepath))  # noqa: PTH118
+        return filepath
+
+    def load_many(
+        self,
+        paths_or_query: Union[Iterable[Union[str, Path, AcquisitionRecord]], Dict[str, Any]],
+        keys: Sequence[str],
+        workers: Optional[int] = None,
+        use_processes: bool = False,
+    ) -> LoadedRuns:
+        """Read `keys` from many acquisitions in parallel and stack them along the run axis.
+
+        Examples:
+            >>> runs = aqm.load_many({"name": "^rabi", "since": "2024_05"}, keys=["x", "loop/y"])
+            >>> runs.data["loop/y"].mean(axis=0)
+            >>> runs.errors  # {path: reason} for the files that were skipped
+
+        Args:
+            paths_or_query: Files (paths, names or records of the catalog) or arguments
+                of `find`.
+            keys (Sequence[str]): Keys to read. Nested keys are given as "loop/y".
+            workers (int, optional): Number of threads (or processes). See `bulk.load_many`.
+            use_processes (bool): Read files in processes instead of threads.
+        """
+        filepaths = self.resolve_filepaths(paths_or_query)
+        return load_many(filepaths, keys, workers=workers, use_processes=use_processes)
+
+    def stack(
+        self,
+        key: str,
+        paths_or_query: Union[Iterable[Union[str, Path, AcquisitionRecord]], Dict[str, Any]],
+        max_cache_size: Optional[int] = DEFAULT_MAX_CACHE_SIZE,
+    ) -> StackedArray:
+        """Return one array of `key` over many acquisitions without loading them.
+
+        If the shapes match, the array is an HDF5 virtual dataset over the original files.
+        Otherwise the values are copied once, padded with NaN, to a memory-mapped file.
+        Both are kept in `data_directory/.stack_cache` until one of the files changes.
+        Older entries of the same key and files are then removed, as well as the least
+        recently used ones once the cache is bigger than `max_cache_size`.
+
+        Examples:
+            >>> signal = aqm.stack("loop/signal", {"name": "^rabi"})
+            >>> signal[:, 0]  # first point of every run
+            >>> signal.lazy().mean(axis=0).compute()
+
+        Args:
+            key (str): Key of the array. Nested keys are given as "loop/signal".
+            paths_or_query: Files (paths, names or records of the catalog) or arguments
+                of `find`.
+            max_cache_size (int, optional): Size of the cache in bytes. None for no limit.
+                Defaults to 4 GiB.
+        """
+        filepaths = self.resolve_filepaths(paths_or_query)
+        return stack(
+            key,
+            filepaths,
+            self.data_directory / STACK_CACHE_DIRNAME,
+            max_cache_size=max_cache_size,
+        )
+
+    def resolve_filepaths(
+        self,
+        paths_or_query: Union[Iterable[Union[str, Path, AcquisitionRecord]], Dict[str, Any]],
+    ) -> List[str]:
+        """Return the paths (without `.h5`) of the files given by paths, names or a query.
+
+        Args:
+            paths_or_query: Files (paths, names or records of the catalog) or arguments
+                of `find`, e.g. {"name": "^rabi", "since": "2024_05"}.
+        """
+        if isinstance(paths_or_query, dict):
+            paths_or_query = self.find(**paths_or_query)
+        return [
+            path.path if isinstance(path, AcquisitionRecord) else self._get_full_filename(path)
+            for path in paths_or_query
+        ]
+
+    def _update_catalog(self, acquisition: Optional[NotebookAcquisitionData]):
+        if self._catalog is None or acquisition is None or acquisition.filepath is None:
+            return
+        filepath = acquisition.filepath + ".h5"
+        if not os.path.exists(filepath):  # noqa: PTH110
+            return
+        try:
+            self._catalog.add_file(filepath)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Cannot update the catalog due to %r", error)
+
     @property
     def acquisition_tmp_data(self) -> AcquisitionTmpData:
         """Return information about the current acquisition.
 
         Returns class attribute or read it from temp.json file if first is not set.
+        The file is parsed again only if it was changed, e.g. by another kernel.
         Returns:
             AcquisitionTmpData(NamedTuple):
                 experiment_name: current experiment name
@@ -120,15 +323,36 @@ class AcquisitionManager:
                 configs: dict of configurations files to save
                 directory: directory where the data is stored
         """
-        acquisition_tmp_data = self._acquisition_tmp_data or self.get_temp_data(self.temp_file_path)
+        acquisition_tmp_data = self._acquisition_tmp_data or self._read_temp_data()
         if acquisition_tmp_data is None:
             raise ValueError("You should create a new acquisition. It will create temp.json file.")
         return acquisition_tmp_data
 
+    def _read_temp_data(self) -> Optional[AcquisitionTmpData]:
+        data = self._temp_file.read()
+        if data is None:
+            return None
+        # The same dict is returned while temp.json is unchanged, so configs are resolved once.
+        if self._temp_data_cache is None or self._temp_data_cache[0] is not data:
+            self._temp_data_cache = (
+                data,
+                AcquisitionTmpData(**data).resolve(self._temp_configs_store),
+            )
+        return self._temp_data_cache[1]
+
     @acquisition_tmp_data.setter
     def acquisition_tmp_data(self, dic: AcquisitionTmpData) -> None:
-        """Save AcquisitionTmpData to json file and to class attribute."""
-        jsn.write(self.temp_file_path, dic.asdict())
+        """Save AcquisitionTmpData to json file and to class attribute.
+
+        The file is replaced at once under a lock, so other kernels never read it half written.
+        With the config store, config files are saved to it and the file keeps only their
+        hashes. Otherwise the file has the full configs, as written by older versions.
+        """
+        store = self.config_store
+        data = (dic.slim(store) if store is not None else dic).asdict()
+        if not data["config_refs"]:
+            del data["config_refs"]
+        self._temp_file.write(data)
         self._acquisition_tmp_data = dic
 
     def __setitem__(self, __key: str, __value) -> None:
@@ -178,28 +402,44 @@ class AcquisitionManager:
             with open(experiment_path / "init_analyse.py", "w", encoding="utf-8") as file:
                 file.write(self._init_code)
 
-        filepath_original = filepath = experiment_path / f"{dic.time_stamp}__{dic.experiment_name}"
+        directory = get_directory(experiment_path, dic.time_stamp, self._layout)
+        if not directory.exists():
+            directory.makedirs()
+        filepath = directory / f"{dic.time_stamp}__{dic.experiment_name}"
 
         # If ignore existence is True, no check is required
         if ignore_existence:
             return filepath
-        # If the file already exists, add a suffix to the name
-        index = 1
-        while (filepath + ".h5").exists():
-            filepath = filepath_original + f"__{index}"
-            index += 1
-
-        return filepath
+        # The file is created at once, so the name is unique even between processes.
+        # If it's taken, a suffix is added to the name.
+        return reserve_filepath(filepath)
 
     @staticmethod
     def get_temp_data(path: Path) -> Optional[AcquisitionTmpData]:
-        if not Path(path).exists():
+        data = JsonFile(path).read()
+        if data is None:
             return None
-        return AcquisitionTmpData(**jsn.read(path))
+        store = ConfigStore.from_data_directory(Path(path).parent)
+        return AcquisitionTmpData(**data).resolve(store)
 
     def _get_configs_last_modified(self) -> List[float]:
         return [Path(file).stat().st_mtime for file in self.config_files]
 
+    def _read_configs(self) -> Dict[str, str]:
+        """Read config files and append values from evaluation modules.
+
+        Only the files which modification time or size changed are read again. The
+        annotation with module values is cached as well, see `append_values_from_module_to_file`.
+        """
+        configs = self._config_snapshots.read_files(self.config_files)
+        if self.config_files_eval:
+            configs = append_values_from_modules_to_files(configs, self.config_files_eval)
+        return configs
+
+    def config_cache_info(self) -> SnapshotCacheInfo:
+        """Return hits and misses of the cache of config files."""
+        return self._config_snapshots.cache_info()
+
     def new_acquisition(
         self, name: str, cell: Optional[str] = None, save_on_edit: Optional[bool] = None
     ) -> NotebookAcquisitionData:
@@ -207,12 +447,9 @@ class AcquisitionManager:
         self._current_acquisition = None
         self._once_saved = False
         self.cell = cell
-        configs = read_files(self.config_files)
+        configs = self._read_configs()
         self._configs_last_modified = self._get_configs_last_modified()
 
-        if self.config_files_eval:
-            configs = append_values_from_modules_to_files(configs, self.config_files_eval)
-
         dic = AcquisitionTmpData(
             experiment_name=name,
             time_stamp=get_timestamp(),
@@ -223,6 +460,7 @@ class AcquisitionManager:
         self.acquisition_tmp_data = dic
 
         self._current_acquisition = self.get_acquisition(replace=True, save_on_edit=save_on_edit)
+        self._update_catalog(self._current_acquisition)
 
         return self.current_acquisition
 
@@ -233,10 +471,7 @@ class AcquisitionManager:
         save_on_edit: Optional[bool] = None,
     ) -> NotebookAcquisitionData:
         """Create a new acquisition with the given experiment name."""
-        configs = read_files(self.config_files)
-
-        if self.config_files_eval:
-            configs = append_values_from_modules_to_files(configs, self.config_files_eval)
+        configs = self._read_configs()
 
         if name is None:
             name = self.current_experiment_name + "_item"
@@ -252,14 +487,17 @@ class AcquisitionManager:
         configs = configs if configs else None
         save_on_edit = save_on_edit if save_on_edit is not None else self._save_on_edit
 
-        return NotebookAcquisitionData(
+        acquisition = NotebookAcquisitionData(
             filepath=str(filepath),
             configs=configs,
             cell=cell or self.cell,
             overwrite=False,
             save_on_edit=save_on_edit,
             save_files=self._save_files,
+            config_store=self.config_store,
         )
+        self._update_catalog(acquisition)
+        return acquisition
 
     @property
     def current_acquisition(self) -> NotebookAcquisitionData:
@@ -300,6 +538,7 @@ class AcquisitionManager:
             overwrite=replace,
             save_on_edit=save_on_edit,
             save_files=self._save_files,
+            config_store=self.config_store,
             experiment_name=acquisition_tmp_data.experiment_name,
         )
 
@@ -321,4 +560,5 @@ class AcquisitionManager:
         if acq_data.save_on_edit is False:
             acq_data.save()
         self._once_saved = True
+        self._update_catalog(acq_data)
         return self
@@ -2,15 +2,51 @@
 
 import json
 import os
-from typing import List, Literal, Optional, Protocol, Tuple, TypedDict, TypeVar, Union
-
+import pickle
+import sys
+import tempfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypedDict,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
 from dh5 import DH5
 from dh5.path import Path
 
 from .. import utils
 from ..logger import logger
+from ..utils import h5_utils
 from .analysis_loop import AnalysisLoop
 from .config_file import ConfigFile
+from .config_store import CONFIG_REFS_KEY, resolve_config_refs
+from .figure_saver import (
+    VECTOR_FORMATS,
+    dumps_figure,
+    figure_saver,
+    fingerprint_figure,
+    rasterized_heavy_artists,
+    snapshot_figure,
+    write_thumbnail,
+)
+from .layout import find_existing
+from .lazy_array import LazyArray
 
 
 _T = TypeVar("_T", bound="AnalysisData")
@@ -30,6 +66,224 @@ class PdfMetadataDict(TypedDict, total=False):
     Keywords: Union[str, dict]
 
 
+def _get_nbytes(value: Any) -> int:
+    """Estimate the memory used by the value loaded from h5 file."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_get_nbytes(sub_value) for sub_value in value.values())
+    return sys.getsizeof(value)
+
+
+def _read_only_view(value: Any) -> Optional[np.ndarray]:
+    """Return a read-only view of a numeric array. None if the value is not such an array."""
+    if isinstance(value, list):
+        value = np.asarray(value)
+        if value.dtype.kind not in "biuf":
+            return None
+    if not isinstance(value, np.ndarray) or value.dtype.kind not in "biufc":
+        return None
+    view = np.asarray(value).view()
+    view.flags.writeable = False
+    return view
+
+
+def _get_shareable_arrays(acquisition: DH5) -> dict:
+    """Return read-only views of the arrays and loops that are saved to the file as they are.
+
+    Returns nothing if the file was modified after the last save made by the acquisition.
+    """
+    values = acquisition.asdict()
+    last_saved = max(
+        [acquisition._file_modified_time]  # pylint: disable=protected-access
+        + [getattr(value, "_file_modified_time", 0) for value in values.values()]
+    )
+    if os.path.getmtime(acquisition.filepath + ".h5") > last_saved:  # noqa: PTH204
+        return {}
+
+    not_saved = acquisition._last_update  # pylint: disable=protected-access
+    shared = {}
+    for key, value in values.items():
+        if key in not_saved:
+            continue
+        if isinstance(value, DH5):  # AcquisitionLoop
+            # In save_on_edit mode every change is written to the file immediately.
+            if not value.save_on_edit and value._last_update:  # pylint: disable=W0212
+                continue
+            loop = {sub_key: _read_only_view(sub_value) for sub_key, sub_value in value.items()}
+            if loop and all(view is not None for view in loop.values()):
+                shared[key] = loop
+        else:
+            view = _read_only_view(value)
+            if view is not None:
+                shared[key] = view
+    return shared
+
+
+class RasterizeOptions(NamedTuple):
+    """Artists with more than `threshold` points are rasterized at `dpi` in vector files."""
+
+    threshold: int = 100_000
+    dpi: float = 300
+
+
+def _write_fig(
+    fig: FigureProtocol,
+    filenames: Sequence[str],
+    metadata: Optional[PdfMetadataDict] = None,
+    rasterize: Optional[RasterizeOptions] = None,
+    **kwargs,
+):
+    """Write the figure to every file. Metadata is added only to pdf files.
+
+    If writing fails, the files are removed, so they are not mistaken for the new figure.
+    """
+    with ExitStack() as stack:
+        rasterized = (
+            stack.enter_context(rasterized_heavy_artists(fig, rasterize.threshold))
+            if rasterize is not None
+            else None
+        )
+        try:
+            for filename in filenames:
+                file_kwargs = kwargs
+                if rasterized and filename.rsplit(".", 1)[-1].lower() in VECTOR_FORMATS:
+                    file_kwargs = {"dpi": rasterize.dpi, **kwargs}  # type: ignore
+                if metadata is None or not filename.endswith(".pdf"):
+                    fig.savefig(filename, **file_kwargs)
+                else:
+                    _write_pdf_with_metadata(fig, filename, metadata, **file_kwargs)
+        except Exception:
+            for filename in filenames:
+                if os.path.exists(filename):  # noqa: PTH110
+                    os.remove(filename)  # noqa: PTH107
+            raise
+
+
+def _write_pdf_with_metadata(
+    fig: FigureProtocol, filename: str, metadata: PdfMetadataDict, **kwargs
+):
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    pdf_fig = PdfPages(filename)
+    fig.savefig(pdf_fig, format="pdf", **kwargs)  # type: ignore
+    metadata = PdfMetadataDict(**metadata)
+    if not isinstance(metadata.get("Subject", ""), str):
+        metadata["Subject"] = json.dumps(metadata.get("Subject"))
+
+    if not isinstance(metadata.get("Keywords", ""), str):
+        metadata["Keywords"] = json.dumps(metadata.get("Keywords"))
+
+    pdf_metadata = pdf_fig.infodict()
+    pdf_metadata.update(metadata)
+    pdf_fig.close()
+
+
+FIGURE_FORMAT_VERSION = 2
+# Prefixes of the rcParams used by the backend that writes the files of an extension.
+_BACKEND_RC_PARAMS = {"pdf": "pdf.", "svg": "svg.", "ps": "ps.", "eps": "ps.", "pgf": "pgf."}
+_FIGURE_FIELDS = frozenset(("format", "data", "matplotlib", "format_version", "pickle"))
+
+
+class StoredFigure(NamedTuple):
+    """Figure saved inside the h5 file by `save_fig(..., inside_h5=True)`.
+
+    The figure is kept as the bytes of the file that `save_fig` would have written (e.g.
+    pdf), so it can be opened without matplotlib or with any version of it. If it was saved
+    with several extensions, every format is stored and one of them is returned.
+
+    Attributes:
+        name (str): Key of the figure inside `figures`, e.g. `FIG_abc`.
+        format (str): Format of the file, e.g. "pdf" or "png".
+        data (bytes): Content of the file.
+        matplotlib (str): Version of matplotlib that saved the figure, if any.
+    """
+
+    name: str
+    format: str
+    data: bytes
+    matplotlib: str = ""
+
+    def save(self, filepath: Union[str, Path]) -> str:
+        """Write the figure to a file. The extension is added if it's not given."""
+        filepath = str(filepath)
+        if not filepath.endswith("." + self.format):
+            filepath += "." + self.format
+        with open(filepath, "wb") as file:
+            file.write(self.data)
+        return filepath
+
+    def __repr__(self) -> str:
+        return (
+            f"StoredFigure(name={self.name!r}, format={self.format!r}, size={len(self.data)} bytes)"
+        )
+
+    def _repr_png_(self) -> Optional[bytes]:
+        return self.data if self.format == "png" else None
+
+    def _repr_svg_(self) -> Optional[str]:
+        return self.data.decode() if self.format == "svg" else None
+
+
+def _matplotlib_version() -> str:
+    module = sys.modules.get("matplotlib")
+    return getattr(module, "__version__", "")
+
+
+def _decode_figure(
+    name: str, value: Any, allow_pickle: bool = False, extension: Optional[str] = None
+) -> Any:
+    """Load a figure saved by `save_fig` inside h5 file.
+
+    Figures are returned as `StoredFigure` of the format `extension` (defaults to the first
+    extension given to `save_fig`). With `allow_pickle`, the matplotlib figure pickled next
+    to it is returned instead. Figures saved by old versions as pltsave json need
+    `pltsave.loads` to be opened.
+    """
+    if isinstance(value, dict) and "format" in value:
+        if not allow_pickle or "pickle" not in value:
+            fig_format = str(value["format"]) if extension is None else extension.lstrip(".")
+            # Before version 2, only one format was saved under `data`.
+            formats = {str(value["format"]): value["data"]} if "data" in value else value
+            if fig_format in _FIGURE_FIELDS or fig_format not in formats:
+                saved = [key for key in formats if key not in _FIGURE_FIELDS]
+                raise KeyError(
+                    f"Figure {name} is not saved as '{fig_format}'. Saved formats are: {saved}"
+                )
+            return StoredFigure(
+                name,
+                fig_format,
+                np.asarray(formats[fig_format], dtype=np.uint8).tobytes(),
+                str(value.get("matplotlib", "")),
+            )
+        saved_with = str(value.get("matplotlib", ""))
+        if saved_with != _matplotlib_version():
+            logger.warning(
+                "Figure %s was pickled by matplotlib %s, so it may not load with %s.",
+                name,
+                saved_with or "unknown",
+                _matplotlib_version() or "no matplotlib",
+            )
+        value = value["pickle"]
+    elif isinstance(value, np.ndarray) and value.dtype == np.uint8 and not allow_pickle:
+        raise ValueError(
+            f"Figure {name} was saved only as pickle. Pickles can run any code and depend on "
+            "the matplotlib version, so open it with `allow_pickle=True` only if the file "
+            "is trusted."
+        )
+    if isinstance(value, np.ndarray) and value.dtype == np.uint8:
+        return pickle.loads(zlib.decompress(value.tobytes()))  # noqa: S301
+    import pltsave
+
+    loads = getattr(pltsave, "loads", None)
+    if loads is None:
+        raise ValueError(
+            "This figure was saved as pltsave json. Install pltsave version with `loads` "
+            "function to open it."
+        )
+    return loads(value)
+
+
 class AnalysisData(DH5):
     """A subclass of DH5 that provides additional functionality for analyzing data.
 
@@ -51,6 +305,9 @@ class AnalysisData(DH5):
         save_files (bool): Whether to save files.
         save_on_edit (bool): Whether to save on edit.
         save_fig_inside_h5 (bool): Whether to save the figure inside the h5 file.
+        save_fig_pickle (bool): Whether to save the pickle of the figure inside the h5 file too.
+        save_fig_async (bool): Whether to save the figures in background by default.
+        save_thumbnails (bool): Whether to save a small png preview near every figure.
 
     Examples:
         >>> DH5(PATH, 'w').update(x=5).save() # create some data
@@ -72,6 +329,7 @@ class AnalysisData(DH5):
 
     _figure_last_name = None
     _figure_saved = False
+    _configs_in_store = False
     _fig_index = 0
     _default_parse_config_str_max_length = 60
 
@@ -83,6 +341,10 @@ class AnalysisData(DH5):
         save_on_edit: bool = True,
         save_fig_inside_h5: bool = False,
         open_on_init: Optional[bool] = None,
+        cache_size: Optional[int] = None,
+        save_fig_async: bool = False,
+        save_thumbnails: bool = False,
+        save_fig_pickle: bool = False,
     ):
         """Load data from a filepath and lock it to prevent any changes.
 
@@ -94,15 +356,36 @@ class AnalysisData(DH5):
             save_on_edit (bool): Whether to save as soon as any changes are made.
             save_fig_inside_h5 (bool): Whether to save the figure inside the h5 file instead of
                 a file in the same directory. Default to False, i.e. creates a separate image file.
+            open_on_init (bool, optional): Whether to load all the data on init. If False, every
+                key is loaded only when it's accessed.
+            cache_size (int, optional): Maximum size in bytes of the data loaded from the file.
+                Least recently used keys are unloaded above it and reloaded on the next access.
+                Defaults to no limit.
+            save_fig_async (bool): Whether `save_fig` saves the figures in background by default.
+            save_thumbnails (bool): Whether `save_fig` also saves `(...)_FIG_name_thumb.png`
+                preview by default. It's generated in background.
+            save_fig_pickle (bool): Whether figures saved inside the h5 file also keep the
+                pickle of the matplotlib figure, so `open_figs(allow_pickle=True)` can edit
+                them again. Pickles are big and depend on the matplotlib version, so it's
+                False by default.
         """
         if filepath is None:
             raise ValueError("You must specify filepath")
         filepath = str(filepath)
         filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+        # The file could be in the other layout of the data directory, see `layout`.
+        filepath = find_existing(filepath)
 
         if not os.path.exists(filepath):
             raise ValueError(f"File '{filepath}' does not exist.")
 
+        # Loops are detected from the file structure, so the data itself is not read.
+        structure = self._get_structure(filepath)
+        self._loop_keys = structure.loop_keys
+        self._versions = structure.versions
+        self._cache_size = cache_size
+        self._cached_keys: "OrderedDict[str, int]" = OrderedDict()
+
         super().__init__(
             filepath=filepath,
             overwrite=False,
@@ -110,22 +393,22 @@ class AnalysisData(DH5):
             save_on_edit=save_on_edit,
             open_on_init=open_on_init,
         )
+        if self._configs_in_store and "configs" not in self:
+            self._keys.add("configs")
+            self._unopened_keys.add("configs")
 
         self.lock_data()
 
         self._save_files = save_files
         self._save_fig_inside_h5 = save_fig_inside_h5
+        self._save_fig_async = save_fig_async
+        self._save_thumbnails = save_thumbnails
+        self._save_fig_pickle = save_fig_pickle
 
-        self._default_config_files: Tuple[str, ...] = ()
-        if "info" in self and "default_config_files" in self["info"]:
-            self._default_config_files = tuple(self["info"]["default_config_files"])
+        self._default_config_files: Optional[Tuple[str, ...]] = None
 
         self._reset_attrs()
 
-        for key, value in self.items():
-            if isinstance(value, dict) and value.get("__loop_shape__") is not None:
-                self._update({key: AnalysisLoop(value)})
-
         self._analysis_cell = cell
 
         self.save_analysis_cell()
@@ -135,6 +418,98 @@ class AnalysisData(DH5):
         self._figure_saved = False
         self._parsed_configs = {}
 
+    def _get_structure(self, filepath: str) -> h5_utils.FileStructure:
+        """Read the structure of the file. `configs` is added if it's kept in the config store."""
+        structure = h5_utils.get_structure(filepath)
+        self._configs_in_store = (
+            CONFIG_REFS_KEY in structure.keys and "configs" not in structure.keys
+        )
+        if self._configs_in_store:
+            structure.keys.add("configs")
+            if CONFIG_REFS_KEY in structure.versions:
+                structure.versions["configs"] = structure.versions[CONFIG_REFS_KEY]
+        return structure
+
+    def _load_from_h5(self, filepath: Optional[str] = None, key=None) -> Set[str]:
+        """Load keys from the file, convert loops to `AnalysisLoop` and keep the cache size.
+
+        If configs are kept in the config store, `configs` is resolved from `config_refs`.
+        """
+        if self._configs_in_store and key is not None:
+            key = {key} if isinstance(key, str) else set(key)
+            if "configs" in key:
+                key = (key - {"configs"}) | {CONFIG_REFS_KEY}
+        loaded_keys = super()._load_from_h5(filepath=filepath, key=key)
+        if self._configs_in_store and CONFIG_REFS_KEY in loaded_keys:
+            refs = dict(self._data[CONFIG_REFS_KEY])
+            configs = resolve_config_refs(filepath or self._filepath, refs)
+            self._update({"configs": configs})
+            loaded_keys.add("configs")
+        for loaded_key in loaded_keys:
+            value = self._data[loaded_key]
+            if loaded_key in self._loop_keys and isinstance(value, dict):
+                self._data[loaded_key] = AnalysisLoop(value)
+            self._cached_keys[loaded_key] = _get_nbytes(value)
+            self._cached_keys.move_to_end(loaded_key)
+        self._shrink_cache(keep=loaded_keys)
+        return loaded_keys
+
+    def _shrink_cache(self, keep: Set[str]):
+        """Unload the least recently used keys until the cache fits into `cache_size`."""
+        if self._cache_size is None:
+            return
+        total_size = sum(self._cached_keys.values())
+        for key in list(self._cached_keys):
+            if total_size <= self._cache_size:
+                break
+            if key in keep or key in self._last_update or key not in self._data:
+                continue
+            total_size -= self._cached_keys.pop(key)
+            self.close_data(key)
+
+    def __get_data__(self, key: str, default: Any = None):
+        if key in self._cached_keys:
+            self._cached_keys.move_to_end(key)
+        value = self._data.get(key)
+        if isinstance(value, np.ndarray) and not value.flags.writeable:
+            return value  # already protected, so no need to copy
+        return super().__get_data__(key, default)
+
+    def __get_data_or_raise__(self, key: str):
+        if key in self._cached_keys:
+            self._cached_keys.move_to_end(key)
+        value = self._data.get(key)
+        if isinstance(value, np.ndarray) and not value.flags.writeable:
+            return value
+        return super().__get_data_or_raise__(key)
+
+    @classmethod
+    def from_acquisition(cls: Type[_T], acquisition: DH5, /, **kwds) -> _T:
+        """Open the file of an acquisition reusing the arrays that it holds in memory.
+
+        Arrays and loops that were saved and not modified since are shared with the
+        acquisition as read-only views instead of being read again from the file. Other keys
+        are loaded from the file on access. If the file was modified by someone else after
+        the last save of the acquisition, nothing is shared.
+
+        Args:
+            acquisition (DH5): Saved acquisition, e.g. `NotebookAcquisitionData`.
+            **kwds: Arguments for `AnalysisData`. `open_on_init` defaults to False.
+        """
+        if acquisition.filepath is None:
+            raise ValueError("Acquisition should be saved to a file before analysing it.")
+        shared = _get_shareable_arrays(acquisition)
+        kwds.setdefault("open_on_init", False)
+        data = cls(acquisition.filepath, **kwds)
+        for key, value in shared.items():
+            if key not in data._unopened_keys:  # pylint: disable=protected-access
+                continue
+            if key in data._loop_keys:  # pylint: disable=protected-access
+                value = AnalysisLoop(value)
+            data._update({key: value})  # pylint: disable=protected-access
+            data._cached_keys[key] = 0  # pylint: disable=protected-access
+        return data
+
     def save_analysis_cell(
         self: _T,
         code: Optional[Union[str, Literal["none"]]] = None,
@@ -176,63 +551,344 @@ class AnalysisData(DH5):
         self: _T,
         fig: Optional[FigureProtocol] = None,
         name: Optional[Union[str, int]] = None,
-        extensions: Optional[str] = None,
+        extensions: Optional[Union[str, Sequence[str]]] = None,
         tight_layout: bool = True,
         metadata: Optional[PdfMetadataDict] = None,
+        asynchronous: Optional[bool] = None,
+        skip_unchanged: bool = True,
+        performance: Optional[Literal["auto"]] = None,
+        rasterize: Optional[RasterizeOptions] = None,
+        thumbnail: Optional[bool] = None,
         **kwargs,
     ) -> _T:
         """Save the figure with the filename (...)_FIG_name.
 
         If name is None, use (...)_FIG1, (...)_FIG2.
         pdf is used by default if no extension is provided in name
+
+        Several extensions can be given, e.g. `extensions=("pdf", "png")`. The layout is then
+        computed once and every file has the same name (and FIG index) but the extension.
+        `metadata` is added only to the pdf file. Inside h5 file (`inside_h5=True`), every
+        format is stored under `figures/FIG_name/<extension>`.
+
+        If `asynchronous` is True (defaults to `save_fig_async` given on init), a copy of the
+        figure is saved in background. Use `wait_figures` to wait until it is written.
+
+        If `skip_unchanged` is True, the files are not written again when the figure, the
+        analysis cell and the saving options are the same as the last time the figure with
+        this name was saved.
+
+        With `performance="auto"`, lines and collections with a lot of points (e.g. big
+        scatters or pcolormesh) are rasterized in vector files, while axes and texts stay
+        vectors. The threshold and the dpi are given by `rasterize` (see `RasterizeOptions`).
+
+        If `thumbnail` is True (defaults to `save_thumbnails` given on init), a small png
+        preview `(...)_FIG_name_thumb.png` is generated in background from a copy of the figure.
         """
+        self._save_fig(
+            fig=fig,
+            name=name,
+            extensions=extensions,
+            tight_layout=tight_layout,
+            metadata=metadata,
+            asynchronous=asynchronous,
+            skip_unchanged=skip_unchanged,
+            performance=performance,
+            rasterize=rasterize,
+            thumbnail=thumbnail,
+            **kwargs,
+        )
+        return self
+
+    def save_fig_async(
+        self,
+        fig: Optional[FigureProtocol] = None,
+        name: Optional[Union[str, int]] = None,
+        extensions: Optional[Union[str, Sequence[str]]] = None,
+        **kwargs,
+    ) -> "Future":
+        """Same as `save_fig(..., asynchronous=True)`, but returns the future of the saving."""
+        return self._save_fig(
+            fig=fig, name=name, extensions=extensions, asynchronous=True, **kwargs
+        )
+
+    def _save_fig(
+        self,
+        fig: Optional[FigureProtocol] = None,
+        name: Optional[Union[str, int]] = None,
+        extensions: Optional[Union[str, Sequence[str]]] = None,
+        tight_layout: bool = True,
+        metadata: Optional[PdfMetadataDict] = None,
+        asynchronous: Optional[bool] = None,
+        skip_unchanged: bool = True,
+        performance: Optional[Literal["auto"]] = None,
+        rasterize: Optional[RasterizeOptions] = None,
+        thumbnail: Optional[bool] = None,
+        **kwargs,
+    ) -> "Future":
         self._figure_last_name = str(name).lstrip("_") if name is not None else None
 
-        fig_name = self._get_fig_name(name, extensions)
-        full_fig_name = f"{self.filepath}_{fig_name}"
+        if extensions is None or isinstance(extensions, str):
+            extensions = (extensions,)  # type: ignore
+        fig_name = self._get_fig_name(name, extensions[0])  # type: ignore
+        fig_names = [fig_name]
+        if name is None or Path(str(name)).suffix == "":
+            fig_names.extend(
+                str(Path(fig_name).with_suffix("." + extension.lstrip(".")))
+                for extension in extensions[1:]  # type: ignore
+            )
+        full_fig_names = [f"{self.filepath}_{suffix}" for suffix in dict.fromkeys(fig_names)]
         if fig is None:
             from matplotlib import pyplot as plt
 
             fig = plt.gcf()
 
-        if (self._save_fig_inside_h5 and kwargs.get("inside_h5", True)) or kwargs.get(
-            "inside_h5", False
-        ):
-            try:
-                raise NotImplementedError("save_fig_inside_h5 is not implemented for the moment.")
-                # import pltsave
-
-                # data = pltsave.dumps(fig).to_json()
-                # self[f"figures/{fig_name}"] = data
-                # self.save([f"figures/{fig_name}"])
-            except Exception as error:
-                logger.exception("Failed to save the figure inside h5 file due to %s", error)
+        fig_stem = fig_name.rsplit(".", 1)[0]
+        inside_h5 = kwargs.pop("inside_h5", None)
+        if inside_h5 is None:
+            inside_h5 = self._save_fig_inside_h5
+        with_pickle = kwargs.pop("pickle", None)
+        if with_pickle is None:
+            with_pickle = self._save_fig_pickle
+        if thumbnail is None:
+            thumbnail = self._save_thumbnails
+        thumbnail_name = f"{self.filepath}_{fig_stem}_thumb.png" if thumbnail else None
+
+        if metadata is not None and not any(name.endswith(".pdf") for name in full_fig_names):
+            raise ValueError("Metadata can be added only to pdf files.")
+
+        if performance == "auto":
+            rasterize = rasterize or RasterizeOptions()
+        elif performance is not None:
+            raise ValueError(f"Unknown performance mode '{performance}'. Use 'auto' or None.")
+        else:
+            rasterize = None
+
+        self._figure_saved = True
+
+        done: "Future" = Future()
+        done.set_result(None)
+
+        # The figure is fingerprinted before `tight_layout`, since it's not idempotent.
+        fingerprint_key = f"figures_fingerprints/{fig_stem}"
+        fingerprint_options = {"rasterize": rasterize, "tight_layout": tight_layout, **kwargs}
+        fingerprint = (
+            self._get_fig_fingerprint(fig, full_fig_names, metadata, fingerprint_options)
+            if skip_unchanged
+            else None
+        )
+        if fingerprint is not None:
+            already_saved = (
+                {name.rsplit(".", 1)[-1].lower() for name in full_fig_names}.issubset(
+                    h5_utils.get_group_keys(self.filepath + ".h5", f"figures/{fig_stem}")
+                )
+                if inside_h5
+                else all(os.path.exists(filename) for filename in full_fig_names)  # noqa: PTH110
+            ) and (thumbnail_name is None or os.path.exists(thumbnail_name))  # noqa: PTH110
+            saved_fingerprints = str(self._get_nested(fingerprint_key) or "").split()
+            if already_saved and fingerprint in saved_fingerprints:
+                logger.info("Figure %s is not changed, so it is not saved again.", fig_name)
+                return done
+
         if tight_layout and hasattr(fig, "tight_layout"):
             fig.tight_layout()  # type: ignore
-        if metadata is None:
-            fig.savefig(full_fig_name, **kwargs)
-        else:
-            if not full_fig_name.endswith(".pdf"):
-                raise ValueError("Metadata can be added only to pdf files.")
+        future = self._write_figure(
+            fig,
+            fig_name,
+            fig_stem,
+            full_fig_names,
+            metadata,
+            rasterize,
+            inside_h5=inside_h5,
+            with_pickle=with_pickle,
+            asynchronous=asynchronous,
+            thumbnail_name=thumbnail_name,
+            **kwargs,
+        )
 
-            from matplotlib.backends.backend_pdf import PdfPages
+        if fingerprint is not None:
+            # Drawing changes the figure, so the state in which the saving left it is kept as
+            # well. Saving the same figure again without changes is then skipped too.
+            saved_state = self._get_fig_fingerprint(
+                fig, full_fig_names, metadata, fingerprint_options
+            )
+            value = fingerprint if saved_state is None else f"{fingerprint} {saved_state}"
+            self.unlock_data(fingerprint_key).update({fingerprint_key: value}).lock_data(
+                fingerprint_key
+            ).save([fingerprint_key])
+        return future
 
-            pdf_fig = PdfPages(full_fig_name)
-            fig.savefig(pdf_fig, format="pdf", **kwargs)  # type: ignore
-            metadata = metadata or {}
-            if not isinstance(metadata.get("Subject", ""), str):
-                metadata["Subject"] = json.dumps(metadata.get("Subject"))
+    def _write_figure(
+        self,
+        fig: FigureProtocol,
+        fig_name: str,
+        fig_stem: str,
+        full_fig_names: List[str],
+        metadata: Optional[PdfMetadataDict],
+        rasterize: Optional[RasterizeOptions],
+        inside_h5: bool,
+        with_pickle: bool,
+        asynchronous: Optional[bool],
+        thumbnail_name: Optional[str],
+        **kwargs,
+    ) -> "Future":
+        """Write the figure inside the h5 file, in background or now, see `save_fig`."""
+        done: "Future" = Future()
+        done.set_result(None)
 
-            if not isinstance(metadata.get("Keywords", ""), str):
-                metadata["Keywords"] = json.dumps(metadata.get("Keywords"))
+        if inside_h5:
+            try:
+                self._save_fig_to_h5(
+                    fig, fig_stem, full_fig_names, metadata, rasterize, with_pickle, **kwargs
+                )
+                self._queue_thumbnail(fig, thumbnail_name)
+                return done
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception(
+                    "Failed to save the figure inside h5 file due to %s. Saving it as a file.",
+                    error,
+                )
 
-            pdf_metadata = pdf_fig.infodict()
-            pdf_metadata.update(metadata)
-            pdf_fig.close()
+        if self._save_fig_async if asynchronous is None else asynchronous:
+            try:
+                fig_copy = snapshot_figure(fig)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Cannot copy the figure, so it is saved now. Reason: %r", error)
+            else:
+                future = figure_saver.submit(
+                    _write_fig,
+                    fig_copy,
+                    full_fig_names,
+                    metadata,
+                    rasterize,
+                    name=fig_name,
+                    **kwargs,
+                )
+                if thumbnail_name is not None:
+                    figure_saver.submit(
+                        write_thumbnail, fig_copy, thumbnail_name, name=thumbnail_name
+                    )
+                return future
+
+        _write_fig(fig, full_fig_names, metadata, rasterize, **kwargs)
+        self._queue_thumbnail(fig, thumbnail_name)
+        return done
+
+    @staticmethod
+    def _queue_thumbnail(fig: FigureProtocol, filename: Optional[str]):
+        """Generate the thumbnail in background from a copy of the figure."""
+        if filename is None:
+            return
+        if not hasattr(fig, "get_size_inches"):
+            logger.debug("Thumbnail is not created as %s is not a matplotlib figure.", fig)
+            return
+        try:
+            fig_copy = snapshot_figure(fig)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Cannot copy the figure to create its thumbnail due to %r", error)
+            return
+        figure_saver.submit(write_thumbnail, fig_copy, filename, name=filename)
+
+    def _save_fig_to_h5(
+        self,
+        fig: FigureProtocol,
+        fig_stem: str,
+        filenames: Sequence[str],
+        metadata: Optional[PdfMetadataDict],
+        rasterize: Optional[RasterizeOptions],
+        with_pickle: bool = False,
+        **kwargs,
+    ):
+        """Save the figure under `figures/{fig_stem}` key.
 
-        self._figure_saved = True
+        The group contains the bytes of every file of `filenames` under its extension (e.g.
+        `figures/FIG1/pdf` and `figures/FIG1/png`), the first extension as `format` and the
+        version of matplotlib. With `with_pickle`, it also contains, if possible, the pickle
+        of the figure that `open_figs(allow_pickle=True)` can load. The group is written
+        directly to the file with gzip compression and is not kept in memory.
+        """
+        fig_formats = [filename.rsplit(".", 1)[-1].lower() for filename in filenames]
+        for fig_format in fig_formats:
+            if fig_format in _FIGURE_FIELDS:
+                raise ValueError(f"Figure cannot be saved inside h5 file as '{fig_format}'.")
+
+        value: Dict[str, Any] = {
+            "format": fig_formats[0],
+            "matplotlib": _matplotlib_version(),
+            "format_version": FIGURE_FORMAT_VERSION,
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            temp_filenames = [
+                os.path.join(directory, f"figure.{fig_format}")  # noqa: PTH118
+                for fig_format in fig_formats
+            ]
+            _write_fig(fig, temp_filenames, metadata, rasterize, **kwargs)
+            for fig_format, temp_filename in zip(fig_formats, temp_filenames):
+                with open(temp_filename, "rb") as file:
+                    value[fig_format] = np.frombuffer(file.read(), dtype=np.uint8)
+        if with_pickle:
+            try:
+                value["pickle"] = np.frombuffer(zlib.compress(dumps_figure(fig)), dtype=np.uint8)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Figure %s is saved without pickle due to %r", fig_stem, error)
 
-        return self
+        self._file_modified_time = h5_utils.save_dict(
+            self.filepath + ".h5", {f"figures/{fig_stem}": value}, compression="gzip"
+        )
+        # The figures are read from the file by `open_figs`, so `figures` is loaded lazily.
+        self._data.pop("figures", None)
+        self._cached_keys.pop("figures", None)
+        self._keys.add("figures")
+        self._unopened_keys.add("figures")
+        self.lock_data("figures")
+
+    def _get_fig_fingerprint(
+        self,
+        fig: FigureProtocol,
+        filenames: Sequence[str],
+        metadata: Optional[PdfMetadataDict],
+        kwargs: dict,
+    ) -> Optional[str]:
+        """Hash of the figure and of everything else that changes the saved files."""
+        prefixes = {"savefig."}
+        for filename in filenames:
+            extension = filename.rsplit(".", 1)[-1].lower()
+            prefixes.add(_BACKEND_RC_PARAMS.get(extension, "agg."))
+        try:
+            import matplotlib as mpl
+
+            rc_params = {
+                k: v for k, v in mpl.rcParams.items() if k.startswith(tuple(sorted(prefixes)))
+            }
+        except ImportError:
+            rc_params = {}
+        cell = self._analysis_cell
+        if cell is None or cell == "none":
+            cell = self._get_nested("analysis_cells/default")
+        return fingerprint_figure(
+            fig,
+            [os.path.basename(filename) for filename in filenames],  # noqa: PTH119
+            metadata,
+            sorted(kwargs.items()),
+            rc_params,
+            cell,
+        )
+
+    def _get_nested(self, key: str) -> Any:
+        """Get `group/name` key. It's set as it is in memory, but loaded as a group from file."""
+        value = self.get(key)
+        if value is None:
+            group, name = key.split("/", 1)
+            value = (self.get(group) or {}).get(name)
+        return value
+
+    def wait_figures(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the figures saved in background are written.
+
+        Returns:
+            bool: False if some figures are still being saved after `timeout` seconds.
+        """
+        return figure_saver.wait(timeout)
 
     def _get_fig_name(
         self, name: Optional[Union[str, int]] = None, extensions: Optional[str] = None
@@ -266,7 +922,7 @@ class AnalysisData(DH5):
     def parse_config(self, config_files: Optional[Tuple[str, ...]] = None) -> "ConfigFile":
         """Parse config files. If `config_files` are not provided takes `default_config_files`."""
 
-        config_files = config_files or self._default_config_files
+        config_files = config_files or self.default_config_files
 
         if not isinstance(config_files, tuple):
             config_files = tuple(config_files)
@@ -357,18 +1013,34 @@ class AnalysisData(DH5):
         else:
             original_config_name = None
 
-        from ..parsing import parse_str
+        from ..parsing.cache import parse_str_cached
 
         file_content = self["configs"][config_file_name]
-        config_data = ConfigFile(parse_str(file_content), file_content)
+        config_data = ConfigFile(parse_str_cached(file_content), file_content)
         self._parsed_configs[config_file_name] = config_data
         if original_config_name is not None:
             self._parsed_configs[original_config_name] = config_data
 
-        # print("e", self._parsed_configs.keys())
-
         return config_data
 
+    @property
+    def default_config_files(self) -> Tuple[str, ...]:
+        """Config files used by `parse_config` by default.
+
+        If not set explicitly, they are read from `info/default_config_files` key of the file.
+        """
+        if self._default_config_files is None:
+            if "info" in self._data:
+                default_config_files = self._data["info"].get("default_config_files", ())
+            elif "info" in self:
+                default_config_files = h5_utils.read_key(
+                    self.filepath + ".h5", "info/default_config_files", ()
+                )
+            else:
+                default_config_files = ()
+            self._default_config_files = tuple(default_config_files)
+        return self._default_config_files
+
     def set_default_config_files(self, config_files: Union[str, Tuple[str, ...]], /):
         self._default_config_files = (
             (config_files,) if isinstance(config_files, str) else tuple(config_files)
@@ -403,24 +1075,127 @@ class AnalysisData(DH5):
                 code_str = code_str.replace(key, value)
         return code_str
 
-    def open_figs(self) -> list:
-        figures = []
+    def open_figs(
+        self,
+        names: Optional[Union[str, int, Sequence[Union[str, int]]]] = None,
+        allow_pickle: bool = False,
+        extension: Optional[str] = None,
+    ) -> list:
+        """Open the figures saved inside the h5 file.
+
+        Only the requested figures are read from the file and decoded. By default they are
+        returned as `StoredFigure`, i.e. the saved file (e.g. pdf) that can be written with
+        `fig.save(filename)` or displayed if it's png or svg.
+
+        Args:
+            names (str | int | list, optional): Names of the figures. Either the keys of
+                `figures` (e.g. `FIG1`, `FIG_abc`) or the names given to `save_fig`
+                (e.g. `1`, `abc`). Defaults to all figures.
+            allow_pickle (bool): Return the matplotlib figures, that can be edited again, if
+                they were saved with `save_fig_pickle=True` (or `save_fig(..., pickle=True)`).
+                They are unpickled, so use it only for trusted files. A figure pickled by
+                another version of matplotlib may fail to load. The figures are not
+                attached to pyplot, so use `display(fig)` to show them. Defaults to False.
+            extension (str, optional): Format to return if the figures were saved with several
+                extensions, e.g. "png". Defaults to the first extension given to `save_fig`.
+        """
+        filepath = self.filepath + ".h5"
+        saved = h5_utils.get_group_keys(filepath, "figures")
+        if names is None:
+            keys = saved
+        else:
+            if isinstance(names, (str, int)):
+                names = [names]
+            keys = [self._find_fig_key(name, saved) for name in names]
+
+        return [
+            _decode_figure(
+                key, h5_utils.read_key(filepath, f"figures/{key}"), allow_pickle, extension
+            )
+            for key in keys
+        ]
+
+    def _find_fig_key(self, name: Union[str, int], saved: List[str]) -> str:
+        fig_name = self._get_fig_name(name)
+        for key in (str(name), fig_name.rsplit(".", 1)[0], fig_name):
+            if key in saved:
+                return key
+        raise KeyError(f"Cannot find figure '{name}'. Possible figures are: {tuple(saved)}")
 
-        for figure_key in self.get("figures", []):
-            import pltsave
+    def lazy(
+        self, key: Union[str, Tuple[str, ...]], /, *, chunk_size: Optional[int] = None
+    ) -> LazyArray:
+        """Return the array under `key` as a `LazyArray` that reads the file chunk by chunk.
 
-            figure_code = self["figures"][figure_key]
-            figure = pltsave.loads(figure_code)
-            figures.append(figure)
-        return figures
+        Nothing is loaded into memory until `.compute()` is called, and even then only
+        the result is kept, so whole-file pipelines do not hold intermediates in RAM.
+
+        Args:
+            key (str | tuple[str, ...]): Key of the array. Nested keys can be given as
+                `"loop/signal"` or `("loop", "signal")`.
+            chunk_size (int, optional): Number of rows evaluated at once.
 
-        # raise NotImplementedError(
-        # "Not implemented for the moment. If you want to open an old figure.
-        # Use open_old_figs function" )
+        Examples:
+            >>> signal = aqm.d.lazy("loop/signal")
+            >>> np.abs(signal.mean(axis=-1)).mean(axis=0).compute()
+        """
+        key = "/".join(key) if isinstance(key, tuple) else key
+        try:
+            return LazyArray.from_h5(self.filepath, key, chunk_size=chunk_size)
+        except KeyError:  # the key exists only in memory
+            return LazyArray(self[tuple(key.split("/"))], chunk_size=chunk_size)
 
     def pull(self, force_pull: bool = False):
+        """Reload the keys that were changed in the file.
+
+        If the file has versions of the keys (written by `NotebookAcquisitionData`), only
+        the keys with a new version are reloaded (on next access) and only new iterations of
+        the loops are read. Otherwise, or with `force_pull=True`, everything is reloaded.
+        """
+        if not force_pull and not self.pull_available():
+            return self
+        file_modified_time = os.path.getmtime(self.filepath + ".h5")  # noqa: PTH204
+        structure = self._get_structure(self.filepath + ".h5")
+        if force_pull or not structure.versions:
+            self._reset_attrs()
+            self._cached_keys.clear()
+            self._loop_keys, self._versions = structure.loop_keys, structure.versions
+            return super().pull(force_pull=True)
+
+        changed = {
+            key for key in structure.keys if structure.versions.get(key) != self._versions.get(key)
+        }
+        removed = self._keys - structure.keys - self._last_update
+        new = structure.keys - self._keys
+
+        for key in removed | changed.intersection(self._data):
+            self._data.pop(key, None)
+            self._cached_keys.pop(key, None)
+        for key in removed:
+            self._keys.discard(key)
+            self._unopened_keys.discard(key)
+        self._keys.update(new | changed)
+        self._unopened_keys.update((new | changed) - self._data.keys())
+        self.lock_data(new)
+
+        for key in structure.loop_keys.intersection(self._data):
+            # Loops can be appended in place without a new version, so their tail is reread.
+            loop = self._data[key]
+            data = h5_utils.read_loop_rows(
+                self.filepath + ".h5", key, loop, start=h5_utils.get_complete_rows(loop)
+            )
+            self._data[key] = AnalysisLoop(data)
+            self._cached_keys[key] = _get_nbytes(data)
+
+        parsed_configs = self._parsed_configs
         self._reset_attrs()
-        return super().pull(force_pull)
+        if "configs" not in changed:
+            self._parsed_configs = parsed_configs
+
+        self._loop_keys, self._versions = structure.loop_keys, structure.versions
+        self._file_modified_time = file_modified_time
+        self._clean_precalculated_results()
+        return self
 
     @property
     def figure_saved(self):
@@ -4,8 +4,11 @@ It has mainly __iter__ method and __getitem__ method for slicing.
 
 from typing import Any, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 from dh5 import DH5
 
+from .lazy_array import LazyArray
+
 
 class AnalysisLoop(DH5):
     """A class for reading a dictionary that was created by AcquisitionLoop.
@@ -144,6 +147,34 @@ class AnalysisLoop(DH5):
         new_shape.extend(self._loop_shape[1:])
         return child_data, new_shape
 
+    def __get_data__(self, key: str, default: Any = None):
+        value = self._data.get(key)
+        if isinstance(value, np.ndarray) and not value.flags.writeable:
+            return value  # already protected, so no need to copy
+        return super().__get_data__(key, default)
+
+    def __get_data_or_raise__(self, key: str):
+        value = self._data.get(key)
+        if isinstance(value, np.ndarray) and not value.flags.writeable:
+            return value
+        return super().__get_data_or_raise__(key)
+
+    def lazy(self, key: str, /, *, chunk_size: Optional[int] = None) -> LazyArray:
+        """Return the data under `key` as a `LazyArray`.
+
+        Operations on it are recorded and evaluated chunk by chunk along the loop axis
+        only on `.compute()`.
+
+        Args:
+            key (str): The key to get.
+            chunk_size (int, optional): Number of loop iterations evaluated at once.
+
+        Examples:
+            >>> signal = loop.lazy("signal")
+            >>> np.abs(signal - signal.mean(axis=-1)).max(axis=0).compute()
+        """
+        return LazyArray(self[key], chunk_size=chunk_size)
+
     def __len__(self) -> int:
         """Get the length of the data.
 
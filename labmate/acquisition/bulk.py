@@ -0,0 +1,105 @@
+"""Read the same keys from many acquisition files in parallel and stack them by run."""
+
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils import h5_utils
+
+
+class LoadedRuns(NamedTuple):
+    """Keys read from many files.
+
+    Attributes:
+        paths (List[str]): Files that were read successfully, in the order of the run axis.
+        data (Dict[str, np.ndarray]): Values of every key stacked along the first (run) axis.
+        errors (Dict[str, str]): Files that were skipped with the reason.
+    """
+
+    paths: List[str]
+    data: Dict[str, np.ndarray]
+    errors: Dict[str, str]
+
+
+def read_keys(filepath: str, keys: Sequence[str]) -> Dict[str, Any]:
+    """Read only the given (possibly nested, e.g. `loop/signal`) keys from the file.
+
+    Raises:
+        KeyError: If one of the keys is not in the file.
+        ValueError: If a key is a group, since it cannot be stacked.
+    """
+    data = h5_utils.read_keys(filepath, keys)
+    for key in keys:
+        if key not in data:
+            raise KeyError(f"Key '{key}' is not found")
+        if isinstance(data[key], dict):
+            raise ValueError(f"Key '{key}' is a group. Give the keys of its arrays instead.")
+    return data
+
+
+def _read_keys_or_error(filepath: str, keys: Sequence[str]) -> Tuple[Optional[dict], str]:
+    try:
+        return read_keys(filepath, keys), ""
+    except Exception as error:  # pylint: disable=broad-except
+        return None, f"{type(error).__name__}: {error}"
+
+
+def load_many(
+    filepaths: Iterable[str],
+    keys: Sequence[str],
+    workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> LoadedRuns:
+    """Read `keys` from every file on a pool and stack them along a new first axis.
+
+    Files that cannot be read, miss a key or have a key of other shape than most of
+    the files are not stacked and reported in `errors`.
+
+    Args:
+        filepaths (Iterable[str]): Paths to the h5 files.
+        keys (Sequence[str]): Keys to read, e.g. ["x", "loop/signal"].
+        workers (int, optional): Size of the pool. Defaults to the executor default.
+            With 1 the files are read one by one in the current thread.
+        use_processes (bool): Use processes instead of threads. HDF5 library is not
+            parallel inside one process, so processes help if the data is compressed.
+    """
+    if isinstance(keys, str):
+        keys = [keys]
+    filepaths = [
+        str(filepath) if str(filepath).endswith(".h5") else f"{filepath}.h5"
+        for filepath in filepaths
+    ]
+    if workers == 1 or len(filepaths) <= 1:
+        results = [_read_keys_or_error(filepath, keys) for filepath in filepaths]
+    else:
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        executor: Executor
+        with executor_class(max_workers=workers) as executor:
+            results = list(executor.map(_read_keys_or_error, filepaths, [keys] * len(filepaths)))
+
+    errors = {filepath: error for filepath, (data, error) in zip(filepaths, results) if error}
+    loaded = [
+        (filepath, data) for filepath, (data, _) in zip(filepaths, results) if data is not None
+    ]
+
+    for key in keys:
+        shapes = Counter(np.shape(data[key]) for _, data in loaded)
+        if len(shapes) <= 1:
+            continue
+        expected = shapes.most_common(1)[0][0]
+        for filepath, data in loaded:
+            if np.shape(data[key]) != expected:
+                errors[filepath] = (
+                    f"Shape {np.shape(data[key])} of '{key}' differs from {expected} of other files"
+                )
+        loaded = [(filepath, data) for filepath, data in loaded if filepath not in errors]
+
+    return LoadedRuns(
+        paths=[filepath for filepath, _ in loaded],
+        data={key: np.stack([np.asarray(data[key]) for _, data in loaded]) for key in keys}
+        if loaded
+        else {key: np.array([]) for key in keys},
+        errors=errors,
+    )
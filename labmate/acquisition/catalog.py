@@ -0,0 +1,475 @@
+"""SQLite catalog of the acquisitions saved in a data directory.
+
+The catalog keeps one row per acquisition file, so old data can be found without walking
+the data directory and opening every file.
+
+Examples:
+    >>> catalog = Catalog.from_data_directory(data_directory)
+    >>> catalog.rebuild()  # scan existing files
+    >>> catalog.query(name="^rabi", useful=True)
+"""
+
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+
+from ..logger import logger
+from ..parsing.cache import content_hash, parse_str_cached
+from .config_store import CONFIG_REFS_KEY, resolve_config_refs
+
+
+CATALOG_FILENAME = ".catalog.sqlite"
+
+_TIME_STAMP = re.compile(r"^\d{4}_\d{2}_\d{2}__\d{2}_\d{2}_\d{2}")
+_MAX_SQL_VARIABLES = 900
+_OPERATORS = {"=": "=", "==": "=", "!=": "!=", ">": ">", ">=": ">=", "<": "<", "<=": "<="}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS acquisitions (
+    path TEXT PRIMARY KEY,
+    experiment_name TEXT NOT NULL,
+    time_stamp TEXT,
+    duration REAL,
+    useful INTEGER,
+    keys TEXT,
+    config_hashes TEXT,
+    modified REAL
+);
+CREATE INDEX IF NOT EXISTS acquisitions_name ON acquisitions (experiment_name);
+CREATE INDEX IF NOT EXISTS acquisitions_time ON acquisitions (time_stamp);
+CREATE TABLE IF NOT EXISTS params (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS params_value ON params (name, value);
+CREATE INDEX IF NOT EXISTS params_text ON params (name, text);
+"""
+_COLUMNS = (
+    "path",
+    "experiment_name",
+    "time_stamp",
+    "duration",
+    "useful",
+    "keys",
+    "config_hashes",
+    "modified",
+)
+
+
+class AcquisitionRecord(NamedTuple):
+    """Row of the catalog.
+
+    Attributes:
+        path (str): Path to the h5 file.
+        experiment_name (str): Name of the experiment, i.e. the folder of the file.
+        time_stamp (Optional[str]): Time stamp of the acquisition `YYYY_MM_DD__HH_MM_SS`.
+        duration (Optional[float]): Acquisition duration in seconds if it was saved.
+        useful (bool): If the acquisition was finished with `save_acquisition`.
+        keys (Dict[str, Any]): Top-level keys with the shapes of the arrays. Groups
+            are given as dictionaries of their keys.
+        config_hashes (Dict[str, str]): Hashes of the config files by their names.
+        modified (Optional[float]): Modification time of the file when it was read.
+        params (Dict[str, Union[float, str]]): Values of the config parameters. Numbers are
+            converted to float. Records from `Catalog.query` have them only if asked.
+    """
+
+    path: str
+    experiment_name: str
+    time_stamp: Optional[str] = None
+    duration: Optional[float] = None
+    useful: bool = False
+    keys: Dict[str, Any] = {}
+    config_hashes: Dict[str, str] = {}
+    modified: Optional[float] = None
+    params: Dict[str, Union[float, str]] = {}
+
+
+def parse_filepath(
+    filepath: Union[str, Path], data_directory: Union[str, Path]
+) -> Tuple[str, Optional[str]]:
+    """Return the experiment name and the time stamp encoded in the path of the file."""
+    filepath, data_directory = Path(filepath), Path(data_directory)
+    stem = filepath.name[:-3] if filepath.name.endswith(".h5") else filepath.name
+    match = _TIME_STAMP.match(stem)
+    time_stamp = match.group() if match else None
+    try:
+        relative = filepath.relative_to(data_directory)
+    except ValueError:
+        relative = None
+    if relative is not None and len(relative.parts) > 1:
+        return relative.parts[0], time_stamp
+    name = stem[len(time_stamp) + 2 :] if time_stamp else stem
+    return name, time_stamp
+
+
+def _get_shapes(group: h5py.Group, depth: int = 1) -> Dict[str, Any]:
+    shapes: Dict[str, Any] = {}
+    for key, value in group.items():
+        if isinstance(value, h5py.Dataset):
+            shapes[key] = list(value.shape)
+        elif depth > 0:
+            shapes[key] = _get_shapes(value, depth - 1)
+        else:
+            shapes[key] = {}
+    return shapes
+
+
+def _read_scalar(file: h5py.File, key: str) -> Any:
+    if key not in file or not isinstance(file[key], h5py.Dataset):
+        return None
+    value = file[key][()]  # type: ignore
+    if isinstance(value, bytes):
+        return value.decode()
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _read_config_hashes(file: h5py.File) -> Dict[str, str]:
+    if CONFIG_REFS_KEY in file:
+        return {
+            name: str(_read_scalar(file, f"{CONFIG_REFS_KEY}/{name}"))
+            for name in file[CONFIG_REFS_KEY]
+        }  # type: ignore
+    if "configs" in file:
+        return {
+            name: content_hash(str(_read_scalar(file, f"configs/{name}")))
+            for name in file["configs"]
+        }  # type: ignore
+    return {}
+
+
+def _read_configs(file: h5py.File, filepath: str) -> Dict[str, str]:
+    if "configs" in file:
+        return {name: str(_read_scalar(file, f"configs/{name}")) for name in file["configs"]}  # type: ignore
+    if CONFIG_REFS_KEY in file:
+        refs = {
+            name: str(_read_scalar(file, f"{CONFIG_REFS_KEY}/{name}"))
+            for name in file[CONFIG_REFS_KEY]
+        }  # type: ignore
+        return resolve_config_refs(filepath, refs)
+    return {}
+
+
+def _get_params(configs: Dict[str, str]) -> Dict[str, Union[float, str]]:
+    """Return the values of parameters of all config files. Numbers are converted to float."""
+    params: Dict[str, Union[float, str]] = {}
+    for content in configs.values():
+        for name, parsed in parse_str_cached(content).items():
+            value = parsed.value
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                params[name] = float(value)
+            else:
+                params[name] = str(value)
+    return params
+
+
+def read_record(filepath: Union[str, Path], data_directory: Union[str, Path]) -> AcquisitionRecord:
+    """Read the metadata of an acquisition file. Arrays themselves are not read."""
+    filepath = str(filepath)
+    experiment_name, time_stamp = parse_filepath(filepath, data_directory)
+    modified = os.path.getmtime(filepath)  # noqa: PTH204
+    with h5py.File(filepath, "r") as file:
+        duration = _read_scalar(file, "info/acquisition_duration")
+        useful = _read_scalar(file, "useful")
+        return AcquisitionRecord(
+            path=filepath,
+            experiment_name=experiment_name,
+            time_stamp=time_stamp,
+            duration=float(duration) if duration is not None else None,
+            useful=bool(useful),
+            keys=_get_shapes(file),
+            config_hashes=_read_config_hashes(file),
+            modified=modified,
+            params=_get_params(_read_configs(file, filepath)),
+        )
+
+
+def _read_record_or_none(filepath: str, data_directory: str) -> Optional[AcquisitionRecord]:
+    try:
+        return read_record(filepath, data_directory)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.warning("Cannot read %s for the catalog due to %r", filepath, error)
+        return None
+
+
+def _regexp(pattern: str, value: Optional[str]) -> bool:
+    return value is not None and re.search(pattern, value) is not None
+
+
+class Catalog:
+    """SQLite catalog of the acquisitions in `data_directory`.
+
+    Paths are kept relative to the data directory, so the directory can be moved.
+    """
+
+    def __init__(self, filename: Union[str, Path], data_directory: Union[str, Path]):
+        self.filename = Path(filename)
+        self.data_directory = Path(data_directory)
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_data_directory(cls, data_directory: Union[str, Path]) -> "Catalog":
+        return cls(Path(data_directory) / CATALOG_FILENAME, data_directory)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.filename, timeout=10, check_same_thread=False)
+            connection.create_function("REGEXP", 2, _regexp, deterministic=True)
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _relative(self, filepath: Union[str, Path]) -> str:
+        filepath = Path(filepath).absolute()
+        try:
+            return filepath.relative_to(self.data_directory.absolute()).as_posix()
+        except ValueError:
+            return filepath.as_posix()
+
+    def _to_row(self, record: AcquisitionRecord) -> tuple:
+        return (
+            self._relative(record.path),
+            record.experiment_name,
+            record.time_stamp,
+            record.duration,
+            int(record.useful),
+            json.dumps(record.keys),
+            json.dumps(record.config_hashes),
+            record.modified,
+        )
+
+    def _from_row(self, row: tuple) -> AcquisitionRecord:
+        path, name, time_stamp, duration, useful, keys, config_hashes, modified = row
+        return AcquisitionRecord(
+            path=str(self.data_directory / path),
+            experiment_name=name,
+            time_stamp=time_stamp,
+            duration=duration,
+            useful=bool(useful),
+            keys=json.loads(keys) if keys else {},
+            config_hashes=json.loads(config_hashes) if config_hashes else {},
+            modified=modified,
+        )
+
+    def add(self, records: Union[AcquisitionRecord, Iterable[AcquisitionRecord]]):
+        """Insert or replace the records together with their params."""
+        records = [records] if isinstance(records, AcquisitionRecord) else list(records)
+        rows = [self._to_row(record) for record in records]
+        params = [
+            (row[0], name, value, None) if isinstance(value, float) else (row[0], name, None, value)
+            for row, record in zip(rows, records)
+            for name, value in record.params.items()
+        ]
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO acquisitions ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                rows,
+            )
+            self.connection.executemany(
+                "DELETE FROM params WHERE path = ?", [(row[0],) for row in rows]
+            )
+            self.connection.executemany(
+                "INSERT INTO params (path, name, value, text) VALUES (?, ?, ?, ?)", params
+            )
+
+    def add_file(self, filepath: Union[str, Path]) -> AcquisitionRecord:
+        """Read the metadata of the file and save it to the catalog."""
+        record = read_record(str(filepath), self.data_directory)
+        self.add(record)
+        return record
+
+    def remove(self, filepaths: Union[str, Path, Iterable[Union[str, Path]]]):
+        if isinstance(filepaths, (str, Path)):
+            filepaths = (filepaths,)
+        self._remove_relative([self._relative(filepath) for filepath in filepaths])
+
+    def _remove_relative(self, paths: List[str]):
+        with self._lock, self.connection:
+            for table in ("acquisitions", "params"):
+                self.connection.executemany(
+                    f"DELETE FROM {table} WHERE path = ?", [(path,) for path in paths]
+                )
+
+    def get(self, filepath: Union[str, Path]) -> Optional[AcquisitionRecord]:
+        rows = self._execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM acquisitions WHERE path = ?",
+            (self._relative(filepath),),
+        )
+        return self._with_params(self._from_row(rows[0])) if rows else None
+
+    def get_params(self, filepath: Union[str, Path]) -> Dict[str, Union[float, str]]:
+        """Return the values of config parameters saved for the file."""
+        rows = self._execute(
+            "SELECT name, value, text FROM params WHERE path = ?", (self._relative(filepath),)
+        )
+        return {name: value if text is None else text for name, value, text in rows}
+
+    def _with_params(self, record: AcquisitionRecord) -> AcquisitionRecord:
+        return record._replace(params=self.get_params(record.path))
+
+    def _execute(self, sql: str, parameters: Iterable[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self.connection.execute(sql, tuple(parameters)).fetchall()
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM acquisitions")[0][0]
+
+    def _where(
+        self,
+        name: Optional[str] = None,
+        useful: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[str], List[Any]]:
+        conditions, parameters = [], []
+        if name is not None:
+            # There are much less experiments than files, so the regex is checked only
+            # once per experiment name and the files are found with the index.
+            regex = re.compile(name)
+            names = [
+                experiment_name
+                for (experiment_name,) in self._execute(
+                    "SELECT DISTINCT experiment_name FROM acquisitions"
+                )
+                if regex.search(experiment_name)
+            ]
+            if len(names) <= _MAX_SQL_VARIABLES:
+                conditions.append(f"experiment_name IN ({', '.join('?' * len(names))})")
+                parameters += names
+            else:
+                conditions.append("experiment_name REGEXP ?")
+                parameters.append(name)
+        if useful is not None:
+            conditions.append("useful = ?")
+            parameters.append(int(useful))
+        if since is not None:
+            conditions.append("time_stamp >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("time_stamp <= ?")
+            parameters.append(until)
+        for param, condition in (where or {}).items():
+            operator, value = condition if isinstance(condition, tuple) else ("=", condition)
+            if operator not in _OPERATORS:
+                raise ValueError(
+                    f"Unknown operator '{operator}' for '{param}'. "
+                    f"Possible operators are {tuple(_OPERATORS)}"
+                )
+            column = "text" if isinstance(value, str) else "value"
+            conditions.append(
+                "path IN (SELECT path FROM params "
+                f"WHERE name = ? AND {column} {_OPERATORS[operator]} ?)"
+            )
+            parameters += [param, value if isinstance(value, str) else float(value)]
+        return conditions, parameters
+
+    def query(
+        self,
+        name: Optional[str] = None,
+        useful: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        with_params: bool = False,
+    ) -> List[AcquisitionRecord]:
+        """Return the acquisitions sorted by time.
+
+        Args:
+            name (str, optional): Regular expression searched in the experiment name,
+                e.g. "^rabi".
+            useful (bool, optional): Keep only the acquisitions with this `useful` flag.
+            since, until (str, optional): Time stamps `YYYY_MM_DD__HH_MM_SS` (or their
+                beginning, e.g. "2024_05") that limit the acquisition time.
+            where (dict, optional): Conditions on the config parameters, i.e.
+                {name: value} or {name: (operator, value)} with one of the operators
+                "=", "!=", ">", ">=", "<", "<=". Numbers are compared as floats.
+                E.g. `where={"qubit_freq": (">", 5e9), "readout_power": -30}`.
+            with_params (bool): Whether to fill `params` of the records.
+        """
+        conditions, parameters = self._where(name, useful, since, until, where)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM acquisitions"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY time_stamp, path"
+        records = [self._from_row(row) for row in self._execute(sql, parameters)]
+        if with_params:
+            records = [self._with_params(record) for record in records]
+        return records
+
+    def rebuild(
+        self,
+        workers: Optional[int] = None,
+        full: bool = False,
+        progress: Optional[Callable[[int, int], Any]] = None,
+    ) -> int:
+        """Scan the data directory and update the catalog.
+
+        Only new files and the files modified since they were read are opened. Rows of
+        removed files are deleted.
+
+        Args:
+            workers (int, optional): Number of processes that read the files. Defaults to the
+                number of CPUs. With 1 the files are read in the current process.
+            full (bool): Read every file again.
+            progress (Callable, optional): Called as `progress(done, total)` after every file.
+
+        Returns:
+            int: Number of files that were read.
+        """
+        known = dict(self._execute("SELECT path, modified FROM acquisitions"))
+        existing = {}
+        for filepath in self.data_directory.rglob("*.h5"):
+            relative = filepath.relative_to(self.data_directory)
+            if any(part.startswith(".") for part in relative.parts):
+                continue
+            existing[relative.as_posix()] = filepath
+
+        to_read = [
+            str(filepath)
+            for relative, filepath in existing.items()
+            if full or known.get(relative) != os.path.getmtime(filepath)  # noqa: PTH204
+        ]
+        self._remove_relative([relative for relative in known if relative not in existing])
+
+        data_directory = str(self.data_directory)
+        records = []
+        with contextlib.ExitStack() as stack:
+            if workers == 1 or len(to_read) <= 1:
+                results: Iterable = (
+                    _read_record_or_none(filepath, data_directory) for filepath in to_read
+                )
+            else:
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                results = executor.map(
+                    _read_record_or_none,
+                    to_read,
+                    [data_directory] * len(to_read),
+                    chunksize=max(len(to_read) // (4 * (workers or os.cpu_count() or 1)), 1),
+                )
+            for record in results:
+                records.append(record)
+                if progress is not None:
+                    progress(len(records), len(to_read))
+        self.add(record for record in records if record is not None)
+        return len(to_read)
@@ -0,0 +1,121 @@
+"""Content-addressed storage of config files shared by all acquisitions of a data directory.
+
+Each config file is kept once in `data_directory/.config_store/<hash>` and acquisitions
+save only `config_refs` = {file name: hash} instead of the full `configs`.
+`AnalysisData` resolves them transparently and `inline_configs` copies the contents back
+inside the h5 file, e.g. before sharing it outside of the data directory.
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from dh5 import DH5
+
+from ..parsing.cache import content_hash
+from ..utils.json_file import create_temp_file
+
+
+CONFIG_STORE_DIRNAME = ".config_store"
+CONFIG_REFS_KEY = "config_refs"
+
+
+class ConfigStore:
+    """Directory of config files named by the hash of their content."""
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+    @classmethod
+    def from_data_directory(cls, data_directory: Union[str, Path]) -> "ConfigStore":
+        return cls(Path(data_directory) / CONFIG_STORE_DIRNAME)
+
+    def _blob_path(self, ref: str) -> Path:
+        return self.directory / ref
+
+    def __contains__(self, ref: str) -> bool:
+        return self._blob_path(ref).is_file()
+
+    def put(self, content: str) -> str:
+        """Save the content if it's not yet in the store and return its reference."""
+        ref = content_hash(content)
+        path = self._blob_path(ref)
+        if path.is_file():
+            return ref
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so the blob is never seen half written.
+        # It's created with the mode of any new file, since blobs are shared by all users.
+        fd, temp_path = create_temp_file(self.directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(content.encode())
+            os.replace(temp_path, path)  # noqa: PTH105
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return ref
+
+    def put_many(self, configs: Dict[str, str]) -> Dict[str, str]:
+        """Save every config and return {file name: reference}."""
+        return {name: self.put(content) for name, content in configs.items()}
+
+    def get(self, ref: str) -> str:
+        """Return the content of a config. Raises KeyError if it's not in the store."""
+        path = self._blob_path(ref)
+        if not path.is_file():
+            raise KeyError(f"Config {ref} is not found in the store {self.directory}")
+        return _read_blob(str(path))
+
+    def resolve(self, refs: Dict[str, str]) -> Dict[str, str]:
+        """Return {file name: content} for {file name: reference}."""
+        return {name: self.get(ref) for name, ref in refs.items()}
+
+
+@lru_cache(maxsize=256)
+def _read_blob(path: str) -> str:
+    # Blobs never change once written, so they can be cached by path.
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def find_config_store(filepath: Union[str, Path]) -> Optional[ConfigStore]:
+    """Find the store of the data directory the file belongs to.
+
+    Parent directories of the file are checked one by one, so the data directory can be
+    moved as a whole.
+    """
+    for directory in Path(filepath).absolute().parents:
+        if (directory / CONFIG_STORE_DIRNAME).is_dir():
+            return ConfigStore(directory / CONFIG_STORE_DIRNAME)
+    return None
+
+
+def resolve_config_refs(filepath: Union[str, Path], refs: Dict[str, str]) -> Dict[str, str]:
+    """Return the contents of the configs referenced by the file at `filepath`."""
+    store = find_config_store(filepath)
+    if store is None:
+        raise ValueError(
+            f"File {filepath} references configs in '{CONFIG_STORE_DIRNAME}', "
+            "but no such directory is found next to the file or in its parents."
+        )
+    return store.resolve(refs)
+
+
+def inline_configs(filepath: Union[str, Path]) -> Dict[str, str]:
+    """Copy configs referenced by the file inside it, so it can be read without the store.
+
+    Returns:
+        Dict[str, str]: Configs that were written under `configs` key.
+    """
+    filepath = str(filepath)
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    data = DH5(filepath, overwrite=False, read_only=False, save_on_edit=False)
+    if "configs" in data:
+        return dict(data["configs"])
+    if CONFIG_REFS_KEY not in data:
+        return {}
+    configs = resolve_config_refs(filepath, dict(data[CONFIG_REFS_KEY]))
+    data["configs"] = configs
+    data.save(only_update=True)
+    return configs
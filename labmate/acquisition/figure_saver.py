@@ -0,0 +1,218 @@
+"""Copy, fingerprint and save figures in a background thread without blocking the notebook."""
+
+import copyreg
+import hashlib
+import io
+import pickle
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Iterator, List, Optional
+
+import numpy as np
+
+from ..logger import logger
+
+
+class _FigurePickler(pickle.Pickler):
+    """Pickler that does not register the copies of matplotlib figures inside pyplot."""
+
+    def __init__(self, file, figure_class: Optional[type]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._figure_class = figure_class
+
+    def reducer_override(self, obj):
+        if self._figure_class is not None and isinstance(obj, self._figure_class):
+            state = obj.__getstate__()
+            state.pop("_restore_to_pylab", None)
+            return copyreg.__newobj__, (type(obj),), state  # type: ignore
+        return NotImplemented
+
+
+class _FingerprintPickler(_FigurePickler):
+    """Pickler that ignores what differs between two figures drawn the same way.
+
+    These are the figure number, the order of the transforms that depends on their ids and
+    the callbacks. Callbacks are skipped, since pickling them changes their state.
+    """
+
+    def __init__(
+        self,
+        file,
+        figure_class: Optional[type],
+        transform_class: Optional[type],
+        callbacks_class: Optional[type],
+    ):
+        super().__init__(file, figure_class)
+        self._transform_class = transform_class
+        self._callbacks_class = callbacks_class
+
+    def reducer_override(self, obj):
+        if self._callbacks_class is not None and isinstance(obj, self._callbacks_class):
+            return copyreg.__newobj__, (type(obj),), None  # type: ignore
+        if self._transform_class is not None and isinstance(obj, self._transform_class):
+            state = obj.__getstate__()
+            state["_parents"] = list(state.get("_parents", {}).values())
+            return copyreg.__newobj__, (type(obj),), state  # type: ignore
+        reduced = super().reducer_override(obj)
+        if reduced is not NotImplemented:
+            reduced[2].pop("_number", None)
+        return reduced
+
+
+class _HashWriter:
+    """File-like object that only updates the hash with everything written to it."""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+
+    def write(self, data: Any) -> int:
+        # Big arrays are written as `pickle.PickleBuffer`, which has no len().
+        view = memoryview(data)
+        self.hash.update(view)
+        return view.nbytes
+
+
+def fingerprint_figure(fig: Any, *extra: Any) -> Optional[str]:
+    """Return a hash of the figure content and of `extra` values (e.g. savefig options).
+
+    Two figures drawn the same way have the same fingerprint as long as they are not drawn
+    or saved, since drawing changes the pickled state. Returns None if the figure cannot
+    be pickled.
+    """
+    try:
+        from matplotlib.cbook import CallbackRegistry
+        from matplotlib.figure import Figure
+        from matplotlib.transforms import TransformNode
+    except ImportError:
+        CallbackRegistry, Figure, TransformNode = None, None, None  # noqa: N806
+    writer = _HashWriter()
+    try:
+        _FingerprintPickler(writer, Figure, TransformNode, CallbackRegistry).dump(fig)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    writer.write(repr(extra).encode())
+    return writer.hash.hexdigest()
+
+
+def dumps_figure(fig: Any) -> bytes:
+    """Serialize the figure with pickle.
+
+    Unlike `pickle.dumps`, a matplotlib figure loaded afterwards is not attached to pyplot,
+    i.e. it is not shown and can be used from any thread.
+    """
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        Figure = None  # noqa: N806
+    buffer = io.BytesIO()
+    _FigurePickler(buffer, Figure).dump(fig)
+    return buffer.getvalue()
+
+
+def snapshot_figure(fig: Any) -> Any:
+    """Return an independent copy of the figure. Later changes of the figure do not affect it."""
+    return pickle.loads(dumps_figure(fig))  # noqa: S301
+
+
+VECTOR_FORMATS = ("pdf", "svg", "svgz", "eps", "ps")
+
+
+def count_points(artist: Any) -> int:
+    """Return the number of points (or cells) drawn by a line, a collection or a mesh."""
+    from matplotlib.collections import Collection, QuadMesh
+    from matplotlib.lines import Line2D
+
+    if isinstance(artist, Line2D):
+        return len(artist.get_xydata())  # type: ignore
+    if isinstance(artist, QuadMesh):
+        return int(np.prod(artist.get_coordinates().shape[:2]))
+    if isinstance(artist, Collection):
+        return max(len(artist.get_offsets()), len(artist.get_paths()))  # type: ignore
+    return 0
+
+
+@contextmanager
+def rasterized_heavy_artists(fig: Any, threshold: int) -> Iterator[list]:
+    """Rasterize the artists with more than `threshold` points until the context exits.
+
+    Axes, ticks and texts stay vectors. Yields the artists that were rasterized.
+    """
+    from matplotlib.collections import Collection
+    from matplotlib.lines import Line2D
+
+    artists = [
+        artist
+        for artist in fig.findobj(lambda artist: isinstance(artist, (Line2D, Collection)))
+        if not artist.get_rasterized() and count_points(artist) > threshold
+    ]
+    for artist in artists:
+        artist.set_rasterized(True)
+    try:
+        yield artists
+    finally:
+        for artist in artists:
+            artist.set_rasterized(False)
+
+
+THUMBNAIL_PIXELS = 320 * 240
+
+
+def write_thumbnail(fig: Any, filename: str, pixels: int = THUMBNAIL_PIXELS):
+    """Save a png of the figure that has about `pixels` pixels whatever the figure size is."""
+    width, height = fig.get_size_inches()
+    dpi = (pixels / (width * height)) ** 0.5
+    fig.savefig(filename, format="png", dpi=dpi)
+
+
+class FigureSaver:
+    """Run the saving of figures one by one in a background thread.
+
+    Errors are not raised, but reported with the logger.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, /, *args, name: str = "", **kwds) -> Future:
+        """Run `func(*args, **kwds)` in background. `name` is used to report errors."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="labmate_figures"
+                )
+            future = self._executor.submit(func, *args, **kwds)
+            self._futures.append(future)
+        future.add_done_callback(partial(self._on_done, name=name))
+        return future
+
+    def _on_done(self, future: Future, name: str):
+        with self._lock:
+            if future in self._futures:
+                self._futures.remove(future)
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            logger.error("Failed to save the figure %s due to %r", name, error)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted figure is saved.
+
+        Returns:
+            bool: False if some figures are still being saved after `timeout` seconds.
+        """
+        with self._lock:
+            futures = list(self._futures)
+        _, not_done = wait(futures, timeout=timeout)
+        return len(not_done) == 0
+
+    @property
+    def pending(self) -> int:
+        """Number of figures that are not saved yet."""
+        with self._lock:
+            return len(self._futures)
+
+
+figure_saver = FigureSaver()
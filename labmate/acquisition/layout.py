@@ -0,0 +1,109 @@
+"""Where the acquisition files are placed inside the data directory.
+
+Two layouts are supported:
+    - "flat": `data_directory/experiment_name/2024_05_01__10_00_00__experiment_name.h5`
+    - "date": `data_directory/experiment_name/2024/05/01/2024_05_01__10_00_00__experiment_name.h5`
+
+The date layout keeps directories small, so listing them stays fast on network drives.
+Files are found in both layouts whatever the layout used to create new ones, so a data
+directory can be switched from one to another at any time.
+"""
+
+import os
+import re
+from typing import Literal, Optional, Tuple, Union
+
+import h5py
+from dh5.path import Path
+
+
+Layout = Literal["flat", "date"]
+LAYOUTS = ("flat", "date")
+
+_DATE = re.compile(r"^(\d{4})_(\d{2})_(\d{2})__")
+
+
+def check_layout(layout: str) -> Layout:
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'. Possible layouts are {LAYOUTS}.")
+    return layout  # type: ignore
+
+
+def get_date_parts(filename: str) -> Optional[Tuple[str, str, str]]:
+    """Return (year, month, day) of a file name starting with a time stamp."""
+    match = _DATE.match(os.path.basename(filename))  # noqa: PTH119
+    return match.groups() if match else None  # type: ignore
+
+
+def _is_date_directory(directory: str) -> bool:
+    parts = directory.replace("\\", "/").rstrip("/").split("/")
+    return (
+        len(parts) >= 4
+        and len(parts[-3]) == 4
+        and all(part.isdecimal() for part in parts[-3:])
+        and [len(part) for part in parts[-2:]] == [2, 2]
+    )
+
+
+def get_experiment_directory(filepath: Union[str, Path]) -> str:
+    """Directory of the experiment, i.e. without the date directories of the date layout."""
+    directory = os.path.dirname(str(filepath))  # noqa: PTH120
+    if _is_date_directory(directory) and get_date_parts(str(filepath)):
+        for _ in range(3):
+            directory = os.path.dirname(directory)  # noqa: PTH120
+    return directory
+
+
+def get_directory(experiment_path: Union[str, Path], time_stamp: str, layout: Layout) -> Path:
+    """Directory of a new file of the experiment."""
+    experiment_path = Path(experiment_path)
+    if layout == "date":
+        date = get_date_parts(time_stamp + "__")
+        if date is None:
+            raise ValueError(f"Cannot get the date from the time stamp '{time_stamp}'")
+        return experiment_path.joinpath(*date)
+    return experiment_path
+
+
+def find_existing(filepath: Union[str, Path]) -> str:
+    """Return the path of the file in the layout where it exists.
+
+    The file is looked for where it's given and then in the other layout. If it's found
+    nowhere, the given path is returned. The `.h5` extension is kept as it's given.
+    """
+    filepath = str(filepath)
+    suffix = "" if filepath.endswith(".h5") else ".h5"
+    if os.path.exists(filepath + suffix):  # noqa: PTH110
+        return filepath
+
+    directory, name = os.path.split(filepath)
+    date = get_date_parts(name)
+    if date is None:
+        return filepath
+    if _is_date_directory(directory):
+        candidate = os.path.join(get_experiment_directory(filepath), name)  # noqa: PTH118
+    else:
+        candidate = os.path.join(directory, *date, name)  # noqa: PTH118
+    return candidate if os.path.exists(candidate + suffix) else filepath  # noqa: PTH110
+
+
+def reserve_filepath(filepath: Union[str, Path]) -> Path:
+    """Create an empty h5 file with a unique name and return its path without `.h5`.
+
+    The file is created with the exclusive flag, so two processes never get the same name.
+    If the name is taken, `__1`, `__2`, ... suffixes are tried.
+    """
+    filepath_original = str(filepath)
+    Path(os.path.dirname(filepath_original)).makedirs()  # noqa: PTH120
+    index = 0
+    while True:
+        filepath = filepath_original + (f"__{index}" if index else "")
+        try:
+            with h5py.File(filepath + ".h5", "x"):
+                pass
+            return Path(filepath)
+        except OSError:
+            # h5py does not always raise FileExistsError, so check the reason.
+            if not os.path.exists(filepath + ".h5"):  # noqa: PTH110
+                raise
+            index += 1
@@ -0,0 +1,447 @@
+"""LazyArray class.
+
+It records elementwise numpy operations and reductions on arrays (e.g. keys of an
+`AnalysisLoop`) and evaluates them only on `compute()`, chunk by chunk along the first axis.
+Chunks are evaluated on a local thread pool, so intermediate results are never fully
+materialized in memory.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+
+_DEFAULT_MAX_CHUNK_BYTES = 32 * 2**20
+
+
+def _default_workers() -> int:
+    return min(4, os.cpu_count() or 1)
+
+
+class _Node:
+    """Node of the computational graph. Evaluates rows `start:stop` of the result."""
+
+    length: int
+
+    def evaluate(self, rows: slice) -> np.ndarray:
+        raise NotImplementedError  # pragma: no cover
+
+    def probe(self) -> np.ndarray:
+        """Evaluate the first row of the result in order to get its dtype and shape."""
+        return self.evaluate(slice(0, min(1, self.length)))
+
+
+class _Source(_Node):
+    """Any array-like object that supports slicing along the first axis."""
+
+    def __init__(self, array: Any):
+        if not hasattr(array, "shape") or not hasattr(array, "__getitem__"):
+            array = np.asarray(array)
+        if len(array.shape) == 0:
+            raise ValueError("Cannot create a lazy array from a scalar.")
+        self.array = array
+        self.length = array.shape[0]
+
+    def evaluate(self, rows: slice) -> np.ndarray:
+        return np.asarray(self.array[rows])
+
+
+class _H5Source(_Node):
+    """Dataset inside an h5 file. The file is opened only to read the required rows."""
+
+    def __init__(self, filepath: str, key: str):
+        import h5py
+
+        self.filepath = filepath
+        self.key = key
+        with h5py.File(filepath, "r") as file:
+            dataset = file[key]
+            if not isinstance(dataset, h5py.Dataset) or len(dataset.shape) == 0:
+                raise ValueError(f"Key '{key}' is not an array inside {filepath}.")
+            self.length = dataset.shape[0]
+
+    def evaluate(self, rows: slice) -> np.ndarray:
+        import h5py
+
+        with h5py.File(self.filepath, "r") as file:
+            return np.asarray(file[self.key][rows])  # type: ignore
+
+
+class _RowSlice(_Node):
+    """Slice with positive step along the first axis of another node."""
+
+    def __init__(self, node: _Node, key: slice):
+        start, stop, step = key.indices(node.length)
+        if step <= 0:
+            raise ValueError("Only positive steps are supported along the first axis.")
+        self.node = node
+        self.start, self.step = start, step
+        self.length = len(range(start, stop, step))
+
+    def evaluate(self, rows: slice) -> np.ndarray:
+        start = self.start + rows.start * self.step
+        stop = self.start + rows.stop * self.step
+        return self.node.evaluate(slice(start, stop, self.step))
+
+
+class _Map(_Node):
+    """Function applied to the chunks of its arguments. Output rows match input rows."""
+
+    def __init__(self, func: Callable, args: tuple, kwargs: Dict[str, Any]):
+        self.func = func
+        self.kwargs = kwargs
+        lengths = {arg._node.length for arg in args if isinstance(arg, LazyArray)}
+        if len(lengths) != 1:
+            raise ValueError(
+                f"All lazy arrays should have the same length along the first axis. Got {lengths}."
+            )
+        self.length = lengths.pop()
+        ndim = max(arg.ndim for arg in args if isinstance(arg, LazyArray))
+        self.args = tuple(self._prepare_arg(arg, ndim) for arg in args)
+
+    def _prepare_arg(self, arg, ndim: int):
+        if isinstance(arg, LazyArray):
+            return arg._node
+        if isinstance(arg, np.ndarray) and arg.ndim == ndim and arg.shape[0] == self.length > 1:
+            # An array aligned with the rows of the result should be chunked as well. Arrays
+            # with fewer dimensions are broadcast along the last axes, so they are kept whole.
+            return _Source(arg)
+        return arg
+
+    def evaluate(self, rows: slice) -> np.ndarray:
+        args = [arg.evaluate(rows) if isinstance(arg, _Node) else arg for arg in self.args]
+        return np.asarray(self.func(*args, **self.kwargs))
+
+
+def _normalize_axis(axis, ndim: int) -> Optional[Tuple[int, ...]]:
+    if axis is None:
+        return None
+    axes = axis if isinstance(axis, tuple) else (axis,)
+    return tuple(int(ax) % ndim for ax in axes)
+
+
+class _Reduction:
+    """How to reduce a chunk and to combine partial results of several chunks."""
+
+    @staticmethod
+    def partial(chunk: np.ndarray, axis, name: str, dtype=None):
+        if dtype is not None:
+            chunk = chunk.astype(dtype, copy=False)
+        if name in ("sum", "min", "max"):
+            return getattr(np, name)(chunk, axis=axis)
+        count = chunk.size if axis is None else np.prod([chunk.shape[ax] for ax in axis])
+        mean = np.mean(chunk, axis=axis)
+        if name == "mean":
+            return count, mean
+        deviation = chunk - (mean if axis is None else np.expand_dims(mean, axis))
+        return count, mean, np.sum(np.abs(deviation) ** 2, axis=axis)
+
+    @staticmethod
+    def combine(first, second, name: str):
+        if name == "sum":
+            return first + second
+        if name in ("min", "max"):
+            return getattr(np, name + "imum")(first, second)
+        count = first[0] + second[0]
+        delta = second[1] - first[1]
+        mean = first[1] + delta * (second[0] / count)
+        if name == "mean":
+            return count, mean
+        m2 = first[2] + second[2] + np.abs(delta) ** 2 * (first[0] * second[0] / count)
+        return count, mean, m2
+
+    @staticmethod
+    def finalize(result, name: str, ddof: int = 0):
+        if name in ("sum", "min", "max"):
+            return result
+        if name == "mean":
+            return result[1]
+        var = result[2] / (result[0] - ddof)
+        return np.sqrt(var) if name == "std" else var
+
+
+class LazyReduction:
+    """Result of a reduction over the first axis of a `LazyArray`.
+
+    Nothing is computed until `compute()` is called.
+    """
+
+    def __init__(
+        self,
+        array: "LazyArray",
+        name: str,
+        axis: Optional[Tuple[int, ...]],
+        ddof: int = 0,
+        dtype=None,
+        keepdims: bool = False,
+    ):
+        self._array = array
+        self._name = name
+        self._axis = axis
+        self._ddof = ddof
+        self._dtype = dtype
+        self._keepdims = keepdims
+
+    def compute(
+        self, workers: Optional[int] = None, chunk_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Reduce the array chunk by chunk and return the result.
+
+        Args:
+            workers (int, optional): Number of threads. Defaults to min(4, cpu_count).
+            chunk_size (int, optional): Number of rows per chunk. Defaults to the value
+                of the array or to chunks of about 32 MB.
+        """
+        result = None
+        partials = self._array._map_chunks(
+            lambda chunk: _Reduction.partial(chunk, self._axis, self._name, self._dtype),
+            workers=workers,
+            chunk_size=chunk_size,
+        )
+        for partial in partials:
+            result = partial if result is None else _Reduction.combine(result, partial, self._name)
+        if result is None:
+            raise ValueError("Cannot reduce an empty array.")
+        result = np.asarray(_Reduction.finalize(result, self._name, self._ddof))
+        if self._keepdims:
+            axes = self._axis if self._axis is not None else tuple(range(self._array.ndim))
+            result = np.expand_dims(result, axes)
+        return result
+
+    def __array__(self, dtype=None, **kwargs):
+        return np.asarray(self.compute(), dtype=dtype, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"LazyReduction({self._name}, axis={self._axis})"
+
+
+class LazyArray(NDArrayOperatorsMixin):
+    """Array whose operations are recorded and evaluated chunk by chunk on `compute()`.
+
+    Elementwise numpy operations (operators and ufuncs) return a new `LazyArray`.
+    Reductions over other axes than the first one stay lazy, while reductions over the
+    first axis (or over all axes) return a `LazyReduction`. Any other function that
+    keeps the rows (e.g. demodulation) can be recorded with `map_chunks`.
+
+    Examples:
+        >>> signal = data.loop.lazy("signal")  # or data.lazy("loop/signal") to read from file
+        >>> demodulated = (signal * np.exp(-2j * np.pi * freq * t)).mean(axis=-1)
+        >>> average = np.abs(demodulated).mean(axis=0)
+        >>> average.compute(workers=4)
+    """
+
+    __array_priority__ = 20
+
+    def __init__(self, source: Any, /, *, chunk_size: Optional[int] = None):
+        """Create a lazy array.
+
+        Args:
+            source (array-like): Any object with `shape` that can be sliced along the first
+                axis, e.g. np.ndarray or h5py.Dataset.
+            chunk_size (int, optional): Number of rows evaluated at once. Defaults to chunks
+                of about 32 MB.
+        """
+        self._node: _Node = source if isinstance(source, _Node) else _Source(source)
+        self._chunk_size = chunk_size
+        self._probed: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_h5(cls, filepath: str, key: str, *, chunk_size: Optional[int] = None) -> "LazyArray":
+        """Create a lazy array that reads the rows of `key` from the h5 file only on demand."""
+        filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+        return cls(_H5Source(filepath, key), chunk_size=chunk_size)
+
+    def _new(self, node: _Node) -> "LazyArray":
+        return LazyArray(node, chunk_size=self._chunk_size)
+
+    def _probe(self) -> np.ndarray:
+        if self._probed is None:
+            self._probed = self._node.probe()
+        return self._probed
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self), *self._probe().shape[1:])
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._probe().dtype
+
+    @property
+    def ndim(self) -> int:
+        return self._probe().ndim
+
+    def __len__(self) -> int:
+        return self._node.length
+
+    def __repr__(self) -> str:
+        return f"LazyArray(shape={self.shape}, dtype={self.dtype})"
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if kwargs.get("out") is not None:
+            return NotImplemented
+        if method == "__call__":
+            return self._new(_Map(ufunc, inputs, kwargs))
+        if method == "reduce" and len(inputs) == 1:
+            name = {np.add: "sum", np.minimum: "min", np.maximum: "max"}.get(ufunc)
+            if name is not None:
+                options = {"keepdims": kwargs.get("keepdims", False)}
+                if kwargs.get("dtype") is not None:
+                    options["dtype"] = kwargs["dtype"]
+                return getattr(self, name)(axis=kwargs.get("axis", 0), **options)
+        return NotImplemented
+
+    def __array__(self, dtype=None, **kwargs):
+        return np.asarray(self.compute(), dtype=dtype, **kwargs)
+
+    def __getitem__(self, key) -> Union["LazyArray", np.ndarray]:
+        """Select rows and columns lazily.
+
+        Integer index along the first axis is evaluated directly.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) == 0:
+            return self
+        first, rest = key[0], key[1:]
+        if first is Ellipsis:
+            return self._new(_Map(lambda x: x[(slice(None), *key)], (self,), {}))
+        if isinstance(first, (int, np.integer)):
+            index = int(first)
+            if not -len(self) <= index < len(self):
+                raise IndexError(f"Index {index} is out of bounds for length {len(self)}.")
+            index %= len(self)
+            return self._node.evaluate(slice(index, index + 1))[0][rest]
+        if not isinstance(first, slice):
+            raise TypeError("Only slices and integers are supported along the first axis.")
+        array = self if first == slice(None) else self._new(_RowSlice(self._node, first))
+        if not rest:
+            return array
+        return array._new(_Map(lambda x: x[(slice(None), *rest)], (array,), {}))
+
+    def map_chunks(self, func: Callable[..., np.ndarray], *args, **kwargs) -> "LazyArray":
+        """Record a function that is applied to every chunk.
+
+        The function gets a chunk of rows as a first argument and should return an array
+        with the same number of rows. Other lazy arrays can be provided as arguments.
+        """
+        return self._new(_Map(func, (self, *args), kwargs))
+
+    def astype(self, dtype) -> "LazyArray":
+        return self.map_chunks(np.asarray, dtype=dtype)
+
+    @property
+    def real(self) -> "LazyArray":
+        return self.map_chunks(np.real)
+
+    @property
+    def imag(self) -> "LazyArray":
+        return self.map_chunks(np.imag)
+
+    def _reduce(
+        self, name: str, axis, ddof: int = 0, out=None, dtype=None, keepdims: bool = False
+    ) -> Union["LazyArray", LazyReduction]:
+        if out is not None:
+            raise ValueError("LazyArray does not support `out` argument.")
+        axes = _normalize_axis(axis, self.ndim)
+        if axes is None or 0 in axes:
+            return LazyReduction(self, name, axes, ddof=ddof, dtype=dtype, keepdims=keepdims)
+        func = getattr(np, name)
+        kwargs: Dict[str, Any] = {"axis": axes}
+        if ddof:
+            kwargs["ddof"] = ddof
+        if dtype is not None:
+            kwargs["dtype"] = dtype
+        if keepdims:
+            kwargs["keepdims"] = True
+        return self.map_chunks(func, **kwargs)
+
+    def sum(
+        self, axis=None, dtype=None, out=None, keepdims: bool = False
+    ) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("sum", axis, out=out, dtype=dtype, keepdims=keepdims)
+
+    def mean(
+        self, axis=None, dtype=None, out=None, keepdims: bool = False
+    ) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("mean", axis, out=out, dtype=dtype, keepdims=keepdims)
+
+    def min(self, axis=None, out=None, keepdims: bool = False) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("min", axis, out=out, keepdims=keepdims)
+
+    def max(self, axis=None, out=None, keepdims: bool = False) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("max", axis, out=out, keepdims=keepdims)
+
+    def var(
+        self, axis=None, dtype=None, out=None, ddof: int = 0, keepdims: bool = False
+    ) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("var", axis, ddof=ddof, out=out, dtype=dtype, keepdims=keepdims)
+
+    def std(
+        self, axis=None, dtype=None, out=None, ddof: int = 0, keepdims: bool = False
+    ) -> Union["LazyArray", LazyReduction]:
+        return self._reduce("std", axis, ddof=ddof, out=out, dtype=dtype, keepdims=keepdims)
+
+    def _get_chunk_size(self, chunk_size: Optional[int]) -> int:
+        chunk_size = chunk_size or self._chunk_size
+        if chunk_size is None:
+            row = self._probe()
+            row_nbytes = max(1, row.nbytes // max(1, len(row)))
+            chunk_size = _DEFAULT_MAX_CHUNK_BYTES // row_nbytes
+        return max(1, int(chunk_size))
+
+    def _map_chunks(
+        self,
+        func: Callable[[np.ndarray], Any],
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        with_rows: bool = False,
+    ) -> Iterator[Any]:
+        """Evaluate the chunks on a thread pool and yield `func(chunk)` in order.
+
+        At most `2 * workers` chunks are in flight, so the memory stays bounded.
+        """
+        chunk_size = self._get_chunk_size(chunk_size)
+        workers = workers or _default_workers()
+        rows = (
+            slice(start, min(start + chunk_size, len(self)))
+            for start in range(0, len(self), chunk_size)
+        )
+
+        def task(sl: slice):
+            result = func(self._node.evaluate(sl))
+            return (sl, result) if with_rows else result
+
+        if workers == 1:
+            yield from map(task, rows)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending: deque = deque()
+            for sl in rows:
+                pending.append(pool.submit(task, sl))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def compute(
+        self, workers: Optional[int] = None, chunk_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Evaluate the array chunk by chunk and return the result.
+
+        Args:
+            workers (int, optional): Number of threads. Defaults to min(4, cpu_count).
+            chunk_size (int, optional): Number of rows per chunk. Defaults to the value
+                given on init or to chunks of about 32 MB.
+        """
+        output = np.empty(self.shape, dtype=self.dtype)
+        for rows, chunk in self._map_chunks(
+            lambda chunk: chunk, workers=workers, chunk_size=chunk_size, with_rows=True
+        ):
+            output[rows] = chunk
+        return output
@@ -0,0 +1,263 @@
+"""Rewrite acquisition files to reclaim the space left by grown and overwritten datasets.
+
+HDF5 never frees the space of a deleted or resized dataset, so files saved many times
+(e.g. by `AcquisitionLoop` or with `save_on_edit`) can be several times bigger than their
+data. `repack_file` copies everything to a new file, with chunking and compression for
+the big arrays, checks that every value and attribute is the same in the copy and only
+then replaces the original file.
+
+Examples:
+    >>> repack_file("2024_05_01__10_00_00__rabi.h5")
+    >>> repack_directory(data_directory, workers=8)
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Union
+
+import h5py
+import numpy as np
+from dh5.dh5_class.h5py_utils import LockFile
+from dh5.errors import FileLockedError
+
+from ..logger import logger
+
+
+_REPACK_SUFFIX = ".repack"
+
+
+class RepackResult(NamedTuple):
+    """Outcome of the repacking of one file.
+
+    Attributes:
+        filepath (str): Path to the h5 file.
+        size_before (int): Size of the file before, in bytes.
+        size_after (int): Size of the file now, in bytes.
+        replaced (bool): True if the file was replaced by the repacked copy.
+        error (str, optional): Reason why the file was not repacked.
+    """
+
+    filepath: str
+    size_before: int
+    size_after: int
+    replaced: bool
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _digest(value: Any) -> bytes:
+    """Hash of a value that does not depend on how it's stored in the file."""
+    if isinstance(value, h5py.Empty):
+        return f"empty:{value.dtype}".encode()
+    array = np.asarray(value)
+    digest = hashlib.sha256(f"{array.dtype}:{array.shape}".encode())
+    if array.dtype.kind == "O":
+        digest.update(repr(array.tolist()).encode())
+    else:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.digest()
+
+
+def _copy_attrs(source: h5py.AttributeManager, target: h5py.AttributeManager) -> Dict[str, bytes]:
+    digests = {}
+    for name in source:
+        value = source[name]
+        target.create(name, value, dtype=source.get_id(name).dtype)
+        digests[name] = _digest(value)
+    return digests
+
+
+def _dataset_options(dataset: h5py.Dataset, compression_level: int, min_size: int) -> dict:
+    if dataset.shape is None or dataset.ndim == 0 or dataset.dtype.kind not in "biufc":
+        return {}
+    if dataset.nbytes < min_size:
+        return {}
+    return {
+        "chunks": True,
+        "compression": "gzip",
+        "compression_opts": compression_level,
+        "shuffle": True,
+    }
+
+
+def _copy(source: h5py.File, target: h5py.File, compression_level: int, min_size: int) -> dict:
+    """Copy every group, dataset, link and attribute. Return the digests of the source."""
+    digests: Dict[str, Any] = {"/": _copy_attrs(source.attrs, target.attrs)}
+
+    def copy_item(name: str, _):
+        link = source.get(name, getlink=True)
+        if isinstance(link, (h5py.SoftLink, h5py.ExternalLink)):
+            target[name] = link
+            digests[name] = repr(link)
+            return
+        item = source[name]
+        if isinstance(item, h5py.Group):
+            group = target.create_group(name)
+            digests[name] = _copy_attrs(item.attrs, group.attrs)
+            return
+        if item.is_virtual:
+            raise ValueError(f"Dataset '{name}' is virtual and cannot be repacked")
+        value = item[()] if item.shape is not None else h5py.Empty(item.dtype)
+        dataset = target.create_dataset(
+            name,
+            data=value,
+            dtype=item.dtype,
+            **_dataset_options(item, compression_level, min_size),
+        )
+        digests[name] = (_digest(value), _copy_attrs(item.attrs, dataset.attrs))
+
+    source.visititems(copy_item)
+    return digests
+
+
+def _read_digests(file: h5py.File) -> dict:
+    digests: Dict[str, Any] = {"/": {name: _digest(file.attrs[name]) for name in file.attrs}}
+
+    def read_item(name: str, _):
+        link = file.get(name, getlink=True)
+        if isinstance(link, (h5py.SoftLink, h5py.ExternalLink)):
+            digests[name] = repr(link)
+            return
+        item = file[name]
+        attrs = {key: _digest(item.attrs[key]) for key in item.attrs}
+        if isinstance(item, h5py.Group):
+            digests[name] = attrs
+        else:
+            value = item[()] if item.shape is not None else h5py.Empty(item.dtype)
+            digests[name] = (_digest(value), attrs)
+
+    file.visititems(read_item)
+    return digests
+
+
+def repack_file(
+    filepath: Union[str, Path],
+    compression_level: int = 4,
+    min_size: int = 1024,
+    retries: int = 5,
+) -> RepackResult:
+    """Rewrite the file without dead space and with compressed big arrays.
+
+    The copy is written next to the file and read back. The original is replaced only if
+    all values and attributes are the same and the copy is smaller. The replacement is
+    done with `os.replace` while the file is locked as for any other writing by DH5, and
+    is skipped if the file was modified during the copy.
+
+    Args:
+        filepath (str): Path to the h5 file.
+        compression_level (int): Level of gzip compression from 0 to 9. Defaults to 4.
+        min_size (int): Arrays smaller than this number of bytes are not compressed.
+        retries (int): Attempts to lock the file, 0.1s apart.
+    """
+    filepath = str(filepath)
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    stat = os.stat(filepath)  # noqa: PTH116
+    directory, name = os.path.split(filepath)
+    fd, temp_name = tempfile.mkstemp(
+        dir=directory or ".", prefix=f".{name}.", suffix=_REPACK_SUFFIX
+    )
+    os.close(fd)
+    try:
+        with h5py.File(filepath, "r") as source, h5py.File(temp_name, "w") as target:
+            expected = _copy(source, target, compression_level, min_size)
+        with h5py.File(temp_name, "r") as target:
+            if _read_digests(target) != expected:
+                raise ValueError("The repacked copy differs from the original file")
+
+        size_after = os.path.getsize(temp_name)  # noqa: PTH202
+        if size_after >= stat.st_size:
+            return RepackResult(filepath, stat.st_size, stat.st_size, replaced=False)
+        # `mkstemp` creates the copy readable only by its owner, so keep the original mode.
+        shutil.copymode(filepath, temp_name)
+
+        for i in range(retries):
+            try:
+                with LockFile(filepath):
+                    current = os.stat(filepath)  # noqa: PTH116
+                    if (current.st_mtime_ns, current.st_size) != (stat.st_mtime_ns, stat.st_size):
+                        raise ValueError("The file was modified during repacking")
+                    os.replace(temp_name, filepath)  # noqa: PTH105
+                break
+            except FileLockedError:
+                if i == retries - 1:
+                    raise
+                logger.info("File is locked. Waiting 0.1s and %d more retrying.", retries - i - 1)
+                time.sleep(0.1)
+        return RepackResult(filepath, stat.st_size, size_after, replaced=True)
+    except Exception as error:  # pylint: disable=broad-except
+        return RepackResult(
+            filepath,
+            stat.st_size,
+            stat.st_size,
+            replaced=False,
+            error=f"{type(error).__name__}: {error}",
+        )
+    finally:
+        Path(temp_name).unlink(missing_ok=True)
+
+
+def find_h5_files(directory: Union[str, Path]) -> List[str]:
+    """Every h5 file inside the directory, except the ones in hidden directories (e.g. caches)."""
+    directory = Path(directory)
+    return sorted(
+        str(filepath)
+        for filepath in directory.rglob("*.h5")
+        if not any(part.startswith(".") for part in filepath.relative_to(directory).parts)
+    )
+
+
+def repack_files(
+    filepaths: Iterable[Union[str, Path]],
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[RepackResult], Any]] = None,
+    **kwds,
+) -> List[RepackResult]:
+    """Repack the files in a process pool. See `repack_file` for the other arguments.
+
+    Args:
+        filepaths (Iterable[str]): Paths to the h5 files.
+        workers (int, optional): Number of processes. Defaults to the number of cores.
+            With 1 the files are repacked one by one in the current process.
+        progress (Callable, optional): Called with every result as soon as it's ready.
+
+    Returns:
+        List[RepackResult]: Results in the order of `filepaths`.
+    """
+    filepaths = [str(filepath) for filepath in filepaths]
+    if workers == 1 or len(filepaths) <= 1:
+        results = []
+        for filepath in filepaths:
+            results.append(repack_file(filepath, **kwds))
+            if progress is not None:
+                progress(results[-1])
+        return results
+
+    results_by_index: Dict[int, RepackResult] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(repack_file, filepath, **kwds): index
+            for index, filepath in enumerate(filepaths)
+        }
+        for future in as_completed(futures):
+            results_by_index[futures[future]] = result = future.result()
+            if progress is not None:
+                progress(result)
+    return [results_by_index[index] for index in range(len(filepaths))]
+
+
+def repack_directory(
+    directory: Union[str, Path],
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[RepackResult], Any]] = None,
+    **kwds,
+) -> List[RepackResult]:
+    """Repack every h5 file of the directory in parallel. See `repack_files`."""
+    return repack_files(find_h5_files(directory), workers=workers, progress=progress, **kwds)
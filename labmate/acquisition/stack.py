@@ -0,0 +1,270 @@
+"""Stack one key of many acquisition files into a single array without loading them.
+
+If the key has the same shape and type in every file, an HDF5 virtual dataset that points
+to the original files is created, so nothing is copied. Otherwise the data is copied once,
+padded with NaN, into a `.npy` file that is then memory-mapped. Both are kept in a cache
+directory and reused until one of the files changes. A new entry replaces the older ones
+of the same key and files, and the least recently used entries are removed once the cache
+is bigger than `max_cache_size`.
+
+Examples:
+    >>> signal = stack("loop/signal", files, cache_directory)
+    >>> signal[:, 10]  # 10th point of every run, only this is read from the disk
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+
+from .lazy_array import LazyArray
+
+
+STACK_CACHE_DIRNAME = ".stack_cache"
+DEFAULT_MAX_CACHE_SIZE = 4 * 2**30
+_DATASET = "data"
+_CACHE_SUFFIXES = (".h5", ".npy")
+
+
+def _describe(filepath: str, key: str) -> Tuple[Tuple[int, ...], np.dtype]:
+    with h5py.File(filepath, "r") as file:
+        if key not in file:
+            raise KeyError(f"Key '{key}' is not found")
+        dataset = file[key]
+        if not isinstance(dataset, h5py.Dataset):
+            raise ValueError(f"Key '{key}' is a group. Give the key of one of its arrays.")
+        return dataset.shape, dataset.dtype
+
+
+def _cache_name(key: str, filepaths: List[str], virtual: bool) -> Tuple[str, str]:
+    """Return the prefix given by the key and the files, and the full name of the cache file.
+
+    The name changes when any of the files is modified, the prefix stays the same.
+    """
+    prefix = hashlib.sha256("\0".join([key, *filepaths]).encode()).hexdigest()[:32]
+    digest = hashlib.sha256(key.encode())
+    for filepath in filepaths:
+        stat = Path(filepath).stat()
+        digest.update(f"\0{filepath}\0{stat.st_mtime_ns}\0{stat.st_size}".encode())
+    return prefix, f"{prefix}_{digest.hexdigest()[:32]}.{'h5' if virtual else 'npy'}"
+
+
+def _remove(filename: Path) -> int:
+    """Remove a cache file and return its size. A file still opened on Windows is kept."""
+    try:
+        size = filename.stat().st_size
+        filename.unlink()
+    except OSError:
+        return 0
+    return size
+
+
+def _evict(filename: Path, prefix: str, max_cache_size: Optional[int]):
+    """Remove the older entries of the same prefix and the least recently used ones."""
+    entries = []
+    for entry in filename.parent.iterdir():
+        if entry == filename or entry.suffix not in _CACHE_SUFFIXES:
+            continue
+        if entry.name.startswith(prefix + "_"):
+            _remove(entry)
+        else:
+            entries.append(entry)
+    if max_cache_size is None:
+        return
+
+    stats = {}
+    for entry in entries:
+        try:
+            stats[entry] = entry.stat()
+        except OSError:
+            continue
+    total = filename.stat().st_size + sum(stat.st_size for stat in stats.values())
+    for entry in sorted(stats, key=lambda entry: stats[entry].st_mtime_ns):
+        if total <= max_cache_size:
+            break
+        total -= _remove(entry)
+
+
+def _write_virtual(
+    filename: Path, key: str, filepaths: List[str], shape: Tuple[int, ...], dtype: np.dtype
+):
+    layout = h5py.VirtualLayout(shape=(len(filepaths), *shape), dtype=dtype)
+    for index, filepath in enumerate(filepaths):
+        layout[index] = h5py.VirtualSource(filepath, key, shape=shape)
+    fillvalue = np.nan if dtype.kind in "fc" else None
+    with h5py.File(filename, "w") as file:
+        file.create_virtual_dataset(_DATASET, layout, fillvalue=fillvalue)
+
+
+def _write_padded(
+    filename: Path, key: str, filepaths: List[str], shape: Tuple[int, ...], dtype: np.dtype
+):
+    array = np.lib.format.open_memmap(
+        filename, mode="w+", dtype=dtype, shape=(len(filepaths), *shape)
+    )
+    array[...] = np.nan
+    for index, filepath in enumerate(filepaths):
+        with h5py.File(filepath, "r") as file:
+            data = file[key][()]
+        array[(index, *(slice(0, size) for size in np.shape(data)))] = data
+    array.flush()
+    del array
+
+
+def _write_atomically(filename: Path, writer, *args):
+    """Write to a temporary file first, so other processes never see a partial cache."""
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        writer(Path(temp_name), *args)
+        Path(temp_name).replace(filename)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+class StackedArray:
+    """Array of shape (runs, *shape) backed by a cache file. Only indexed parts are read.
+
+    Attributes:
+        paths (List[str]): Files in the order of the first (run) axis.
+        errors (Dict[str, str]): Files that were skipped with the reason.
+        filename (Path): Cache file, i.e. the virtual dataset or the `.npy` file.
+        virtual (bool): True if the data is not copied but read from the original files.
+    """
+
+    def __init__(self, filename: Path, paths: List[str], errors: Dict[str, str], virtual: bool):
+        self.filename = filename
+        self.paths = paths
+        self.errors = errors
+        self.virtual = virtual
+        self._file: Optional[h5py.File] = None
+        self._array: Any = None
+
+    def _get_array(self):
+        if self._array is None:
+            if self.virtual:
+                self._file = h5py.File(self.filename, "r")
+                self._array = self._file[_DATASET]
+            else:
+                self._array = np.load(self.filename, mmap_mode="r")
+        return self._array
+
+    def close(self):
+        """Release the cache file. It's opened again on the next access."""
+        if self._file is not None:
+            self._file.close()
+        self._file = self._array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._get_array().shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._get_array().dtype
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        return np.asarray(self._get_array()[key])
+
+    def __array__(self, dtype=None, **kwargs):
+        array = self._get_array()[()]
+        return array if dtype is None else array.astype(dtype)
+
+    def lazy(self, chunk_size: Optional[int] = None) -> LazyArray:
+        """Return a `LazyArray` over the runs to compute reductions chunk by chunk."""
+        if self.virtual:
+            return LazyArray.from_h5(str(self.filename), _DATASET, chunk_size=chunk_size)
+        return LazyArray(self._get_array(), chunk_size=chunk_size)
+
+    def __repr__(self) -> str:
+        kind = "virtual" if self.virtual else "padded"
+        return f"StackedArray(shape={self.shape}, dtype={self.dtype}, {kind})"
+
+
+def stack(
+    key: str,
+    filepaths: Iterable[Union[str, Path]],
+    cache_directory: Union[str, Path],
+    max_cache_size: Optional[int] = DEFAULT_MAX_CACHE_SIZE,
+) -> StackedArray:
+    """Stack `key` of every file along a new first axis.
+
+    Files that cannot be read, miss the key or whose key has a different number of
+    dimensions than in most of the files are skipped and reported in `errors`.
+
+    Args:
+        key (str): Key of the array, e.g. "loop/signal".
+        filepaths (Iterable[str]): Paths to the h5 files.
+        cache_directory (str): Directory where the virtual dataset or the padded copy is kept.
+        max_cache_size (int, optional): Size of the cache directory in bytes above which
+            the least recently used entries are removed. The new entry is always kept.
+            None for no limit. Defaults to 4 GiB.
+
+    Raises:
+        ValueError: If none of the files has the key or if shapes differ and the data
+            is not numeric, so it cannot be padded with NaN.
+    """
+    filepaths = [
+        os.path.abspath(filepath if str(filepath).endswith(".h5") else f"{filepath}.h5")  # noqa: PTH100
+        for filepath in filepaths
+    ]
+    errors: Dict[str, str] = {}
+    described: Dict[str, Tuple[Tuple[int, ...], np.dtype]] = {}
+    for filepath in filepaths:
+        try:
+            described[filepath] = _describe(filepath, key)
+        except Exception as error:  # pylint: disable=broad-except
+            errors[filepath] = f"{type(error).__name__}: {error}"
+    if not described:
+        raise ValueError(f"None of the files has the key '{key}'. Errors: {errors}")
+
+    ndims = Counter(len(shape) for shape, _ in described.values())
+    expected_ndim = ndims.most_common(1)[0][0]
+    for filepath, (shape, _) in described.items():
+        if len(shape) != expected_ndim:
+            errors[filepath] = (
+                f"'{key}' has {len(shape)} dimensions, but {expected_ndim} in other files"
+            )
+    paths = [filepath for filepath in filepaths if filepath in described and filepath not in errors]
+
+    shapes = {described[filepath][0] for filepath in paths}
+    dtypes = {described[filepath][1] for filepath in paths}
+    virtual = len(shapes) == 1 and len(dtypes) == 1
+    if virtual:
+        shape, dtype = shapes.pop(), dtypes.pop()
+        writer = _write_virtual
+    else:
+        if any(dtype.kind not in "biufc" for dtype in dtypes):
+            raise ValueError(f"Shapes of '{key}' differ and its values cannot be padded with NaN")
+        shape = tuple(max(sizes) for sizes in zip(*shapes))
+        dtype = np.result_type(*dtypes, np.float32)
+        writer = _write_padded
+
+    prefix, name = _cache_name(key, paths, virtual)
+    filename = Path(cache_directory) / name
+    if filename.exists():
+        os.utime(filename)  # marks the entry as recently used
+    else:
+        _write_atomically(filename, writer, key, paths, shape, dtype)
+        _evict(filename, prefix, max_cache_size)
+    return StackedArray(filename, paths, errors, virtual)
@@ -5,3 +5,4 @@ from .acquisition_analysis_manager import (
     AcquisitionAnalysisManager,
     AcquisitionAnalysisManagerDataOnly,
 )
+from .reanalysis import ReanalysisResult, reanalyse
@@ -16,6 +16,7 @@ from typing import (
 
 from .. import display, utils
 from ..acquisition import AcquisitionManager, AnalysisData
+from ..acquisition.figure_saver import figure_saver
 from ..logger import logger
 from . import display_widget
 
@@ -23,8 +24,10 @@ from . import display_widget
 if TYPE_CHECKING:
     from dh5.path import Path
 
-    from ..acquisition import FigureProtocol
+    from ..acquisition import AcquisitionRecord, FigureProtocol, NotebookAcquisitionData
     from ..acquisition.config_file import ConfigFile
+    from ..acquisition.layout import Layout
+    from .reanalysis import ReanalysisResult
 
     # from ..logger import Logger
 
@@ -64,6 +67,7 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
     _analysis_data: Optional[AnalysisData] = None
     _analysis_cell_str = None
+    _running_cell = False
     _is_old_data = False
     _last_fig_name = None
     _default_config_files: Tuple[str, ...] = ()
@@ -83,6 +87,12 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         save_on_edit: bool = True,
         save_on_edit_analysis: Optional[bool] = None,
         save_fig_inside_h5: bool = False,
+        save_fig_async: bool = False,
+        save_thumbnails: bool = False,
+        save_fig_pickle: bool = False,
+        config_store: bool = False,
+        catalog: bool = False,
+        layout: "Layout" = "flat",
         shell: Any = True,
     ):
         """
@@ -102,6 +112,23 @@ class AcquisitionAnalysisManager(AcquisitionManager):
                 True to save data for every change.
             save_on_edit_analysis (bool. Defaults to same as save_on_edit):
                 save_on_edit parameter for AnalysisManager i.e. data inside analysis_cell
+            save_fig_async (bool, optional):
+                True to save figures in background. Use `wait_figures` to wait for them.
+                Defaults to False.
+            save_thumbnails (bool, optional):
+                True to save a small png preview near every figure. Defaults to False.
+            save_fig_pickle (bool, optional):
+                True to keep the pickle of the figures saved inside h5 file, so they can be
+                edited again with `open_figs(allow_pickle=True)`. Defaults to False.
+            config_store (bool, optional):
+                True to keep config files once in `data_directory/.config_store` and to save
+                only references to them inside acquisitions and `temp.json`. Defaults to False.
+            catalog (bool, optional):
+                True to keep a SQLite catalog of the acquisitions in `data_directory`.
+                Defaults to False.
+            layout ("flat" | "date", optional):
+                "date" to put new files of an experiment in `experiment_name/YYYY/MM/DD/`
+                directories. Files are found in both layouts. Defaults to "flat".
             shell (InteractiveShell | None, optional. Defaults to True):
                 could be provided or explicitly set to None. Defaults to get_ipython().
         """
@@ -125,6 +152,9 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         self._save_on_edit_analysis = save_on_edit_analysis
         self._save_fig_inside_h5 = save_fig_inside_h5
+        self._save_fig_async = save_fig_async
+        self._save_thumbnails = save_thumbnails
+        self._save_fig_pickle = save_fig_pickle
 
         self._logger = logger
         super().__init__(
@@ -132,6 +162,9 @@ class AcquisitionAnalysisManager(AcquisitionManager):
             config_files=config_files,
             save_files=save_files,
             save_on_edit=save_on_edit,
+            config_store=config_store,
+            catalog=catalog,
+            layout=layout,
         )
 
     @property
@@ -166,7 +199,7 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         self,
         fig: Optional["FigureProtocol"] = None,
         name: Optional[Union[str, int]] = None,
-        extensions: Optional[str] = None,
+        extensions: Optional[Union[str, Tuple[str, ...]]] = None,
         **kwds,
     ) -> "AcquisitionAnalysisManager":
         """Save the figure as a file.
@@ -176,7 +209,8 @@ class AcquisitionAnalysisManager(AcquisitionManager):
              function save_fig implemented. By default gets plt.gcf().
             name (str, optional): Name of the fig. It's a suffix that will be added to the filename.
                 Defaults to None.
-            extensions(str, optional): Extensions of the file. Defaults to `pdf`.
+            extensions(str | tuple[str, ...], optional): Extensions of the file. Defaults to `pdf`.
+                If several are given, the figure is saved to every format at once.
             tight_layout(bool, optional): True to call fig.tight_layout(). Defaults to True.
 
         Raises:
@@ -188,6 +222,17 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         self.data.save_fig(fig=fig, name=name, extensions=extensions, **kwds)
         return self
 
+    def wait_figures(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the figures saved in background are written.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to no limit.
+
+        Return:
+            False if some figures are still being saved after the timeout.
+        """
+        return figure_saver.wait(timeout)
+
     def save_analysis_cell(
         self,
         name: Optional[Union[str, int]] = None,
@@ -265,19 +310,27 @@ class AcquisitionAnalysisManager(AcquisitionManager):
     def _load_analysis_data(self, filepath: Optional[str] = None):
         filepath = filepath or str(self.current_filepath)
 
-        self._analysis_data = self.load_file(filepath)
+        acquisition = None if self._is_old_data else self._current_acquisition
+        if acquisition is not None and acquisition.filepath != filepath:
+            acquisition = None
+
+        self._analysis_data = self.load_file(filepath, acquisition=acquisition)
 
         if self._save_on_edit_analysis is False:
             self._analysis_data.save()
 
         return self._analysis_data
 
-    def load_file(self, filename) -> "AnalysisData":
+    def load_file(
+        self, filename, *, acquisition: Optional["NotebookAcquisitionData"] = None
+    ) -> "AnalysisData":
         """
         Loads an analysis data file.
 
         Args:
             filename (str): The name of the file to load.
+            acquisition (NotebookAcquisitionData, optional): Acquisition that was saved to
+                this file. Its arrays are reused instead of being read again from the file.
 
         Returns:
             AnalysisData: An instance of AnalysisData containing the loaded data.
@@ -294,13 +347,19 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         if not os.path.exists(filename if filename.endswith(".h5") else filename + ".h5"):  # noqa: PTH110
             raise ValueError(f"File {filename} cannot be found")
 
-        data = AnalysisData(
-            filepath=filename,
-            save_files=self._save_files,
-            save_on_edit=self._save_on_edit_analysis,
-            save_fig_inside_h5=self._save_fig_inside_h5,
-            open_on_init=False,
-        )
+        kwds = {
+            "save_files": self._save_files,
+            "save_on_edit": self._save_on_edit_analysis,
+            "save_fig_inside_h5": self._save_fig_inside_h5,
+            "save_fig_async": self._save_fig_async,
+            "save_thumbnails": self._save_thumbnails,
+            "save_fig_pickle": self._save_fig_pickle,
+            "open_on_init": False,
+        }
+        if acquisition is not None:
+            data = AnalysisData.from_acquisition(acquisition, **kwds)
+        else:
+            data = AnalysisData(filepath=filename, **kwds)
 
         if not data.get("useful", True):
             data.unlock_data("useful").update(**{"useful": True}).lock_data("useful")
@@ -373,6 +432,9 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         prerun: Optional[Union[_CallableWithNoArgs, List[_CallableWithNoArgs]]] = None,
     ) -> "AcquisitionAnalysisManager":
         # self.shell.get_local_scope(1)['result'].info.raw_cell  # type: ignore
+        if self._running_cell:
+            # The cell run by `run_analysis_cell` already points to its file.
+            return self
 
         self._analysis_cell_str = cell or get_current_cell(self.shell)
         if filename or filepath:  # getting old data
@@ -454,6 +516,46 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         return self
 
+    def run_analysis_cell(
+        self,
+        cell: str,
+        filepath: Union[str, "Path"],
+        namespace: Optional[Dict[str, Any]] = None,
+        name: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Run the analysis `cell` on the file without the notebook.
+
+        The cell is executed with `aqm` being this manager. Its own `aqm.analysis_cell(...)`
+        does nothing, since the manager already points to `filepath`. The cell is saved with
+        the figures it makes, and under `name` if it's given.
+
+        Examples:
+            >>> aqm.run_analysis_cell(code, "2024_05_01__rabi", name="reanalysis")
+
+        Args:
+            cell (str): Code of the analysis cell.
+            filepath (str | Path): File to analyse.
+            namespace (dict, optional): Globals of the cell. Defaults to a new dictionary.
+            name (str, optional): Name under which the cell is saved. Defaults to not saving
+                it before a figure is saved.
+
+        Returns:
+            dict: The namespace after the cell was executed.
+        """
+        self.analysis_cell(filepath=filepath)
+        self._analysis_cell_str = cell
+        if name is not None:
+            self.save_analysis_cell(name=name, cell=cell)
+
+        namespace = {"__name__": "__main__"} if namespace is None else namespace
+        namespace["aqm"] = self
+        self._running_cell = True
+        try:
+            exec(compile(cell, f"{filepath}:{name or 'analysis_cell'}", "exec"), namespace)  # noqa: S102
+        finally:
+            self._running_cell = False
+        return namespace
+
     def get_analysis_code(self, look_inside: bool = True) -> str:
         code = self.data.get_analysis_code(update_code=look_inside)
 
@@ -461,17 +563,47 @@ class AcquisitionAnalysisManager(AcquisitionManager):
             self.shell.set_next_input(code)  # type: ignore
         return code
 
-    # def open_analysis_fig(self) -> List[FigureProtocol]:
-    #     return self.data.open_fig()
+    def reanalyse(
+        self,
+        paths_or_query: Union[Iterable[Union[str, "Path", "AcquisitionRecord"]], Dict[str, Any]],
+        code: Optional[str] = None,
+        cell_name: str = "default",
+        workers: Optional[int] = None,
+        progress: Optional[Callable[["ReanalysisResult"], Any]] = None,
+    ) -> List["ReanalysisResult"]:
+        """Run the saved analysis cell (or `code`) again on many files in worker processes.
+
+        Examples:
+            >>> results = aqm.reanalyse({"name": "^rabi", "since": "2024_05"}, workers=8)
+            >>> [result.error for result in results if not result.ok]
 
-    def _get_full_filename(self, filename: Union[str, "Path"]) -> str:
-        if filename is None:
-            raise ValueError("Filename cannot be None")
+        Args:
+            paths_or_query: Files (paths, names or records of the catalog) or arguments
+                of `find`.
+            code (str, optional): Cell to run instead of the one saved inside the files. It's
+                saved under the name "reanalysis", the original cell is kept.
+            cell_name (str): Name of the saved cell. Defaults to "default".
+            workers (int, optional): Number of processes. See `reanalysis.reanalyse`.
+            progress (Callable, optional): Called with every result as soon as it's ready.
+        """
+        from .reanalysis import reanalyse
+
+        return reanalyse(
+            self.resolve_filepaths(paths_or_query),
+            self.data_directory,
+            code=code,
+            cell_name=cell_name,
+            workers=workers,
+            manager_kwargs={
+                "save_fig_inside_h5": self._save_fig_inside_h5,
+                "save_thumbnails": self._save_thumbnails,
+                "save_fig_pickle": self._save_fig_pickle,
+            },
+            progress=progress,
+        )
 
-        filepath = utils.get_path_from_filename(filename)
-        if isinstance(filepath, tuple):
-            return os.path.join(self.data_directory, *filepath)  # noqa: PTH118
-        return filepath
+    # def open_analysis_fig(self) -> List[FigureProtocol]:
+    #     return self.data.open_fig()
 
     def parse_config_file(self, config_file_name: str, /) -> "ConfigFile":
         return self.data.parse_config_file(config_file_name)
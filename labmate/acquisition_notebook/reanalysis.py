@@ -0,0 +1,173 @@
+"""Run the analysis cells saved inside acquisitions again, without a notebook.
+
+Every file is analysed in a separate worker process with the non-interactive `Agg`
+backend of matplotlib, so a month of data can be processed again on all the cores after
+e.g. a change of the fit model.
+
+The analysis is run as in the notebook: `init_analyse.py` of the experiment directory (if
+it exists) is executed first, then the cell with `aqm` pointing to the file. A cell given
+instead of the saved one is stored in the file under `REANALYSIS_CELL_NAME`, so the
+original analysis code is kept.
+
+Examples:
+    >>> results = reanalyse(files, data_directory, workers=8)
+    >>> [result.filepath for result in results if result.error]
+"""
+
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Union
+
+from dh5.path import Path
+
+from ..acquisition.layout import get_experiment_directory
+from ..utils.file_read import read_file
+
+
+INIT_ANALYSE_FILENAME = "init_analyse.py"
+REANALYSIS_CELL_NAME = "reanalysis"
+
+
+class ReanalysisResult(NamedTuple):
+    """Outcome of the analysis of one file.
+
+    Attributes:
+        filepath (str): Path to the h5 file.
+        figures (List[str]): Figure files written by the analysis. Figures that are not
+            changed since the last time are not written again, so they are not listed.
+        error (str, optional): Traceback if the analysis failed.
+        duration (float): Time of the analysis in seconds.
+    """
+
+    filepath: str
+    figures: List[str]
+    error: Optional[str]
+    duration: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _use_agg_backend():
+    import matplotlib
+
+    matplotlib.use("Agg", force=True)
+
+
+def _saved_figures(filepath: str, since: float) -> List[str]:
+    """Files of the acquisition (`<name>_FIG...`) modified after `since`."""
+    pattern = glob.escape(filepath) + "_*"
+    return sorted(
+        filename
+        for filename in glob.glob(pattern)  # noqa: PTH207
+        if not filename.endswith(".h5") and os.path.getmtime(filename) >= since  # noqa: PTH204
+    )
+
+
+def reanalyse_file(
+    filepath: str,
+    data_directory: str,
+    code: Optional[str] = None,
+    cell_name: str = "default",
+    manager_kwargs: Optional[Dict[str, Any]] = None,
+) -> ReanalysisResult:
+    """Run the analysis of one file in the current process. See `reanalyse`.
+
+    Only the figures created by the analysis are closed, but the matplotlib backend is not
+    changed. `reanalyse` calls it inside worker processes that use `Agg`.
+    """
+    from matplotlib import pyplot as plt
+
+    from .acquisition_analysis_manager import AcquisitionAnalysisManager
+
+    filepath = filepath.rsplit(".h5", 1)[0] if filepath.endswith(".h5") else filepath
+    started, started_clock = time.time(), time.perf_counter()
+    aqm = None
+    figures_before = set(plt.get_fignums())
+    try:
+        aqm = AcquisitionAnalysisManager(data_directory, shell=None, **(manager_kwargs or {}))
+        cell = (
+            code
+            if code is not None
+            else aqm.load_file(filepath).get_analysis_code(cell_name, update_code=False)
+        )
+
+        namespace: Dict[str, Any] = {"__name__": "__main__"}
+        init_file = Path(get_experiment_directory(filepath)) / INIT_ANALYSE_FILENAME
+        init_code = read_file(str(init_file)) if init_file.exists() else None
+        if init_code:
+            exec(compile(init_code, str(init_file), "exec"), namespace)  # noqa: S102
+
+        # An overriding cell is also saved under its own name, so the stored one is kept.
+        aqm.run_analysis_cell(
+            cell,
+            filepath,
+            namespace,
+            name=REANALYSIS_CELL_NAME if code is not None else None,
+        )
+        aqm.wait_figures()
+        error = None
+    except Exception:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+    finally:
+        for number in set(plt.get_fignums()) - figures_before:
+            plt.close(number)
+
+    return ReanalysisResult(
+        filepath=filepath + ".h5",
+        figures=_saved_figures(filepath, started),
+        error=error,
+        duration=time.perf_counter() - started_clock,
+    )
+
+
+def reanalyse(
+    filepaths: Iterable[Union[str, Path]],
+    data_directory: Union[str, Path],
+    code: Optional[str] = None,
+    cell_name: str = "default",
+    workers: Optional[int] = None,
+    manager_kwargs: Optional[Dict[str, Any]] = None,
+    progress: Optional[Callable[[ReanalysisResult], Any]] = None,
+) -> List[ReanalysisResult]:
+    """Run the saved (or the given) analysis cell on every file in a process pool.
+
+    Files are always analysed in worker processes with the `Agg` backend, so the figures
+    and the backend of the calling process (e.g. a notebook) are not touched.
+
+    Args:
+        filepaths (Iterable[str]): Paths to the h5 files.
+        data_directory (str): Data directory of the acquisitions.
+        code (str, optional): Cell to run instead of the one saved inside the files. It's
+            saved in the files under `REANALYSIS_CELL_NAME`.
+        cell_name (str): Name of the saved cell. Defaults to "default".
+        workers (int, optional): Number of processes. Defaults to the number of cores.
+        manager_kwargs (dict, optional): Arguments of `AcquisitionAnalysisManager` used
+            inside the workers, e.g. {"save_fig_inside_h5": True}.
+        progress (Callable, optional): Called with every result as soon as it's ready.
+
+    Returns:
+        List[ReanalysisResult]: Results in the order of `filepaths`.
+    """
+    filepaths = [str(filepath) for filepath in filepaths]
+    args = (str(data_directory), code, cell_name, manager_kwargs)
+
+    if not filepaths:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(filepaths))
+    results_by_index: Dict[int, ReanalysisResult] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg_backend) as executor:
+        futures = {
+            executor.submit(reanalyse_file, filepath, *args): index
+            for index, filepath in enumerate(filepaths)
+        }
+        for future in as_completed(futures):
+            results_by_index[futures[future]] = result = future.result()
+            if progress is not None:
+                progress(result)
+    return [results_by_index[index] for index in range(len(filepaths))]
@@ -0,0 +1,4 @@
+"""Benchmarks of the time critical parts of labmate.
+
+Each module can be run directly, e.g. `python -m labmate.benchmarks.parsing`.
+"""
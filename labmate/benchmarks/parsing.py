@@ -0,0 +1,66 @@
+"""Benchmark of `parse_str` on generated config files with thousands of lines."""
+
+import time
+from typing import List, NamedTuple, Sequence
+
+from ..parsing import parse_str
+
+
+class BenchResult(NamedTuple):
+    """Best time of `parse_str` on a file with `lines` lines."""
+
+    lines: int
+    seconds: float
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.lines:>8} lines: {self.seconds * 1e3:8.2f} ms "
+            f"({self.lines_per_second:,.0f} lines/s)"
+        )
+
+
+def generate_config(n_lines: int) -> str:
+    """Return a config of about `n_lines` lines with all the constructions met in configs."""
+    blocks = [
+        "param_{i} = {i}",
+        "param_{i}_float = {i}.5e-3  # comment with = and (",
+        "param_{i}_link = param_{i}  # value: {i}",
+        "param_{i}_str = 'text # not a comment ( = {i}'",
+        "param_{i}_dict = {{\n    'a': [1, 2, 3],  # comment\n    'b': \"}}\",\n}}",
+        "param_{i}_call = dict(x={i}, y=[1, 2])",
+        'param_{i}_doc = """\nmulti-line ( string\n"""',
+        "# commented_{i} = 1",
+        "",
+    ]
+    template = "\n".join(blocks)
+    per_block = template.count("\n") + 1
+    return "\n".join(template.format(i=i) for i in range(max(n_lines // per_block, 1)))
+
+
+def bench_parse_str(
+    sizes: Sequence[int] = (1_000, 10_000, 100_000), repeat: int = 3
+) -> List[BenchResult]:
+    """Measure the best time of `parse_str` for configs of the given number of lines."""
+    results = []
+    for size in sizes:
+        config = generate_config(size)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse_str(config)
+            times.append(time.perf_counter() - start)
+        results.append(BenchResult(config.count("\n") + 1, min(times)))
+    return results
+
+
+def main():
+    for result in bench_parse_str():
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Command line interface for the batch operations on a data directory.
+
+Examples:
+    $ labmate reindex ~/data --workers 8
+    $ labmate reanalyse ~/data --name "^rabi" --since 2024_05 --workers 8
+    $ labmate reanalyse ~/data --all
+    $ labmate reanalyse ~/data 2024_05_01__10_00_00__rabi --code new_fit.py
+    $ labmate repack ~/data --workers 8
+    $ labmate bench --sizes 1000 10000
+"""
+
+import argparse
+import sys
+from typing import Optional, Sequence
+
+
+def _print_progress(done: int, total: int, message: str = ""):
+    print(f"[{done}/{total}] {message}".rstrip(), file=sys.stderr, flush=True)
+
+
+def _reindex(args: argparse.Namespace) -> int:
+    from .acquisition import Catalog
+
+    catalog = Catalog.from_data_directory(args.data_directory)
+    try:
+        count = catalog.rebuild(
+            workers=args.workers,
+            full=args.full,
+            progress=None if args.quiet else _print_progress,
+        )
+        print(f"{count} files read, {len(catalog)} acquisitions in the catalog")
+    finally:
+        catalog.close()
+    return 0
+
+
+def _reanalyse(args: argparse.Namespace) -> int:
+    from .acquisition_notebook import AcquisitionAnalysisManager
+
+    has_filter = any(value is not None for value in (args.name, args.since, args.until))
+    if args.files and (has_filter or args.all):
+        print("Give either files or --name/--since/--until/--all, not both.", file=sys.stderr)
+        return 2
+    if not (args.files or has_filter or args.all):
+        print(
+            "Give files, a filter (--name/--since/--until) or --all to reanalyse every file.",
+            file=sys.stderr,
+        )
+        return 2
+
+    code = None
+    if args.code is not None:
+        with open(args.code, encoding="utf-8") as file:
+            code = file.read()
+
+    aqm = AcquisitionAnalysisManager(args.data_directory, shell=None)
+    if args.files:
+        paths_or_query = args.files
+    else:
+        aqm.rebuild_catalog(workers=args.workers)
+        paths_or_query = {"name": args.name, "since": args.since, "until": args.until}
+
+    done = 0
+
+    def progress(result):
+        nonlocal done
+        done += 1
+        if not args.quiet:
+            status = "ok" if result.ok else "FAILED"
+            _print_progress(done, total, f"{status} {result.duration:.1f}s {result.filepath}")
+
+    filepaths = aqm.resolve_filepaths(paths_or_query)
+    total = len(filepaths)
+    results = aqm.reanalyse(
+        filepaths, code=code, cell_name=args.cell, workers=args.workers, progress=progress
+    )
+    if aqm.catalog is not None:
+        aqm.catalog.close()
+
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        print(f"{result.filepath}:\n{result.error}", file=sys.stderr)
+    print(f"{len(results) - len(failed)} files analysed, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def _repack(args: argparse.Namespace) -> int:
+    from .acquisition.repack import find_h5_files, repack_files
+
+    filepaths = args.files or find_h5_files(args.data_directory)
+    done = 0
+
+    def progress(result):
+        nonlocal done
+        done += 1
+        if not args.quiet:
+            if result.error:
+                status = "FAILED"
+            elif result.replaced:
+                status = f"{result.size_before / 1e6:.1f} -> {result.size_after / 1e6:.1f} MB"
+            else:
+                status = "unchanged"
+            _print_progress(done, len(filepaths), f"{status} {result.filepath}")
+
+    results = repack_files(
+        filepaths, workers=args.workers, progress=progress, compression_level=args.level
+    )
+    failed = [result for result in results if not result.ok]
+    for result in failed:
+        print(f"{result.filepath}: {result.error}", file=sys.stderr)
+    saved = sum(result.size_before - result.size_after for result in results)
+    replaced = sum(result.replaced for result in results)
+    print(f"{replaced} files repacked, {saved / 1e6:.1f} MB reclaimed, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def _bench(args: argparse.Namespace) -> int:
+    from .benchmarks.parsing import bench_parse_str
+
+    for result in bench_parse_str(sizes=args.sizes, repeat=args.repeat):
+        print(result)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="labmate", description="Batch operations on a labmate data directory."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(subparser: argparse.ArgumentParser):
+        subparser.add_argument("data_directory", help="Data directory of the acquisitions.")
+        subparser.add_argument(
+            "-w", "--workers", type=int, default=None, help="Number of processes (all cores)."
+        )
+        subparser.add_argument(
+            "-q", "--quiet", action="store_true", help="Do not report the progress."
+        )
+
+    reindex = subparsers.add_parser("reindex", help="Update the catalog of the acquisitions.")
+    add_common(reindex)
+    reindex.add_argument("--full", action="store_true", help="Read every file again.")
+    reindex.set_defaults(func=_reindex)
+
+    reanalyse = subparsers.add_parser(
+        "reanalyse", aliases=["reanalyze"], help="Run the saved analysis cells again."
+    )
+    add_common(reanalyse)
+    reanalyse.add_argument("files", nargs="*", help="Files or acquisition names.")
+    reanalyse.add_argument("--name", help="Regular expression of the experiment name.")
+    reanalyse.add_argument("--since", help="First time stamp, e.g. 2024_05.")
+    reanalyse.add_argument("--until", help="Last time stamp.")
+    reanalyse.add_argument(
+        "--all", action="store_true", help="Reanalyse every file of the catalog."
+    )
+    reanalyse.add_argument("--code", help="Python file to run instead of the saved cell.")
+    reanalyse.add_argument("--cell", default="default", help="Name of the saved cell.")
+    reanalyse.set_defaults(func=_reanalyse)
+
+    repack = subparsers.add_parser("repack", help="Reclaim the unused space of the files.")
+    add_common(repack)
+    repack.add_argument(
+        "files", nargs="*", help="Files to repack. Defaults to every file of the directory."
+    )
+    repack.add_argument("--level", type=int, default=4, help="Level of gzip compression.")
+    repack.set_defaults(func=_repack)
+
+    bench = subparsers.add_parser("bench", help="Run the benchmarks.")
+    bench.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Lines to parse."
+    )
+    bench.add_argument("--repeat", type=int, default=3, help="Runs of every size.")
+    bench.set_defaults(func=_bench)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -13,7 +13,8 @@ Examples:
 
 from typing import Dict
 
-from .brackets_score import BracketsScore
+from .brackets_score import BracketsScore  # noqa: F401
+from .lexer import iter_statements
 from .parsed_value import ParsedValue
 
 
@@ -21,29 +22,10 @@ def parse_str(file: str, /) -> Dict[str, ParsedValue]:
     """Parse multiline string.
 
     Return a dictionary of { 'variable name' : (converted value if possible | str) }.
+    The value given in `# value: ` comment is used as converted value if it's present.
     """
     parsed_values = {}
-    brackets = BracketsScore()
-    param, value = "", ""
-    for line in file.split("\n"):
-        if not brackets.is_zero():
-            value += f"{line.split('#')[0].strip()}\n"  # type: ignore
-        elif len(line) == 0 or not line[0].isalpha() or "=" not in line:
-            continue
-        else:
-            param, value = line.split("=")[:2]
-
-        brackets.update_from_str(line)
-        if not brackets.is_zero():
-            continue
-
-        value_eval = value[value.rfind("# value: ") + 9 :] if ("# value: " in value) else None
-
-        value = value.split("#")[0].strip()
-
-        if value_eval is None:
-            value_eval = value
-
-        parsed_values[param.strip()] = ParsedValue(value, value_eval)
-
+    for statement in iter_statements(file):
+        value_eval = statement.value if statement.annotation is None else statement.annotation
+        parsed_values[statement.param] = ParsedValue(statement.value, value_eval)
     return parsed_values
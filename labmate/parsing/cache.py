@@ -0,0 +1,156 @@
+"""Process-wide cache of parsed config files.
+
+Config files are parsed once per content, whatever the acquisition they are saved in.
+The cache is keyed by the hash of the content and can be kept on disk between sessions.
+
+Examples:
+    >>> from labmate.parsing import cache
+    >>> cache.parse_str_cached("a = 1")  # parsed
+    >>> cache.parse_str_cached("a = 1")  # taken from the cache
+    >>> cache.set_disk_cache("~/.cache/labmate")  # or LABMATE_CONFIG_CACHE environ variable
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Union
+
+from ..logger import logger
+from .parsed_value import ParsedValue
+
+
+DISK_CACHE_ENVIRON = "LABMATE_CONFIG_CACHE"
+_DISK_CACHE_VERSION = 1
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of the cache, as `functools.lru_cache` gives."""
+
+    hits: int
+    disk_hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def content_hash(content: str) -> str:
+    """Return the hash that identifies a config file content."""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ParsedConfigCache:
+    """LRU cache of `parse_str` results keyed by the hash of the parsed string.
+
+    If `disk_cache` directory is set, results are also stored there as pickle files,
+    so they are reused by other processes.
+    """
+
+    def __init__(self, maxsize: int = 256, disk_cache: Optional[Union[str, Path]] = None):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Dict[str, ParsedValue]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_cache: Optional[Path] = None
+        self._hits = self._disk_hits = self._misses = 0
+        self.set_disk_cache(disk_cache)
+
+    def set_disk_cache(self, directory: Optional[Union[str, Path]]):
+        """Set the directory where parsed configs are kept. None disables the disk cache."""
+        self._disk_cache = Path(directory).expanduser() if directory else None
+
+    @property
+    def disk_cache(self) -> Optional[Path]:
+        return self._disk_cache
+
+    def parse(self, content: str) -> Dict[str, ParsedValue]:
+        """Return `parse_str(content)`, parsing the content only if it was not seen before.
+
+        The returned dictionary is a copy and can be modified.
+        """
+        key = content_hash(content)
+        with self._lock:
+            parsed = self._data.get(key)
+            if parsed is not None:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return dict(parsed)
+
+        parsed = self._read_from_disk(key)
+        from_disk = parsed is not None
+        if parsed is None:
+            from . import parse_str
+
+            parsed = parse_str(content)
+            self._write_to_disk(key, parsed)
+
+        with self._lock:
+            if from_disk:
+                self._disk_hits += 1
+            else:
+                self._misses += 1
+            self._data[key] = parsed
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return dict(parsed)
+
+    def _disk_filename(self, key: str) -> Optional[Path]:
+        if self._disk_cache is None:
+            return None
+        return self._disk_cache / f"{key}.v{_DISK_CACHE_VERSION}.pickle"
+
+    def _read_from_disk(self, key: str) -> Optional[Dict[str, ParsedValue]]:
+        filename = self._disk_filename(key)
+        if filename is None or not filename.exists():
+            return None
+        try:
+            with filename.open("rb") as file:
+                return pickle.load(file)  # noqa: S301
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug("Cannot read parsed config from %s due to %r", filename, error)
+            return None
+
+    def _write_to_disk(self, key: str, parsed: Dict[str, ParsedValue]):
+        filename = self._disk_filename(key)
+        if filename is None:
+            return
+        try:
+            filename.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=filename.parent, suffix=".tmp", delete=False
+            ) as file:
+                pickle.dump(parsed, file, protocol=pickle.HIGHEST_PROTOCOL)
+            Path(file.name).replace(filename)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug("Cannot save parsed config to %s due to %r", filename, error)
+
+    def clear(self, disk: bool = False):
+        """Remove everything from memory and, if `disk` is True, from the disk cache."""
+        with self._lock:
+            self._data.clear()
+            self._hits = self._disk_hits = self._misses = 0
+        if disk and self._disk_cache is not None and self._disk_cache.exists():
+            for filename in self._disk_cache.glob(f"*.v{_DISK_CACHE_VERSION}.pickle"):
+                filename.unlink()
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._disk_hits, self._misses, self.maxsize, len(self._data)
+            )
+
+
+parsed_config_cache = ParsedConfigCache(disk_cache=os.environ.get(DISK_CACHE_ENVIRON))
+
+
+def parse_str_cached(content: str, /) -> Dict[str, ParsedValue]:
+    """Same as `parse_str`, but the results are taken from the process-wide cache."""
+    return parsed_config_cache.parse(content)
+
+
+def set_disk_cache(directory: Optional[Union[str, Path]]):
+    """Keep parsed configs in `directory`, so they are reused between sessions."""
+    parsed_config_cache.set_disk_cache(directory)
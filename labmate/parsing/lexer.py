@@ -0,0 +1,129 @@
+"""Single-pass lexer that finds top-level assignments in python-like config files.
+
+Strings (including multi-line ones), comments and brackets are followed character by
+character, so `#`, `=` or brackets inside strings do not break the parsing. Every character
+is scanned once, i.e. the time is linear in the size of the file.
+
+The file does not have to be valid python: lines that cannot be understood are skipped.
+"""
+
+import re
+from typing import Iterator, List, NamedTuple, Optional
+
+
+ANNOTATION = "# value: "
+
+_TOKEN = re.compile(r"'''|\"\"\"|'|\"|#|[<>!=]=|=|[(\[{]|[)\]}]")
+_STRING_END = {
+    "'": re.compile(r"(?:[^'\\\n]|\\.)*'"),
+    '"': re.compile(r'(?:[^"\\\n]|\\.)*"'),
+    "'''": re.compile(r"(?:[^'\\]|\\.|'(?!''))*'''", re.S),
+    '"""': re.compile(r'(?:[^"\\]|\\.|"(?!""))*"""', re.S),
+}
+_OPENING = frozenset("([{")
+_CLOSING = frozenset(")]}")
+
+
+class Statement(NamedTuple):
+    """Top-level assignment `param = value` found in the file.
+
+    Attributes:
+        param (str): Text before `=`.
+        value (str): Code after `=` without comments. Lines of multi-line values are stripped
+            as by the previous parser, except the text inside multi-line strings, which is
+            kept as written.
+        annotation (Optional[str]): Value written after the last `# value: ` comment.
+        start (int): Index of the first line of the statement.
+        end (int): Index of the last line of the statement (included).
+    """
+
+    param: str
+    value: str
+    annotation: Optional[str]
+    start: int
+    end: int
+
+
+class _LineInfo(NamedTuple):
+    code_end: int
+    assign: Optional[int]
+    depth: int
+    string: Optional[str]
+
+
+def _scan_line(line: str, depth: int, string: Optional[str]) -> _LineInfo:
+    """Scan one line starting with `depth` opened brackets and inside `string` if not None.
+
+    Returns where the comment starts, where the first top-level `=` is, the number of opened
+    brackets and the multi-line string that is still open at the end of the line.
+    """
+    pos, assign = 0, None
+    length = len(line)
+    while pos < length:
+        if string is not None:
+            match = _STRING_END[string].match(line, pos)
+            if match is None:
+                # Either a multi-line string continues or a single-quoted one is broken.
+                return _LineInfo(length, assign, depth, string if len(string) == 3 else None)
+            pos, string = match.end(), None
+            continue
+
+        match = _TOKEN.search(line, pos)
+        if match is None:
+            break
+        token = match.group()
+        pos = match.end()
+        if token == "#":
+            return _LineInfo(match.start(), assign, depth, None)
+        if token in _STRING_END:
+            string = token
+        elif token in _OPENING:
+            depth += 1
+        elif token in _CLOSING:
+            depth = max(depth - 1, 0)
+        elif token == "=" and depth == 0 and assign is None:
+            assign = match.start()
+    return _LineInfo(length, assign, depth, string)
+
+
+def _get_annotation(comment: str) -> Optional[str]:
+    index = comment.rfind(ANNOTATION)
+    return comment[index + len(ANNOTATION) :].strip() if index >= 0 else None
+
+
+def iter_statements(text: str, /) -> Iterator[Statement]:
+    """Yield top-level assignments of the file in order.
+
+    A statement starts on a line that is not inside brackets or a string, begins with
+    a letter and has `=` outside brackets and strings. It ends on the line where every
+    bracket and string is closed.
+    """
+    depth, string = 0, None
+    param: Optional[str] = None
+    value_parts: List[str] = []
+    annotation: Optional[str] = None
+    start = 0
+
+    for index, line in enumerate(text.split("\n")):
+        top_level = depth == 0 and string is None
+        starts_in_string = string is not None
+        code_end, assign, depth, string = _scan_line(line, depth, string)
+        # Spaces inside a multi-line string are part of the value, the other ones are not.
+        code = line[:code_end] if starts_in_string else line[:code_end].lstrip()
+        code = code if string is not None else code.rstrip()
+
+        if param is None:
+            if not top_level or assign is None or not line[:1].isalpha():
+                continue
+            param, start = line[:assign].strip(), index
+            value_parts = [line[assign + 1 : code_end]]
+            if string is not None:
+                value_parts.append("\n")
+            annotation = _get_annotation(line[code_end:])
+        else:
+            value_parts.append(f"{code}\n")
+            annotation = _get_annotation(line[code_end:]) or annotation
+
+        if depth == 0 and string is None:
+            yield Statement(param, "".join(value_parts).strip(), annotation, start, index)
+            param = None
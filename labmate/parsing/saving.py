@@ -1,8 +1,10 @@
 """This file contains functions that prepare file for saving for further parsing."""
 
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
-from . import parse_str
+from .lexer import iter_statements
+from .parsed_value import parse_value
 
 
 def append_values_from_modules_to_files(
@@ -59,19 +61,43 @@ def append_values_from_module_to_file(body: str, module, separator="  # value: "
             param2 = param1  # value: 123
         ```
 
+    Statements are found in one pass over the whole file and the annotation is added to
+    the last line of multi-line values. The results are cached, so an unchanged file with
+    unchanged module values is not parsed nor rewritten again.
+
     """
     variables = vars(module)
-    lines = body.split("\n")
-    for i, line in enumerate(lines):
-        for key, (val, _) in parse_str(line).items():
-            real_val = variables.get(key, "")
-            if (
-                isinstance(val, str) and isinstance(real_val, str) and real_val != val.strip("\"'")
-            ) or (
-                isinstance(val, str)
-                and isinstance(real_val, (float, int, complex))
-                and not isinstance(real_val, bool)
-            ):
-                lines[i] += f"{separator}{real_val}"
+    annotations = tuple(
+        _get_annotation(value, variables.get(param, ""))
+        for param, value, _ in _get_annotation_candidates(body)
+    )
+    return _annotate(body, annotations, separator)
+
+
+@lru_cache(maxsize=128)
+def _get_annotation_candidates(body: str) -> Tuple[Tuple[str, str, int], ...]:
+    """Return (param, value, last line) of the statements which values are not numbers."""
+    candidates = []
+    for statement in iter_statements(body):
+        value = parse_value(statement.value)
+        if isinstance(value, str):
+            candidates.append((statement.param, value, statement.end))
+    return tuple(candidates)
 
+
+def _get_annotation(value: str, real_val) -> Optional[str]:
+    """Return the value to write after `value` or None if it's clear from the parsing."""
+    if (isinstance(real_val, str) and real_val != value.strip("\"'")) or (
+        isinstance(real_val, (float, int, complex)) and not isinstance(real_val, bool)
+    ):
+        return str(real_val)
+    return None
+
+
+@lru_cache(maxsize=128)
+def _annotate(body: str, annotations: Tuple[Optional[str], ...], separator: str) -> str:
+    lines = body.split("\n")
+    for (_, _, end), annotation in zip(_get_annotation_candidates(body), annotations):
+        if annotation is not None:
+            lines[end] += f"{separator}{annotation}"
     return "\n".join(lines)
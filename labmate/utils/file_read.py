@@ -3,7 +3,7 @@
 import json
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from ..parsing.brackets_score import BracketsScore
 
@@ -30,11 +30,12 @@ def read_file(file: str, /) -> str:
         return file_opened.read()
 
 
-def read_files(files: List[str], /) -> Dict[str, str]:
+def read_files(files: List[str], /, reader: Callable[[str], str] = read_file) -> Dict[str, str]:
     """Read the contents of the given  files and returns them as a dictionary.
 
     Args:
         files: A list of file paths to read.
+        reader: Function that reads one file. Defaults to `read_file`.
 
     Returns:
         A dictionary where the keys are the file names and the values are the contents of the files.
@@ -51,10 +52,59 @@ def read_files(files: List[str], /) -> Dict[str, str]:
                 "Some of the files have the same name. "
                 "So it cannot be pushed into dict to preserve unique key"
             )
-        configs[config_file_name] = read_file(config_file)
+        configs[config_file_name] = reader(config_file)
     return configs
 
 
+class SnapshotCacheInfo(NamedTuple):
+    """Statistics of `FileSnapshotCache`."""
+
+    hits: int
+    misses: int
+    currsize: int
+
+
+class FileSnapshotCache:
+    """Read files again only if their modification time or size changed.
+
+    Examples:
+        >>> cache = FileSnapshotCache()
+        >>> cache.read_files(["config.py"])  # reads the file
+        >>> cache.read_files(["config.py"])  # only checks `os.stat` of the file
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._hits = self._misses = 0
+
+    def read_file(self, file: str, /) -> str:
+        """Same as `read_file`, but returns the previous content if the file is unchanged."""
+        try:
+            stat = Path(file).stat()
+        except OSError:
+            return read_file(file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        snapshot = self._snapshots.get(file)
+        if snapshot is not None and snapshot[0] == signature:
+            self._hits += 1
+            return snapshot[1]
+        self._misses += 1
+        content = read_file(file)
+        self._snapshots[file] = (signature, content)
+        return content
+
+    def read_files(self, files: List[str], /) -> Dict[str, str]:
+        """Same as `read_files`, but unchanged files are not read again."""
+        return read_files(files, reader=self.read_file)
+
+    def clear(self):
+        self._snapshots.clear()
+        self._hits = self._misses = 0
+
+    def cache_info(self) -> SnapshotCacheInfo:
+        return SnapshotCacheInfo(self._hits, self._misses, len(self._snapshots))
+
+
 def update_file_variable(file, params: Dict[str, Any]):
     """
     Update the variables in a file with the given parameters.
@@ -0,0 +1,201 @@
+"""Low level utilities that read metadata or single keys of h5 files without loading the rest."""
+
+import os
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import h5py
+import numpy as np
+from dh5.dh5_class.data_transformation import transform_on_open
+from dh5.dh5_class.h5py_utils import LockFile, open_h5_group, save_sub_dict
+from dh5.errors import FileLockedError
+
+from ..logger import logger
+
+
+LOOP_SHAPE_KEY = "__loop_shape__"
+LOOP_INDEX_KEY = "__index_1__"
+VERSION_ATTR_PREFIX = "__version__/"
+
+
+class FileStructure(NamedTuple):
+    """Top-level keys of a file, the ones saved by `AcquisitionLoop` and their versions."""
+
+    keys: Set[str]
+    loop_keys: Set[str]
+    versions: Dict[str, int]
+
+
+def get_structure(filepath: str) -> FileStructure:
+    """Read the top-level keys and their versions. The data itself is not read.
+
+    A loop is a group that contains `__loop_shape__` dataset. Versions are written by
+    `bump_versions` and only the keys that were saved this way have one.
+    """
+    with h5py.File(filepath, "r") as file:
+        loop_keys = {
+            key
+            for key, value in file.items()
+            if isinstance(value, h5py.Group) and LOOP_SHAPE_KEY in value
+        }
+        versions = {
+            name[len(VERSION_ATTR_PREFIX) :]: int(value)
+            for name, value in file.attrs.items()
+            if name.startswith(VERSION_ATTR_PREFIX)
+        }
+        return FileStructure(set(file.keys()), loop_keys, versions)
+
+
+def get_loop_keys(filepath: str) -> Set[str]:
+    """Return the top-level keys that were saved by an `AcquisitionLoop`.
+
+    Only the structure of the file is read, i.e. a loop is a group that
+    contains `__loop_shape__` dataset.
+    """
+    return get_structure(filepath).loop_keys
+
+
+def _bump_versions(file: h5py.File, keys: Iterable[str]):
+    for key in {key.split("/")[0] for key in keys}:
+        name = VERSION_ATTR_PREFIX + key
+        file.attrs[name] = int(file.attrs.get(name, 0)) + 1
+
+
+def save_dict(
+    filepath: str,
+    data: dict,
+    key_prefix: Optional[str] = None,
+    versions: Iterable[str] = (),
+    compression: Optional[str] = None,
+) -> float:
+    """Save the dict as `dh5` does and bump the versions of `versions` keys.
+
+    Both are done while the file is opened once, so saving a key costs a single opening.
+    `compression` (e.g. "gzip") is applied to the arrays.
+
+    Returns:
+        float: Time of the last modification of the file.
+    """
+    dirname = os.path.dirname(filepath)  # noqa: PTH120
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)  # noqa: PTH103
+    with LockFile(filepath), h5py.File(filepath, "a") as file:
+        for key, value in data.items():
+            key = key if key_prefix is None else f"{key_prefix}/{key}"
+            if key in file:
+                del file[key]
+            if value is not None:
+                save_sub_dict(file, value, key, use_compression=compression)
+        _bump_versions(file, versions)
+    return os.path.getmtime(filepath)  # noqa: PTH204
+
+
+def bump_versions(filepath: str, keys: Iterable[str], retries: int = 5) -> float:
+    """Increase the version of the top-level keys, so readers can reload only them.
+
+    Nested keys (e.g. `acquisition_cell/1`) bump the version of their top-level key.
+
+    Returns:
+        float: Time of the last modification of the file.
+    """
+    for i in range(retries):
+        try:
+            with LockFile(filepath), h5py.File(filepath, "a") as file:
+                _bump_versions(file, keys)
+            break
+        except FileLockedError:
+            if i == retries - 1:
+                raise
+            logger.info("File is locked. Waiting 0.1s and %d more retrying.", retries - i - 1)
+            time.sleep(0.1)
+    return os.path.getmtime(filepath)  # noqa: PTH204
+
+
+def has_key(filepath: str, key: str) -> bool:
+    """Check if the (possibly nested) key exists in the file without reading it."""
+    with h5py.File(filepath, "r") as file:
+        return key in file
+
+
+def get_group_keys(filepath: str, key: str) -> List[str]:
+    """Return the keys inside the group `key`. Empty if there is no such group."""
+    with h5py.File(filepath, "r") as file:
+        group = file.get(key)
+        return list(group.keys()) if isinstance(group, h5py.Group) else []
+
+
+def read_key(filepath: str, key: str, default: Any = None) -> Any:
+    """Read a single (possibly nested, e.g. `info/name`) key from the file.
+
+    Groups are returned as dict. Returns `default` if the key does not exist.
+    """
+    with h5py.File(filepath, "r") as file:
+        if key not in file:
+            return default
+        value = file[key]
+        if isinstance(value, h5py.Group):
+            return open_h5_group(value)
+        return transform_on_open(value[()])  # type: ignore
+
+
+def read_keys(filepath: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """Read several (possibly nested) keys opening the file once.
+
+    Groups are returned as dict. Keys that do not exist are not in the result.
+    """
+    data = {}
+    with h5py.File(filepath, "r") as file:
+        for key in keys:
+            if key not in file:
+                continue
+            value = file[key]
+            if isinstance(value, h5py.Group):
+                data[key] = open_h5_group(value)
+            else:
+                data[key] = transform_on_open(value[()])  # type: ignore
+    return data
+
+
+def get_complete_rows(loop: Any) -> int:
+    """Return how many iterations of the outer loop were finished.
+
+    They are given by the leading non-zero values of `__index_1__`. Returns 0 if the loop
+    was saved without indexes.
+    """
+    index = loop.get(LOOP_INDEX_KEY) if hasattr(loop, "get") else None
+    if not isinstance(index, np.ndarray) or index.ndim != 1:
+        return 0
+    zeros = np.flatnonzero(index == 0)
+    return int(zeros[0]) if len(zeros) else len(index)
+
+
+def read_loop_rows(filepath: str, key: str, old: Any, start: int) -> dict:
+    """Read a loop saved under `key` reusing the first `start` rows of the `old` one.
+
+    Rows of the outer loop before `start` should be finished, i.e. they are not changed
+    anymore. Only the rest of every array is read from the file. Arrays which shape changed
+    along other axes, as well as the other values, are read completely.
+    """
+    data = {}
+    with h5py.File(filepath, "r") as file:
+        group = file[key]
+        loop_shape = group[LOOP_SHAPE_KEY][()] if LOOP_SHAPE_KEY in group else ()  # type: ignore
+        n_rows = loop_shape[0] if len(loop_shape) else None
+        for sub_key, value in group.items():  # type: ignore
+            if isinstance(value, h5py.Group):
+                data[sub_key] = open_h5_group(value)
+                continue
+            old_value = old.get(sub_key)
+            if (
+                sub_key != LOOP_SHAPE_KEY
+                and isinstance(old_value, np.ndarray)
+                and value.ndim >= 1
+                and value.shape[0] == n_rows
+                and old_value.shape[1:] == value.shape[1:]
+                and old_value.dtype == value.dtype
+                and len(old_value) >= start
+            ):
+                data[sub_key] = np.concatenate([old_value[:start], value[start:]])
+            else:
+                data[sub_key] = transform_on_open(value[()])
+    return data
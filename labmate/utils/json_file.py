@@ -0,0 +1,181 @@
+"""JSON file shared by several processes, e.g. `temp.json` of the data directory.
+
+Writes go to a temporary file that replaces the original at once, so readers never see
+a half written file. Readers and writers also take an advisory lock on `<file>.lock`
+(`fcntl` on Unix, `msvcrt` on Windows), which keeps them consistent on network drives
+where a rename is not atomic. The parsed content is cached while the file is not replaced
+and its modification time and size are the same, so unchanged files are not parsed again.
+"""
+
+import json
+import os
+import secrets
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple, Union
+
+from dh5.jsn.decoders import NumbersDecoder
+from dh5.jsn.encoders import StringEncoder
+
+
+class FileLock:
+    """Advisory lock of a file, that is released when the context is exited.
+
+    Examples:
+        >>> with FileLock("temp.json.lock"):
+        ...     # Only one process is here at a time.
+
+    Args:
+        filepath (str): Lock file. It's created if needed and never removed.
+        shared (bool): True for a lock that several readers can hold at once. On Windows
+            every lock is exclusive.
+        timeout (float): Seconds to wait for the lock before TimeoutError is raised.
+    """
+
+    def __init__(self, filepath: Union[str, Path], shared: bool = False, timeout: float = 10):
+        self.filepath = Path(filepath)
+        self.shared = shared
+        self.timeout = timeout
+        self._file: Any = None
+
+    def _try_lock(self) -> bool:
+        if sys.platform == "win32":
+            import msvcrt
+
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                return False
+            return True
+
+        import fcntl
+
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(self._file.fileno(), mode | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def _unlock(self):
+        if sys.platform == "win32":
+            import msvcrt
+
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def __enter__(self) -> "FileLock":
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.filepath, "a+b")  # noqa: SIM115
+        self._file.seek(0)
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() > deadline:
+                self._file.close()
+                self._file = None
+                raise TimeoutError(f"Cannot lock {self.filepath} in {self.timeout}s")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self._unlock()
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def create_temp_file(directory: Union[str, Path], prefix: str = ".", suffix: str = ".tmp"):
+    """Create a new file with a random name and return (file descriptor, path).
+
+    Unlike `tempfile`, the file gets the mode of any file created by `open`, i.e. the
+    kernel applies the umask to 0o666, so other users can read it if they can read the
+    files of the directory.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    for _ in range(100):
+        path = Path(directory) / f"{prefix}{secrets.token_hex(8)}{suffix}"
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"Cannot create a temporary file in {directory}")
+
+
+def _state(stat: os.stat_result) -> Tuple[int, int, int]:
+    # Every write replaces the file, so the inode changes even within the same mtime tick.
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class JsonFile:
+    """JSON file that is written atomically, read under a lock and cached while unchanged.
+
+    The format is the one of `dh5.jsn`, so files can be read by `jsn.read` as well.
+    """
+
+    def __init__(self, filepath: Union[str, Path], timeout: float = 10):
+        self.filepath = Path(str(filepath))
+        self.lock_filepath = self.filepath.with_name(self.filepath.name + ".lock")
+        self.timeout = timeout
+        self._cache: Optional[Tuple[Tuple[int, int, int], dict]] = None
+        self._cache_lock = threading.Lock()
+        self.reads = 0
+
+    def _lock(self, shared: bool = False) -> FileLock:
+        return FileLock(self.lock_filepath, shared=shared, timeout=self.timeout)
+
+    def read(self) -> Optional[dict]:
+        """Return the content of the file or None if it does not exist.
+
+        The same dictionary is returned while the file is not modified, so it should
+        not be changed.
+        """
+        try:
+            state = _state(self.filepath.stat())
+        except FileNotFoundError:
+            return None
+        with self._cache_lock:
+            if self._cache is not None and self._cache[0] == state:
+                return self._cache[1]
+
+        with self._lock(shared=True):
+            try:
+                with open(self.filepath, encoding="utf-8") as file:
+                    state = _state(os.fstat(file.fileno()))
+                    data = json.load(file, cls=NumbersDecoder)
+            except FileNotFoundError:
+                return None
+        with self._cache_lock:
+            self._cache = (state, data)
+            self.reads += 1
+        return data
+
+    def write(self, data: dict):
+        """Replace the content of the file with `data`."""
+        content = json.dumps(data, sort_keys=True, indent=4, cls=StringEncoder)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock():
+            fd, temp_path = create_temp_file(
+                self.filepath.parent, prefix=f".{self.filepath.name}.", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    file.write(content)
+                # The new file has the mode given by the umask, but a changed mode is kept.
+                if self.filepath.exists():
+                    shutil.copymode(self.filepath, temp_path)
+                temp_path.replace(self.filepath)
+            except OSError:
+                temp_path.unlink(missing_ok=True)
+                raise
+            state = _state(self.filepath.stat())
+        with self._cache_lock:
+            # The written dict is not cached, since the caller can still change it.
+            self._cache = (state, json.loads(content, cls=NumbersDecoder))
@@ -37,6 +37,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     python_requires=">=3.8",
+    entry_points={"console_scripts": [f"{NAME} = {NAME}.cli:main"]},
     install_requires=[
         "numpy",
         "dh5",
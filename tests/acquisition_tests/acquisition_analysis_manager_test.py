@@ -1,10 +1,12 @@
 import os
 import shutil
+import time
 import unittest
 
+import numpy as np
 from dh5 import DH5
 
-from labmate.acquisition import AnalysisData
+from labmate.acquisition import AcquisitionLoop, AnalysisData
 from labmate.acquisition_notebook import AcquisitionAnalysisManager
 
 from .analysis_data_test import AnalysisDataParceTest
@@ -126,6 +128,36 @@ class AcquisitionAnalysisManagerTest(unittest.TestCase):
         self.aqm.save_fig_only(fig)
         self.assertTrue(fig.fig_saved)
 
+    def test_fig_saved_async(self):
+        self.aqm = AcquisitionAnalysisManager(
+            DATA_DIR, save_fig_async=True, shell=ShellEmulator(self.cell_text)
+        )
+        self.create_acquisition_cell()
+        self.create_analysis_cell()
+        fig = LocalFig()
+        self.aqm.save_fig(fig, name="async")
+        self.assertTrue(self.aqm.wait_figures(timeout=10))
+        self.assertFalse(fig.fig_saved)  # it's a copy of the figure that is saved
+        self.assertTrue(self.aqm.data.figure_saved)
+
+    def test_run_analysis_cell(self):
+        self.create_acquisition_cell()
+        self.create_data_and_check()
+        self.aqm.save_acquisition()
+        filepath = self.aqm.aq.filepath
+        self.aqm.acquisition_cell("other")
+
+        code = "aqm.analysis_cell()\ntotal = sum(aqm.d.x)\n"
+        aqm = AcquisitionAnalysisManager(DATA_DIR, shell=None)
+        namespace = aqm.run_analysis_cell(code, filepath, name="rerun")
+        self.assertEqual(namespace["total"], sum(self.x))
+        self.assertEqual(aqm.d.filepath, filepath.rsplit(".h5", 1)[0])
+        self.assertEqual(DH5(filepath)["analysis_cells"]["rerun"], code)
+
+        # Outside of `run_analysis_cell`, `analysis_cell` works as usual again.
+        aqm.analysis_cell()
+        self.assertIn("other", aqm.d.filepath)
+
     def test_get_analysis_code(self):
         self.create_acquisition_cell()
         self.create_analysis_cell()
@@ -174,6 +206,36 @@ class AcquisitionAnalysisManagerTest(unittest.TestCase):
         self.check_2_list(self.aqm.current_analysis["x"], self.x)
         self.check_2_list(self.aqm.current_analysis["y"], self.y)
 
+    def test_analysis_shares_acquisition_arrays(self):
+        self.create_acquisition_cell()
+        signal = np.arange(1000.0)
+        self.aqm.save_acquisition(signal=signal)
+        self.create_analysis_cell()
+        self.assertTrue(np.shares_memory(self.aqm.d.signal, self.aqm.aq["signal"]))
+        self.assertFalse(self.aqm.d.signal.flags.writeable)
+        np.testing.assert_array_equal(self.aqm.d.signal, signal)
+
+    def test_analysis_shares_acquisition_loop(self):
+        self.create_acquisition_cell()
+        self.aqm.aq.loop = loop = AcquisitionLoop()
+        for i in loop(5):
+            loop.append(signal=np.arange(3.0) * i)
+        self.aqm.save_acquisition()
+        self.create_analysis_cell()
+        self.assertTrue(np.shares_memory(self.aqm.d.loop.signal, self.aqm.aq["loop"]["signal"]))
+        np.testing.assert_array_equal(self.aqm.d.loop.signal[4], [0, 4, 8])
+
+    def test_analysis_rereads_modified_file(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(signal=np.arange(10.0))
+        time.sleep(0.01)
+        sd = DH5(self.aqm.aq.filepath, overwrite=False, save_on_edit=True)
+        sd.unlock_data()
+        sd["signal"] = np.ones(10)
+        self.create_analysis_cell()
+        self.assertFalse(np.shares_memory(self.aqm.d.signal, self.aqm.aq["signal"]))
+        np.testing.assert_array_equal(self.aqm.d.signal, np.ones(10))
+
     def test_useful_flag_after_save_acquisition(self):
         self.create_acquisition_cell()
         self.assertEqual(self.aqm.aq.get("useful"), False)
@@ -2,7 +2,7 @@ import os
 import shutil
 import unittest
 
-from dh5 import DH5
+from dh5 import DH5, jsn
 
 from labmate.acquisition import AcquisitionManager
 
@@ -194,6 +194,77 @@ class AcquisitionManagerTest(unittest.TestCase):
     def test_current_filepath(self):
         self.assertEqual(str(self.aqm.aq.filepath), str(self.aqm.current_filepath))
 
+    def test_config_cache(self):
+        config = os.path.join(DATA_DIR, "cached_config.py")
+        with open(config, "w", encoding="utf-8") as file:
+            file.write("a = 1")
+        self.aqm.set_config_file(config)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.aqm.create_acquisition()
+        self.assertEqual(self.aqm.config_cache_info()[:2], (1, 1))
+
+        with open(config, "w", encoding="utf-8") as file:
+            file.write("a = 12")
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.assertEqual(self.aqm.config_cache_info()[:2], (1, 2))
+        self.assertEqual(self.load_data()["configs"]["cached_config.py"], "a = 12")
+
+    def test_temp_data_shared_between_managers(self):
+        reader = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition("first_kernel", cell="none")
+        self.assertEqual(reader.acquisition_tmp_data.experiment_name, "first_kernel")
+        self.assertEqual(reader.acquisition_tmp_data.experiment_name, "first_kernel")
+        self.assertEqual(reader._temp_file.reads, 1)
+
+        self.aqm.new_acquisition("second_run", cell="none")
+        self.assertEqual(reader.acquisition_tmp_data.experiment_name, "second_run")
+        self.assertEqual(reader._temp_file.reads, 2)
+
+    def test_temp_json_keeps_only_config_hashes(self):
+        config = os.path.join(DATA_DIR, "big_config.py")
+        with open(config, "w", encoding="utf-8") as file:
+            file.write("a = 1\n" * 10_000)
+        writer = AcquisitionManager(DATA_DIR, config_files=[config], config_store=True)
+        writer.new_acquisition("slim", cell="none")
+
+        data = jsn.read(os.path.join(DATA_DIR, "temp.json"))
+        self.assertEqual(data["configs"], {})
+        self.assertEqual(list(data["config_refs"]), ["big_config.py"])
+        self.assertLess(os.path.getsize(os.path.join(DATA_DIR, "temp.json")), 1000)
+
+        reader = AcquisitionManager(DATA_DIR)
+        self.assertEqual(reader.acquisition_tmp_data.configs["big_config.py"], "a = 1\n" * 10_000)
+        self.assertIs(reader.acquisition_tmp_data, reader.acquisition_tmp_data)
+        self.assertEqual(
+            AcquisitionManager.get_temp_data(reader.temp_file_path), reader.acquisition_tmp_data
+        )
+
+    def test_temp_json_without_config_store(self):
+        shutil.rmtree(os.path.join(DATA_DIR, ".config_store"), ignore_errors=True)
+        config = os.path.join(DATA_DIR, "small_config.py")
+        with open(config, "w", encoding="utf-8") as file:
+            file.write("a = 1")
+        self.aqm.set_config_file(config)
+        self.aqm.new_acquisition("full", cell="none")
+
+        data = jsn.read(os.path.join(DATA_DIR, "temp.json"))
+        self.assertEqual(data["configs"], {"small_config.py": "a = 1"})
+        self.assertNotIn("config_refs", data)
+        self.assertFalse(os.path.exists(os.path.join(DATA_DIR, ".config_store")))
+
+    def test_temp_json_with_full_configs(self):
+        jsn.write(
+            os.path.join(DATA_DIR, "temp.json"),
+            {
+                "experiment_name": "old",
+                "time_stamp": "2024_01_01__00_00_00",
+                "configs": {"a.py": "a = 1"},
+            },
+        )
+        reader = AcquisitionManager(DATA_DIR)
+        self.assertEqual(reader.acquisition_tmp_data.configs, {"a.py": "a = 1"})
+        self.assertEqual(reader.acquisition_tmp_data.experiment_name, "old")
+
     @classmethod
     def tearDownClass(cls):
         """Remove tmp_test_data directory ones all test finished."""
@@ -1,11 +1,28 @@
 import os
+import pickle
 import shutil
 import unittest
+import zlib
+from unittest import mock
 
+import h5py
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
 from dh5 import DH5
-
-from labmate.acquisition import AcquisitionManager, AnalysisData
+from dh5.errors import ReadOnlyKeyError
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    AnalysisLoop,
+    RasterizeOptions,
+)
 from labmate.acquisition.acquisition_manager import read_files
+from labmate.logger import logger
+from labmate.parsing.cache import parsed_config_cache
+from labmate.utils import h5_utils
 
 
 TEST_DIR = os.path.dirname(__file__)
@@ -133,6 +150,237 @@ class AnalysisDataTest(unittest.TestCase):
 
         self.assertFalse(fig.tighted_layout)
 
+    def test_save_fig_extensions(self):
+        self.ad.save_fig(SimpleSaveFig(), extensions=("pdf", ".png"))  # type: ignore
+        self.ad.save_fig(SimpleSaveFig(), "abc", extensions=("svg", "png"))  # type: ignore
+        self.ad.save_fig(SimpleSaveFig())  # type: ignore
+        for fig_name in ("FIG1.pdf", "FIG1.png", "FIG_abc.svg", "FIG_abc.png", "FIG2.pdf"):
+            self.assertTrue(os.path.exists(f"{self.aqm.current_filepath}_{fig_name}"))
+
+    def test_save_fig_extensions_matplotlib(self):
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        self.ad.save_fig(fig, "m", extensions=("pdf", "png", "svg"), metadata={"Subject": "s"})
+        plt.close(fig)
+        for extension in ("pdf", "png", "svg"):
+            self.assertTrue(os.path.exists(f"{self.aqm.current_filepath}_FIG_m.{extension}"))
+
+    def test_save_fig_metadata_without_pdf(self):
+        with self.assertRaises(ValueError):
+            self.ad.save_fig(SimpleSaveFig(), extensions=("png",), metadata={"Subject": "s"})
+
+    def test_save_fig_unchanged_is_skipped(self):
+        filename = self.aqm.current_filepath + "_FIG_s.pdf"
+        self.ad.save_fig(SimpleSaveFig(), "s")  # type: ignore
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write("not rewritten")
+
+        ad = AnalysisData(self.aqm.current_filepath, cell=self.analysis_cell)
+        with self.assertLogs(logger, "INFO"):
+            ad.save_fig(SimpleSaveFig(), "s")  # type: ignore
+        self.assertTrue(ad.figure_saved)
+        with open(filename, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "not rewritten")
+
+        ad.save_fig(SimpleSaveFig("new data"), "s")  # type: ignore
+        with open(filename, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "new data")
+
+    def test_save_fig_unchanged_but_removed(self):
+        filename = self.aqm.current_filepath + "_FIG_r.pdf"
+        self.ad.save_fig(SimpleSaveFig(), "r")  # type: ignore
+        os.remove(filename)
+        self.ad.save_fig(SimpleSaveFig(), "r")  # type: ignore
+        self.assertTrue(os.path.exists(filename))
+
+    def test_save_fig_skip_unchanged_false(self):
+        filename = self.aqm.current_filepath + "_FIG_f.pdf"
+        self.ad.save_fig(SimpleSaveFig(), "f")  # type: ignore
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write("rewritten")
+        self.ad.save_fig(SimpleSaveFig(), "f", skip_unchanged=False)  # type: ignore
+        with open(filename, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "data")
+
+    def test_save_fig_unchanged_matplotlib(self):
+        def plot():
+            fig, ax = plt.subplots()
+            ax.plot([1, 2, 3], label="a")
+            ax.legend()
+            self.ad.save_fig(fig, "p")
+            plt.close(fig)
+
+        plot()
+        modified_time = os.path.getmtime(self.aqm.current_filepath + "_FIG_p.pdf")
+        plot()
+        self.assertEqual(modified_time, os.path.getmtime(self.aqm.current_filepath + "_FIG_p.pdf"))
+
+    def test_save_fig_same_object_twice(self):
+        filename = self.aqm.current_filepath + "_FIG_twice.pdf"
+        fig, ax = plt.subplots()
+        ax.plot(np.arange(10_000) % 7, label="a")
+        ax.legend()
+        self.ad.save_fig(fig, "twice")
+        modified_time = os.path.getmtime(filename)
+        with self.assertLogs(logger, "INFO"):
+            self.ad.save_fig(fig, "twice")
+        self.assertEqual(modified_time, os.path.getmtime(filename))
+
+        ax.set_title("changed")
+        self.ad.save_fig(fig, "twice")
+        plt.close(fig)
+        self.assertNotEqual(modified_time, os.path.getmtime(filename))
+
+    def test_save_fig_backend_rc_params_changed(self):
+        filename = self.aqm.current_filepath + "_FIG_rc.pdf"
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        self.ad.save_fig(fig, "rc")
+        modified_time = os.path.getmtime(filename)
+        with matplotlib.rc_context({"pdf.fonttype": 42}):
+            self.ad.save_fig(fig, "rc")
+        plt.close(fig)
+        self.assertNotEqual(modified_time, os.path.getmtime(filename))
+
+    def test_save_fig_performance_auto(self):
+        rng = np.random.default_rng(0)
+        fig, ax = plt.subplots()
+        scatter = ax.scatter(*rng.normal(size=(2, 20_000)))
+        ax.plot([0, 1])
+        self.ad.save_fig(fig, "vector")
+        self.ad.save_fig(
+            fig, "raster", performance="auto", rasterize=RasterizeOptions(threshold=10_000, dpi=50)
+        )
+        plt.close(fig)
+        self.assertFalse(scatter.get_rasterized())
+        self.assertLess(
+            os.path.getsize(self.aqm.current_filepath + "_FIG_raster.pdf") * 10,
+            os.path.getsize(self.aqm.current_filepath + "_FIG_vector.pdf"),
+        )
+
+    def test_save_fig_performance_unknown(self):
+        with self.assertRaises(ValueError):
+            self.ad.save_fig(SimpleSaveFig(), performance="fast")  # type: ignore
+
+    def test_save_fig_inside_h5(self):
+        self.aqm.new_acquisition("inside_h5")
+        self.aqm.aq["x"] = 1
+        ad = AnalysisData(self.aqm.current_filepath, save_fig_inside_h5=True, save_fig_pickle=True)
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        ad.save_fig(fig, "h5")
+        ad.save_fig(fig)
+        plt.close(fig)
+        self.assertFalse(os.path.exists(self.aqm.current_filepath + "_FIG_h5.pdf"))
+
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False)
+        (stored,) = ad.open_figs("h5")
+        self.assertEqual((stored.name, stored.format), ("FIG_h5", "pdf"))
+        self.assertTrue(stored.data.startswith(b"%PDF"))
+        self.assertEqual(stored.matplotlib, matplotlib.__version__)
+        self.assertEqual(
+            repr(stored),
+            f"StoredFigure(name='FIG_h5', format='pdf', size={len(stored.data)} bytes)",
+        )
+        with h5py.File(self.aqm.current_filepath + ".h5", "r") as file:
+            self.assertEqual(file["figures/FIG_h5/pdf"].compression, "gzip")
+        (fig_copy,) = ad.open_figs("h5", allow_pickle=True)
+        np.testing.assert_array_equal(fig_copy.axes[0].lines[0].get_ydata(), [1, 2, 3])
+        self.assertNotIn("figures", ad.asdict())
+        self.assertEqual(len(ad.open_figs()), 2)
+        self.assertEqual(len(ad.open_figs(["FIG1", 1])), 2)
+        with self.assertRaises(KeyError):
+            ad.open_figs("unknown")
+
+    def test_save_fig_inside_h5_argument(self):
+        self.ad.save_fig(SimpleSaveFig("inside"), "in", inside_h5=True, pickle=True)  # type: ignore
+        self.assertFalse(os.path.exists(self.aqm.current_filepath + "_FIG_in.pdf"))
+        self.assertEqual(self.ad.open_figs("in")[0].data, b"inside")
+        self.assertEqual(self.ad.open_figs("in", allow_pickle=True)[0].internal_data, "inside")
+        filepath = self.ad.open_figs("in")[0].save(self.aqm.current_filepath + "_copy")
+        with open(filepath, encoding="utf-8") as file:
+            self.assertEqual(file.read(), "inside")
+
+    def test_save_fig_inside_h5_several_extensions(self):
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        self.ad.save_fig(fig, "both", extensions=("pdf", "png"), inside_h5=True)
+        plt.close(fig)
+        self.assertFalse(os.path.exists(self.aqm.current_filepath + "_FIG_both.png"))
+
+        (pdf,) = self.ad.open_figs("both")
+        self.assertEqual(pdf.format, "pdf")
+        self.assertTrue(pdf.data.startswith(b"%PDF"))
+        (png,) = self.ad.open_figs("both", extension="png")
+        self.assertEqual(png.format, "png")
+        self.assertTrue(png.data.startswith(b"\x89PNG"))
+        with self.assertRaises(KeyError):
+            self.ad.open_figs("both", extension="svg")
+
+    def test_save_fig_inside_h5_without_pickle(self):
+        self.ad.save_fig(SimpleSaveFig("inside"), "in", inside_h5=True)  # type: ignore
+        self.assertFalse(
+            h5_utils.has_key(self.aqm.current_filepath + ".h5", "figures/FIG_in/pickle")
+        )
+        (stored,) = self.ad.open_figs("in", allow_pickle=True)
+        self.assertEqual(stored.data, b"inside")
+
+    def test_open_figs_pickle_only(self):
+        key = "figures/FIG_old"
+        value = np.frombuffer(zlib.compress(pickle.dumps([1, 2])), dtype=np.uint8)
+        self.ad.unlock_data(key).update({key: value}).save()
+        with self.assertRaises(ValueError):
+            self.ad.open_figs("old")
+        self.assertEqual(self.ad.open_figs("old", allow_pickle=True), [[1, 2]])
+
+    def test_open_figs_pltsave_json(self):
+        key = "figures/FIG_json.pdf"
+        self.ad.unlock_data(key).update({key: "{}"}).save()
+        with self.assertRaises(ValueError):
+            self.ad.open_figs("json")
+
+    def test_save_fig_thumbnail(self):
+        for asynchronous in (False, True):
+            fig, ax = plt.subplots(figsize=(12, 4))
+            ax.plot([1, 2, 3])
+            self.ad.save_fig(fig, f"t{asynchronous}", thumbnail=True, asynchronous=asynchronous)
+            plt.close(fig)
+            self.assertTrue(self.ad.wait_figures(timeout=10))
+            thumbnail = plt.imread(f"{self.aqm.current_filepath}_FIG_t{asynchronous}_thumb.png")
+            self.assertAlmostEqual(thumbnail.shape[0] * thumbnail.shape[1], 320 * 240, delta=1000)
+
+    def test_save_fig_thumbnail_not_matplotlib(self):
+        self.ad.save_fig(SimpleSaveFig(), "nt", thumbnail=True)  # type: ignore
+        self.assertTrue(self.ad.wait_figures(timeout=10))
+        self.assertFalse(os.path.exists(f"{self.aqm.current_filepath}_FIG_nt_thumb.png"))
+
+    def test_save_fig_async(self):
+        fig = SimpleSaveFig()
+        future = self.ad.save_fig_async(fig, "a")  # type: ignore
+        fig.internal_data = "changed after save_fig"
+        future.result()
+        with open(self.aqm.current_filepath + "_FIG_a.pdf", encoding="utf-8") as file:
+            self.assertEqual(file.read(), "data")
+
+    def test_save_fig_async_mode(self):
+        ad = AnalysisData(self.aqm.current_filepath, save_fig_async=True)
+        ad.save_fig(SimpleSaveFig(), "b")  # type: ignore
+        self.assertTrue(ad.wait_figures(timeout=10))
+        self.assertTrue(os.path.exists(self.aqm.current_filepath + "_FIG_b.pdf"))
+
+    def test_save_fig_async_error(self):
+        future = self.ad.save_fig_async(SimpleSaveFigWithError(), "c")  # type: ignore
+        self.assertIsInstance(future.exception(), OSError)
+
+    def test_save_fig_async_matplotlib(self):
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        fignums = plt.get_fignums()
+        self.ad.save_fig_async(fig, "d").result()
+        plt.close(fig)
+        self.assertTrue(os.path.exists(self.aqm.current_filepath + "_FIG_d.pdf"))
+        self.assertEqual(plt.get_fignums(), [num for num in fignums if num != fig.number])
+
     @classmethod
     def tearDownClass(cls):
         """Remove tmp_test_data directory ones all test finished."""
@@ -142,6 +390,156 @@ class AnalysisDataTest(unittest.TestCase):
         return super().tearDownClass()
 
 
+class AnalysisDataLazyLoadingTest(unittest.TestCase):
+    """Test that AnalysisData loads only the keys that are used."""
+
+    experiment_name = "lazy_loading"
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition(self.experiment_name)
+        self.aqm.aq.update(x=np.arange(1000), y=np.arange(2000), z=np.arange(3000))
+        self.aqm.aq.loop = loop = AcquisitionLoop()
+        for i in loop(5):
+            loop.append(signal=i)
+
+    def test_keys_not_loaded(self):
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False)
+        self.assertIn("x", ad)
+        self.assertNotIn("x", ad.asdict())
+        self.assertNotIn("loop", ad.asdict())
+
+        self.assertEqual(ad.x[10], 10)
+        self.assertIn("x", ad.asdict())
+        self.assertNotIn("y", ad.asdict())
+
+    def test_loop_loaded_on_access(self):
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False)
+        self.assertIsInstance(ad.loop, AnalysisLoop)
+        self.assertEqual([d.signal for d in ad.loop], [0, 1, 2, 3, 4])
+
+    def test_loop_loaded_on_init(self):
+        ad = AnalysisData(self.aqm.current_filepath)
+        self.assertIsInstance(ad.asdict()["loop"], AnalysisLoop)
+
+    def test_cache_size(self):
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False, cache_size=40_000)
+        ad.get("x")
+        ad.get("y")
+        self.assertIn("x", ad.asdict())
+        ad.get("z")
+        self.assertNotIn("x", ad.asdict())
+        self.assertIn("z", ad.asdict())
+        self.assertEqual(ad.x[999], 999)
+
+    def test_cache_keeps_recently_used(self):
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False, cache_size=40_000)
+        ad.get("x")
+        ad.get("y")
+        ad.get("x")
+        ad.get("z")
+        self.assertIn("x", ad.asdict())
+        self.assertNotIn("y", ad.asdict())
+
+    def test_default_config_files_from_info(self):
+        self.aqm.aq["info"] = {"default_config_files": ["a.py", "b.py"], "logs": "..."}
+        ad = AnalysisData(self.aqm.current_filepath, open_on_init=False)
+        self.assertTupleEqual(ad.default_config_files, ("a.py", "b.py"))
+        self.assertNotIn("info", ad.asdict())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+class AnalysisDataPullTest(unittest.TestCase):
+    """Test that AnalysisData.pull reloads only the changed keys."""
+
+    experiment_name = "pull"
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition(self.experiment_name)
+        self.aqm.aq.update(x=np.arange(10), y=np.arange(20))
+        self.aqm.aq.loop = self.loop = AcquisitionLoop()
+        self.iterator = iter(self.loop(6))
+        for i in range(3):
+            next(self.iterator)
+            self.loop.append(signal=np.arange(4) * i)
+
+    def test_pull_changed_key(self):
+        ad = AnalysisData(self.aqm.current_filepath)
+        x = ad.asdict()["x"]
+        self.aqm.aq["y"] = np.ones(5)
+        ad.pull()
+        self.assertIs(ad.asdict()["x"], x)
+        self.assertNotIn("y", ad.asdict())
+        np.testing.assert_array_equal(ad.y, np.ones(5))
+
+    def test_save_opens_file_once(self):
+        opened_modes = []
+        h5py_file = h5py.File
+
+        def counting_file(name, mode="r", *args, **kwds):
+            opened_modes.append(mode)
+            return h5py_file(name, mode, *args, **kwds)
+
+        with mock.patch("h5py.File", counting_file):
+            self.aqm.aq["y"] = np.ones(5)
+        self.assertEqual(opened_modes, ["a"])
+        with h5py.File(self.aqm.current_filepath + ".h5", "r") as file:
+            self.assertEqual(file.attrs["__version__/y"], 2)
+
+    def test_pull_new_and_removed_keys(self):
+        ad = AnalysisData(self.aqm.current_filepath)
+        self.aqm.aq["z"] = 3
+        self.aqm.aq.pop("x")
+        ad.pull()
+        self.assertEqual(ad.z, 3)
+        self.assertNotIn("x", ad)
+        with self.assertRaises(ReadOnlyKeyError):
+            ad["z"] = 4
+
+    def test_pull_appended_loop(self):
+        ad = AnalysisData(self.aqm.current_filepath)
+        np.testing.assert_array_equal(ad.loop.signal[2], [0, 2, 4, 6])
+        for i in range(3, 6):
+            next(self.iterator)
+            self.loop.append(signal=np.arange(4) * i)
+        ad.pull()
+        np.testing.assert_array_equal(ad.loop.signal, np.arange(6)[:, None] * np.arange(4))
+
+    def test_pull_keeps_parsed_configs(self):
+        self.aqm.aq["configs"] = {"config.py": "a = 1"}
+        ad = AnalysisData(self.aqm.current_filepath)
+        self.assertEqual(ad.parse_config_file("config.py").a, 1)
+        self.aqm.aq["x"] = 1
+        ad.pull()
+        self.assertIn("config.py", ad._parsed_configs)  # pylint: disable=protected-access
+        self.aqm.aq["configs"] = {"config.py": "a = 2"}
+        ad.pull()
+        self.assertEqual(ad.parse_config_file("config.py").a, 2)
+
+    def test_pull_file_without_versions(self):
+        filepath = os.path.join(DATA_DIR, "pull_without_versions")
+        sd = DH5(filepath, "w", save_on_edit=True)
+        sd["x"] = 1
+        ad = AnalysisData(filepath)
+        sd["x"] = 2
+        ad.pull()
+        self.assertEqual(ad.x, 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
 class AnalysisDataParceTest(unittest.TestCase):
     """Test that AnalysisManagerTest should perform as dictionary."""
 
@@ -327,6 +725,13 @@ class AnalysisDataParceTest(unittest.TestCase):
         self.assertEqual(cfg["float"], 123.45)
         self.assertEqual(cfg.float, 123.45)  # type: ignore
 
+    def test_parse_config_shared_between_files(self):
+        self.ad.parse_config_file("config.txt")
+        misses = parsed_config_cache.cache_info().misses
+        other = AnalysisData(self.aqm.current_filepath)
+        self.compare_config(data=other.parse_config_file("config.txt"))
+        self.assertEqual(parsed_config_cache.cache_info().misses, misses)
+
     @classmethod
     def tearDownClass(cls):
         """Remove tmp_test_data directory ones all test finished."""
@@ -350,6 +755,11 @@ class SimpleSaveFig:
             file.write(self.internal_data)
 
 
+class SimpleSaveFigWithError(SimpleSaveFig):
+    def savefig(self, filepath: str):
+        raise OSError(f"Cannot write {filepath}")
+
+
 class SimpleSaveFigWithTightLayout(SimpleSaveFig):
     tighted_layout = False
 
@@ -0,0 +1,64 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_bulk")
+
+
+class LoadManyTest(unittest.TestCase):
+    """Test that keys of many files are read and stacked by run."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, catalog=True)
+        self.files = []
+        for i in range(4):
+            self.aqm.new_acquisition(f"run_{i}", cell="none")
+            self.aqm.aq["x"] = np.arange(5) * i
+            self.aqm.aq["loop"] = loop = AcquisitionLoop()
+            for j in loop(3):
+                loop.append(y=j + i)
+            self.files.append(str(self.aqm.current_filepath))
+
+    def test_stack(self):
+        for workers in (1, 3):
+            runs = self.aqm.load_many(self.files, keys=["x", "loop/y"], workers=workers)
+            self.assertEqual(runs.errors, {})
+            self.assertEqual(runs.data["x"].shape, (4, 5))
+            np.testing.assert_equal(runs.data["loop/y"][:, 0], np.arange(4))
+            self.assertEqual(runs.paths, [f + ".h5" for f in self.files])
+
+    def test_errors(self):
+        self.aqm.new_acquisition("run_other", cell="none")
+        self.aqm.aq["x"] = np.arange(6)
+        files = [*self.files, str(self.aqm.current_filepath), "missing_file"]
+        runs = self.aqm.load_many(files, keys="x")
+        self.assertEqual(len(runs.paths), 4)
+        self.assertEqual(len(runs.errors), 2)
+        self.assertIn("Shape", runs.errors[str(self.aqm.current_filepath) + ".h5"])
+
+    def test_missing_key_and_group(self):
+        runs = self.aqm.load_many(self.files[:2], keys=["loop"])
+        self.assertEqual(runs.paths, [])
+        self.assertIn("group", next(iter(runs.errors.values())))
+        runs = self.aqm.load_many(self.files[:2], keys=["z"])
+        self.assertIn("KeyError", next(iter(runs.errors.values())))
+
+    def test_query(self):
+        runs = self.aqm.load_many({"name": "^run_[12]$"}, keys=["x"], use_processes=True)
+        np.testing.assert_equal(runs.data["x"][:, 1], [1, 2])
+
+    def tearDown(self):
+        if self.aqm.catalog is not None:
+            self.aqm.catalog.close()
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
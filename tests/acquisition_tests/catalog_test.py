@@ -0,0 +1,106 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import AcquisitionManager, Catalog
+from labmate.acquisition.catalog import parse_filepath
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_catalog")
+CONFIG = os.path.join(TEST_DIR, "data/config.txt")
+
+
+class CatalogTest(unittest.TestCase):
+    """Test that the catalog follows the acquisitions and can be rebuilt."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, config_files=[CONFIG], catalog=True)
+        self.aqm.new_acquisition("rabi", cell="none")
+        self.aqm.save_acquisition(x=np.arange(10))
+        self.aqm.new_acquisition("t1", cell="none")
+
+    def test_updated_on_acquisition(self):
+        catalog = self.aqm.catalog
+        assert catalog is not None
+        self.assertEqual(len(catalog), 2)
+        record = catalog.get(self.aqm.current_filepath + ".h5")
+        assert record is not None
+        self.assertEqual(record.experiment_name, "t1")
+        self.assertFalse(record.useful)
+
+        self.aqm.save_acquisition(y=np.zeros((2, 3)))
+        record = catalog.get(self.aqm.current_filepath + ".h5")
+        assert record is not None
+        self.assertTrue(record.useful)
+        self.assertEqual(record.keys["y"], [2, 3])
+        self.assertEqual(list(record.config_hashes), ["config.txt"])
+
+    def test_query(self):
+        catalog = self.aqm.catalog
+        assert catalog is not None
+        self.assertEqual([r.experiment_name for r in catalog.query(name="^ra")], ["rabi"])
+        self.assertEqual([r.experiment_name for r in catalog.query(name="1$")], ["t1"])
+        self.assertEqual(len(catalog.query(name="^rabi|t1")), 2)
+        self.assertEqual([r.experiment_name for r in catalog.query(useful=True)], ["rabi"])
+        self.assertEqual(len(catalog.query(since="2000", until="3000")), 2)
+
+    def test_rebuild(self):
+        catalog = Catalog.from_data_directory(DATA_DIR)
+        catalog.remove(self.aqm.current_filepath + ".h5")
+        self.assertEqual(catalog.rebuild(workers=2), 1)
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog.rebuild(), 0)
+
+        os.remove(self.aqm.current_filepath + ".h5")
+        catalog.rebuild(workers=1)
+        self.assertEqual([r.experiment_name for r in catalog.query()], ["rabi"])
+
+    def test_params(self):
+        catalog = self.aqm.catalog
+        assert catalog is not None
+        params = catalog.get_params(self.aqm.current_filepath + ".h5")
+        self.assertEqual(params["int"], 123)
+        self.assertEqual(params["wrong_int"], "123 213")
+
+    def test_find(self):
+        config = os.path.join(DATA_DIR, "qubit.py")
+        for i, freq in enumerate((4e9, 6e9)):
+            with open(config, "w", encoding="utf-8") as file:
+                file.write(f"qubit_freq = {freq}\nreadout_power = -30\nmode = 'fast'")
+            self.aqm.set_config_file(config)
+            self.aqm.new_acquisition(f"rabi_{i}", cell="none")
+
+        found = self.aqm.find(name="^rabi", where={"qubit_freq": (">", 5e9)})
+        self.assertEqual([r.experiment_name for r in found], ["rabi_1"])
+        self.assertEqual(len(self.aqm.find(where={"readout_power": -30})), 2)
+        self.assertEqual(len(self.aqm.find(where={"readout_power": ("!=", -30)})), 0)
+        self.assertEqual(len(self.aqm.find(name="_0", where={"mode": "'fast'"})), 1)
+        self.assertEqual(
+            self.aqm.find(where={"qubit_freq": 6e9}, with_params=True)[0].params["qubit_freq"],
+            6e9,
+        )
+        with self.assertRaises(ValueError):
+            self.aqm.find(where={"qubit_freq": ("~", 1)})
+
+    def test_parse_filepath(self):
+        self.assertEqual(
+            parse_filepath("/d/exp/2024_01_02__03_04_05__exp__1.h5", "/d"),
+            ("exp", "2024_01_02__03_04_05"),
+        )
+        self.assertEqual(
+            parse_filepath("/other/2024_01_02__03_04_05__exp.h5", "/d"),
+            ("exp", "2024_01_02__03_04_05"),
+        )
+
+    def tearDown(self):
+        if self.aqm.catalog is not None:
+            self.aqm.catalog.close()
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import Catalog
+from labmate.acquisition_notebook import AcquisitionAnalysisManager
+from labmate.cli import main
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_cli")
+
+
+class CliTest(unittest.TestCase):
+    """Test the batch operations run from the command line."""
+
+    def setUp(self):
+        aqm = AcquisitionAnalysisManager(DATA_DIR, shell=None)
+        for i in range(2):
+            aqm.acquisition_cell(f"cli_{i}")
+            aqm.aq["x"] = np.arange(3) * i
+            aqm.save_acquisition()
+            aqm.analysis_cell(cell=f"aqm.analysis_cell()\nassert aqm.d.x[1] == 0, 'run {i}'\n")
+
+    def run_main(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = main(argv)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_reindex(self):
+        code, stdout, stderr = self.run_main("reindex", DATA_DIR, "--workers", "1")
+        self.assertEqual(code, 0)
+        self.assertIn("2 files read", stdout)
+        self.assertIn("[2/2]", stderr)
+        catalog = Catalog.from_data_directory(DATA_DIR)
+        self.assertEqual(len(catalog), 2)
+        catalog.close()
+
+    def test_reanalyse(self):
+        code, stdout, stderr = self.run_main("reanalyse", DATA_DIR, "-w", "1", "--name", "^cli")
+        self.assertEqual(code, 1)
+        self.assertIn("1 files analysed, 1 failed", stdout)
+        self.assertIn("AssertionError: run 1", stderr)
+
+    def test_reanalyse_code(self):
+        with open(os.path.join(DATA_DIR, "code.py"), "w", encoding="utf-8") as file:
+            file.write("aqm.analysis_cell()\n")
+        code, stdout, _ = self.run_main(
+            "reanalyze",
+            DATA_DIR,
+            "--all",
+            "-q",
+            "-w",
+            "1",
+            "--code",
+            os.path.join(DATA_DIR, "code.py"),
+        )
+        self.assertEqual(code, 0)
+        self.assertIn("2 files analysed", stdout)
+
+    def test_reanalyse_requires_selection(self):
+        code, stdout, stderr = self.run_main("reanalyse", DATA_DIR)
+        self.assertEqual(code, 2)
+        self.assertEqual(stdout, "")
+        self.assertIn("--all", stderr)
+        code, _, _ = self.run_main("reanalyse", DATA_DIR, "cli_0", "--all")
+        self.assertEqual(code, 2)
+
+    def test_repack(self):
+        code, stdout, stderr = self.run_main("repack", DATA_DIR, "-w", "1")
+        self.assertEqual(code, 0)
+        self.assertIn("0 failed", stdout)
+        self.assertIn("[2/2]", stderr)
+
+    def test_bench(self):
+        code, stdout, _ = self.run_main("bench", "--sizes", "100", "--repeat", "1")
+        self.assertEqual(code, 0)
+        self.assertIn("lines/s", stdout)
+
+    def tearDown(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import unittest
+
+import h5py
+
+from labmate.acquisition import AcquisitionManager, AnalysisData
+from labmate.acquisition.config_store import (
+    CONFIG_REFS_KEY,
+    CONFIG_STORE_DIRNAME,
+    ConfigStore,
+    inline_configs,
+)
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_store")
+CONFIG = os.path.join(TEST_DIR, "data/config.txt")
+
+
+class ConfigStoreTest(unittest.TestCase):
+    """Test that configs are kept once in the store and resolved by AnalysisData."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, config_files=[CONFIG], config_store=True)
+        self.aqm.new_acquisition("store", cell="none")
+        self.aqm.aq["x"] = 1
+
+    def read_raw_keys(self):
+        with h5py.File(self.aqm.current_filepath + ".h5", "r") as file:
+            return set(file.keys())
+
+    def test_only_refs_saved(self):
+        keys = self.read_raw_keys()
+        self.assertIn(CONFIG_REFS_KEY, keys)
+        self.assertNotIn("configs", keys)
+
+    def test_blob_saved_once(self):
+        self.aqm.new_acquisition("store", cell="none")
+        self.aqm.create_acquisition()
+        store = ConfigStore.from_data_directory(DATA_DIR)
+        self.assertEqual(len(os.listdir(store.directory)), 1)
+        with open(CONFIG, encoding="utf-8") as file:
+            self.assertEqual(store.get(self.aqm.aq[CONFIG_REFS_KEY]["config.txt"]), file.read())
+
+    def test_blob_mode(self):
+        store = ConfigStore.from_data_directory(DATA_DIR)
+        path = os.path.join(store.directory, store.put("a = 1"))
+        reference = os.path.join(DATA_DIR, "reference")
+        with open(reference, "w", encoding="utf-8"):
+            pass
+        self.assertEqual(os.stat(path).st_mode, os.stat(reference).st_mode)
+
+    def test_analysis_data_resolves(self):
+        for open_on_init in (False, True):
+            data = AnalysisData(self.aqm.current_filepath, open_on_init=open_on_init)
+            self.assertIn("configs", data)
+            self.assertEqual(data.parse_config_file("config.txt")["int"], 123)
+
+    def test_no_file_copies(self):
+        aqm = AcquisitionManager(
+            DATA_DIR, config_files=[CONFIG], config_store=True, save_files=True
+        )
+        aqm.new_acquisition("store_copies", cell="none")
+        aqm.save_acquisition(x=1)
+        self.assertFalse(os.path.exists(aqm.current_filepath + "_config.txt"))
+
+    def test_pull(self):
+        data = AnalysisData(self.aqm.current_filepath)
+        self.aqm.aq["y"] = 2
+        data.pull()
+        self.assertEqual(data.parse_config_file("config.txt")["int"], 123)
+        self.assertEqual(data["y"], 2)
+
+    def test_inline_configs(self):
+        filepath = self.aqm.current_filepath
+        inline_configs(filepath)
+        shutil.rmtree(os.path.join(DATA_DIR, CONFIG_STORE_DIRNAME))
+        self.assertIn("configs", self.read_raw_keys())
+        data = AnalysisData(filepath)
+        self.assertEqual(data.parse_config_file("config.txt")["int"], 123)
+
+    def tearDown(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from labmate.acquisition import AcquisitionManager, AnalysisData
+from labmate.acquisition.layout import find_existing, get_experiment_directory, reserve_filepath
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_layout")
+
+
+class DateLayoutTest(unittest.TestCase):
+    """Test that files are put in date directories and found in both layouts."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, layout="date", catalog=True)
+
+    def test_new_acquisition(self):
+        self.aqm.new_acquisition("sharded", cell="none")
+        self.aqm.aq["x"] = [1, 2, 3]
+        filepath = str(self.aqm.current_filepath)
+        name = os.path.basename(filepath)
+        year, month, day = name[:10].split("_")
+        self.assertEqual(filepath, os.path.join(DATA_DIR, "sharded", year, month, day, name))
+        self.assertEqual(get_experiment_directory(filepath), os.path.join(DATA_DIR, "sharded"))
+
+        self.assertEqual(self.aqm._get_full_filename(name), filepath)
+        flat_path = os.path.join(DATA_DIR, "sharded", name)
+        self.assertEqual(AnalysisData(flat_path)["x"], [1, 2, 3])
+        self.assertEqual([record.path for record in self.aqm.find("^sharded$")], [filepath + ".h5"])
+
+    def test_flat_files_are_found(self):
+        flat = AcquisitionManager(DATA_DIR)
+        flat.new_acquisition("flat", cell="none")
+        flat.aq["x"] = 1
+        filepath = str(flat.current_filepath)
+        self.assertEqual(os.path.dirname(filepath), os.path.join(DATA_DIR, "flat"))
+        self.assertEqual(self.aqm._get_full_filename(os.path.basename(filepath)), filepath)
+        self.assertEqual(find_existing(filepath), filepath)
+
+    def test_create_acquisition_unique(self):
+        self.aqm.new_acquisition("unique", cell="none")
+        filepaths = {str(self.aqm.create_acquisition("unique_item").filepath) for _ in range(3)}
+        self.assertEqual(len(filepaths), 3)
+
+    def test_reserve_filepath_concurrently(self):
+        filepath = os.path.join(DATA_DIR, "reserved", "2024_01_01__00_00_00__reserved")
+        with ThreadPoolExecutor(8) as executor:
+            reserved = list(executor.map(lambda _: str(reserve_filepath(filepath)), range(16)))
+        self.assertEqual(len(set(reserved)), 16)
+        self.assertTrue(all(os.path.exists(path + ".h5") for path in reserved))
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ValueError):
+            AcquisitionManager(DATA_DIR, layout="monthly")  # type: ignore
+
+    def tearDown(self):
+        if self.aqm.catalog is not None:
+            self.aqm.catalog.close()
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
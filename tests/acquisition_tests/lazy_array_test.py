@@ -0,0 +1,140 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager, AnalysisData, AnalysisLoop
+from labmate.acquisition.lazy_array import LazyArray, LazyReduction
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data")
+
+
+class LazyArrayTest(unittest.TestCase):
+    """Test that LazyArray gives the same results as numpy."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(size=(53, 7, 4))
+        self.y = rng.normal(size=(53, 7, 4)) + 1j * rng.normal(size=(53, 7, 4))
+        self.lx = LazyArray(self.x, chunk_size=5)
+        self.ly = LazyArray(self.y, chunk_size=5)
+
+    def test_shape(self):
+        self.assertEqual(self.lx.shape, self.x.shape)
+        self.assertEqual(len(self.lx), 53)
+        self.assertEqual(self.ly.dtype, self.y.dtype)
+
+    def test_elementwise(self):
+        result = np.abs(self.lx * 2 + self.ly) - 1
+        self.assertIsInstance(result, LazyArray)
+        np.testing.assert_allclose(result.compute(), np.abs(self.x * 2 + self.y) - 1)
+
+    def test_reduction_other_axis_is_lazy(self):
+        result = self.ly.mean(axis=-1)
+        self.assertIsInstance(result, LazyArray)
+        np.testing.assert_allclose(result.compute(), self.y.mean(axis=-1))
+
+    def test_reduction_first_axis(self):
+        for name in ("sum", "mean", "min", "max", "var", "std"):
+            result = getattr(self.lx, name)(axis=0)
+            self.assertIsInstance(result, LazyReduction)
+            np.testing.assert_allclose(result.compute(), getattr(self.x, name)(axis=0))
+
+    def test_reduction_all_axes(self):
+        np.testing.assert_allclose(self.lx.sum().compute(), self.x.sum())
+        np.testing.assert_allclose(self.ly.var(ddof=1).compute(), self.y.var(ddof=1))
+        np.testing.assert_allclose(np.sum(self.lx).compute(), self.x.sum())
+
+    def test_chained_pipeline(self):
+        ref = np.exp(-2j * np.pi * np.arange(4) / 4)
+        demodulated = (self.ly * ref).mean(axis=-1)
+        result = np.abs(demodulated).mean(axis=0)
+        np.testing.assert_allclose(
+            result.compute(workers=3), np.abs((self.y * ref).mean(axis=-1)).mean(axis=0)
+        )
+
+    def test_map_chunks(self):
+        result = self.lx.map_chunks(lambda chunk, y: chunk[..., :2] + y.real[..., :2], self.ly)
+        np.testing.assert_allclose(result.compute(), self.x[..., :2] + self.y.real[..., :2])
+
+    def test_aligned_numpy_array(self):
+        result = self.lx + self.x
+        np.testing.assert_allclose(result.compute(), 2 * self.x)
+
+    def test_broadcast_numpy_array(self):
+        square = LazyArray(np.ones((2, 2)), chunk_size=1) * np.array([1.0, 10.0])
+        np.testing.assert_allclose(square.compute(), [[1, 10], [1, 10]])
+        array = np.arange(16.0).reshape(4, 4)
+        result = LazyArray(array, chunk_size=2) * np.arange(4)
+        np.testing.assert_allclose(result.compute(), array * np.arange(4))
+
+    def test_getitem(self):
+        np.testing.assert_allclose(self.lx[3:40:3, 2].compute(), self.x[3:40:3, 2])
+        np.testing.assert_allclose(self.lx[..., 1].compute(), self.x[..., 1])
+        np.testing.assert_allclose(self.lx[5], self.x[5])
+        np.testing.assert_allclose(self.lx[-53], self.x[-53])
+        with self.assertRaises(IndexError):
+            self.lx[53]  # pylint: disable=W0104
+        with self.assertRaises(IndexError):
+            self.lx[-54]  # pylint: disable=W0104
+
+    def test_numpy_functions(self):
+        np.testing.assert_allclose(np.mean(self.lx, axis=0), self.x.mean(axis=0))
+        np.testing.assert_allclose(np.std(self.ly), self.y.std())
+        np.testing.assert_allclose(np.var(self.lx, ddof=1), self.x.var(ddof=1))
+        np.testing.assert_allclose(np.sum(self.lx, axis=(0, 2)), self.x.sum(axis=(0, 2)))
+        np.testing.assert_allclose(np.max(self.lx), self.x.max())
+
+    def test_reduction_keepdims_and_dtype(self):
+        result = self.lx.mean(axis=0, keepdims=True).compute()
+        np.testing.assert_allclose(result, self.x.mean(axis=0, keepdims=True))
+        np.testing.assert_allclose(np.min(self.lx, keepdims=True), self.x.min(keepdims=True))
+        np.testing.assert_allclose(self.lx.sum(axis=1, keepdims=True), self.x.sum(1, keepdims=True))
+        integers = LazyArray(np.arange(10, dtype=np.int8) * 10, chunk_size=3)
+        self.assertEqual(integers.sum(dtype=np.int64).compute(), 450)
+        self.assertEqual(integers.sum(dtype=np.int64).compute().dtype, np.int64)
+
+    def test_different_length(self):
+        with self.assertRaises(ValueError):
+            self.lx + LazyArray(self.x[:10])  # pylint: disable=W0104
+
+    def test_single_worker(self):
+        np.testing.assert_allclose((self.lx**2).compute(workers=1), self.x**2)
+
+
+class LazyAnalysisDataTest(unittest.TestCase):
+    """Test lazy arrays created from AnalysisData and AnalysisLoop."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition("lazy")
+        self.aqm.aq.loop = loop = AcquisitionLoop()
+        for i in loop(10):
+            loop.append(signal=np.arange(5) * i)
+        self.aqm.aq["x"] = np.arange(10)
+        self.ad = AnalysisData(self.aqm.current_filepath)
+
+    def test_analysis_loop_lazy(self):
+        loop = self.ad.loop
+        self.assertIsInstance(loop, AnalysisLoop)
+        result = loop.lazy("signal", chunk_size=3).mean(axis=0).compute()
+        np.testing.assert_allclose(result, np.arange(5) * 4.5)
+
+    def test_analysis_data_lazy_from_file(self):
+        signal = self.ad.lazy("loop/signal", chunk_size=4)
+        np.testing.assert_allclose((signal * 2).compute(), self.ad.loop.signal * 2)
+        np.testing.assert_allclose(self.ad.lazy(("x",)).sum().compute(), 45)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+from dh5 import DH5
+
+from labmate.acquisition_notebook import AcquisitionAnalysisManager
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_reanalysis")
+
+ANALYSIS_CELL = """\
+aqm.analysis_cell()
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+ax.plot(aqm.d.x, scale * aqm.d.x)
+aqm.save_fig(fig, name="plot")
+"""
+
+
+class ReanalysisTest(unittest.TestCase):
+    """Test that saved analysis cells are run again on many files."""
+
+    def setUp(self):
+        self.aqm = AcquisitionAnalysisManager(DATA_DIR, shell=None, catalog=True)
+        self.files = []
+        for i in range(3):
+            self.aqm.acquisition_cell(f"reanalysis_{i}")
+            self.aqm.aq["x"] = np.arange(5) * i
+            self.aqm.save_acquisition()
+            self.aqm.analysis_cell(cell=ANALYSIS_CELL)
+            self.files.append(str(self.aqm.current_filepath))
+        for experiment in ("reanalysis_0", "reanalysis_1", "reanalysis_2"):
+            with open(os.path.join(DATA_DIR, experiment, "init_analyse.py"), "w") as file:
+                file.write("scale = 2\n")
+
+    def test_stored_cell(self):
+        results = self.aqm.reanalyse(self.files, workers=2)
+        self.assertEqual([result.error for result in results], [None] * 3)
+        self.assertEqual([result.filepath for result in results], [f + ".h5" for f in self.files])
+        for filepath, result in zip(self.files, results):
+            self.assertEqual(result.figures, [filepath + "_FIG_plot.pdf"])
+
+        results = self.aqm.reanalyse(self.files, workers=1)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual([result.figures for result in results], [[]] * 3)  # unchanged
+
+    def test_override_code_and_errors(self):
+        reported = []
+        code = "aqm.analysis_cell()\nassert aqm.d.x[1] < 2, 'too big'\n"
+        results = self.aqm.reanalyse(self.files, code=code, workers=1, progress=reported.append)
+        self.assertEqual(len(reported), 3)
+        self.assertTrue(results[0].ok and results[1].ok)
+        self.assertIn("too big", results[2].error)
+        cells = DH5(self.files[0])["analysis_cells"]
+        self.assertEqual(cells["default"], ANALYSIS_CELL)
+        self.assertEqual(cells["reanalysis"], code)
+
+    def test_figures_of_caller_are_kept(self):
+        import matplotlib.pyplot as plt
+
+        fig = plt.figure()
+        try:
+            results = self.aqm.reanalyse(self.files[:1], workers=1)
+            self.assertTrue(results[0].ok)
+            self.assertIn(fig.number, plt.get_fignums())
+        finally:
+            plt.close(fig)
+
+    def test_query(self):
+        results = self.aqm.reanalyse({"name": "^reanalysis_[12]$"}, workers=1)
+        self.assertEqual(
+            [result.filepath for result in results], [f + ".h5" for f in self.files[1:]]
+        )
+
+    def tearDown(self):
+        if self.aqm.catalog is not None:
+            self.aqm.catalog.close()
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+from dh5 import DH5
+
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager, repack_directory, repack_file
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_repack")
+
+
+class RepackTest(unittest.TestCase):
+    """Test that files are rewritten without dead space and with the same data."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, save_on_edit=True)
+        self.aqm.new_acquisition("repack", cell="none")
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(100):
+            loop.append(y=np.full(100, i, dtype=float), z=i)
+        for i in range(5):
+            self.aqm.aq["x"] = np.zeros(20_000) + i
+        self.aqm.aq["info"] = {"name": "abc", "values": [1, 2, 3]}
+        self.aqm.save_acquisition()
+        self.filepath = str(self.aqm.current_filepath) + ".h5"
+
+    def test_repack(self):
+        before = DH5(self.filepath)
+        size = os.path.getsize(self.filepath)
+        result = repack_file(self.filepath)
+        self.assertTrue(result.ok, result.error)
+        self.assertTrue(result.replaced)
+        self.assertEqual(result.size_before, size)
+        self.assertLess(result.size_after, size / 2)
+        self.assertEqual(os.path.getsize(self.filepath), result.size_after)
+
+        after = DH5(self.filepath)
+        self.assertEqual(set(after.keys()), set(before.keys()))
+        np.testing.assert_equal(after["x"], before["x"])
+        np.testing.assert_equal(after["loop"]["y"], before["loop"]["y"])
+        self.assertEqual(after["info"]["name"], "abc")
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.filepath)), [os.path.basename(self.filepath)]
+        )
+
+    def test_repack_keeps_mode(self):
+        os.chmod(self.filepath, 0o664)
+        result = repack_file(self.filepath)
+        self.assertTrue(result.replaced)
+        self.assertEqual(os.stat(self.filepath).st_mode & 0o777, 0o664)
+
+    def test_repack_twice_keeps_file(self):
+        repack_file(self.filepath)
+        result = repack_file(self.filepath)
+        self.assertTrue(result.ok)
+        self.assertFalse(result.replaced)
+
+    def test_locked_file(self):
+        lock = self.filepath[: -len(".h5")] + ".lock"
+        with open(lock, "w", encoding="utf-8"):
+            pass
+        result = repack_file(self.filepath, retries=1)
+        os.remove(lock)
+        self.assertFalse(result.replaced)
+        self.assertIn("FileLockedError", result.error)
+
+    def test_directory(self):
+        self.aqm.new_acquisition("repack_other", cell="none")
+        self.aqm.aq["x"] = np.zeros(20_000)
+        self.aqm.aq["x"] = np.ones(20_000)
+        reported = []
+        results = repack_directory(DATA_DIR, workers=2, progress=reported.append)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(reported), 2)
+        self.assertTrue(all(result.ok and result.replaced for result in results))
+
+    def tearDown(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
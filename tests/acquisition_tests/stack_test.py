@@ -0,0 +1,91 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import AcquisitionManager
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data_stack")
+
+
+class StackTest(unittest.TestCase):
+    """Test that one key of many files is stacked without loading the files."""
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, catalog=True)
+        self.files = []
+        for i in range(3):
+            self.aqm.new_acquisition(f"stack_{i}", cell="none")
+            self.aqm.aq["x"] = np.arange(5) * i
+            self.files.append(str(self.aqm.current_filepath))
+
+    def test_virtual(self):
+        with self.aqm.stack("x", self.files) as stacked:
+            self.assertTrue(stacked.virtual)
+            self.assertEqual(stacked.shape, (3, 5))
+            self.assertEqual(stacked.errors, {})
+            np.testing.assert_equal(stacked[:, 1], [0, 1, 2])
+            np.testing.assert_equal(np.asarray(stacked), np.arange(3)[:, None] * np.arange(5))
+            np.testing.assert_equal(stacked.lazy().sum(axis=0).compute(), np.arange(5) * 3)
+
+    def test_padded(self):
+        self.aqm.new_acquisition("stack_long", cell="none")
+        self.aqm.aq["x"] = np.arange(7)
+        files = [*self.files, str(self.aqm.current_filepath), "missing_file"]
+        with self.aqm.stack("x", files) as stacked:
+            self.assertFalse(stacked.virtual)
+            self.assertEqual(stacked.shape, (4, 7))
+            self.assertEqual(len(stacked.errors), 1)
+            np.testing.assert_equal(stacked[1], [0, 1, 2, 3, 4, np.nan, np.nan])
+            np.testing.assert_equal(stacked[3], np.arange(7))
+
+    def test_cache_reused_until_modified(self):
+        first = self.aqm.stack("x", self.files)
+        self.assertEqual(self.aqm.stack("x", self.files).filename, first.filename)
+        os.utime(self.files[0] + ".h5", ns=(0, 0))
+        self.assertNotEqual(self.aqm.stack("x", self.files).filename, first.filename)
+
+    def test_old_entries_removed(self):
+        cache = os.path.join(DATA_DIR, ".stack_cache")
+        first = self.aqm.stack("x", self.files)
+        first.close()
+        os.utime(self.files[0] + ".h5", ns=(0, 0))
+        second = self.aqm.stack("x", self.files)
+        second.close()
+        self.assertEqual(os.listdir(cache), [second.filename.name])
+
+        other = self.aqm.stack("x", self.files[:2])
+        other.close()
+        self.assertEqual(len(os.listdir(cache)), 2)
+
+    def test_cache_size_limit(self):
+        cache = os.path.join(DATA_DIR, ".stack_cache")
+        self.aqm.new_acquisition("stack_long", cell="none")
+        self.aqm.aq["x"] = np.arange(7)
+        long_file = str(self.aqm.current_filepath)
+        for files in ([*self.files, long_file], [*self.files[1:], long_file]):
+            with self.aqm.stack("x", files, max_cache_size=1) as stacked:
+                self.assertFalse(stacked.virtual)
+                self.assertEqual(os.listdir(cache), [stacked.filename.name])
+
+    def test_query(self):
+        stacked = self.aqm.stack("x", {"name": "^stack_[12]$"})
+        np.testing.assert_equal(stacked[:, 1], [1, 2])
+        stacked.close()
+
+    def test_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.aqm.stack("z", self.files)
+
+    def tearDown(self):
+        if self.aqm.catalog is not None:
+            self.aqm.catalog.close()
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import unittest
+
+from labmate.parsing import parse_str
+from labmate.parsing.cache import ParsedConfigCache
+
+
+TEST_DIR = os.path.dirname(__file__)
+CACHE_DIR = os.path.join(TEST_DIR, "tmp_parse_cache")
+
+CONFIG = """
+a = 1
+b = a  # value: 1
+c = [1,
+     2]
+"""
+
+
+class ParsedConfigCacheTest(unittest.TestCase):
+    """Test that configs are parsed once per content."""
+
+    def setUp(self):
+        self.cache = ParsedConfigCache(maxsize=2)
+
+    def test_same_as_parse_str(self):
+        parsed = self.cache.parse(CONFIG)
+        self.assertEqual(
+            {k: v.unpack() for k, v in parsed.items()},
+            {k: v.unpack() for k, v in parse_str(CONFIG).items()},
+        )
+
+    def test_hits(self):
+        self.cache.parse(CONFIG)
+        self.cache.parse(CONFIG)
+        info = self.cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_returns_copy(self):
+        self.cache.parse(CONFIG)["new"] = 1
+        self.assertNotIn("new", self.cache.parse(CONFIG))
+
+    def test_lru(self):
+        for content in ("a = 1", "a = 2", "a = 3"):
+            self.cache.parse(content)
+        self.assertEqual(self.cache.cache_info().currsize, 2)
+        self.cache.parse("a = 1")
+        self.assertEqual(self.cache.cache_info().misses, 4)
+
+    def test_disk_cache(self):
+        self.cache.set_disk_cache(CACHE_DIR)
+        self.cache.parse(CONFIG)
+        other = ParsedConfigCache(disk_cache=CACHE_DIR)
+        self.assertEqual(other.parse(CONFIG)["b"], 1)
+        info = other.cache_info()
+        self.assertEqual((info.disk_hits, info.misses), (1, 0))
+
+    def tearDown(self):
+        if os.path.exists(CACHE_DIR):
+            shutil.rmtree(CACHE_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
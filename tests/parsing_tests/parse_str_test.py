@@ -0,0 +1,70 @@
+import unittest
+
+from labmate.benchmarks.parsing import generate_config
+from labmate.parsing import parse_str
+from labmate.parsing.lexer import iter_statements
+
+
+class ParseStrTest(unittest.TestCase):
+    """Test parse_str on the constructions met in config files."""
+
+    def parse(self, text):
+        return {key: value.unpack() for key, value in parse_str(text).items()}
+
+    def test_simple(self):
+        self.assertEqual(self.parse("a = 1\nb = a  # value: 1"), {"a": (1, 1), "b": ("a", 1)})
+
+    def test_skipped_lines(self):
+        text = "# a = 1\n    b = 2\nfor i in range(10):\nc == 3\n_d = 4\n"
+        self.assertEqual(self.parse(text), {})
+
+    def test_comment(self):
+        self.assertEqual(self.parse("a = 123 # comment = 5"), {"a": (123, 123)})
+
+    def test_hash_inside_string(self):
+        self.assertEqual(self.parse("a = 'b # c'  # d"), {"a": ("'b # c'", "'b # c'")})
+
+    def test_keyword_arguments(self):
+        self.assertEqual(self.parse("a = dict(x=1)"), {"a": ("dict(x=1)", "dict(x=1)")})
+
+    def test_brackets_inside_string(self):
+        text = "a = '('\nb = 2"
+        self.assertEqual(self.parse(text), {"a": ("'('", "'('"), "b": (2, 2)})
+
+    def test_multiline(self):
+        text = 'a = {\n    "1": "{",  # comment\n    "2": 2,\n}\nb = 1'
+        self.assertEqual(self.parse(text), {"a": ('{"1": "{",\n"2": 2,\n}',) * 2, "b": (1, 1)})
+
+    def test_multiline_annotation(self):
+        text = "a = [\n  b,\n]  # value: [2]"
+        self.assertEqual(self.parse(text)["a"], ("[b,\n]", "[2]"))
+
+    def test_multiline_string(self):
+        text = 'a = """\n(\nb = 1\n"""\nc = 2'
+        self.assertEqual(list(self.parse(text)), ["a", "c"])
+
+    def test_indented_multiline_string(self):
+        text = 's = """first\n    indented\nlast"""  # comment\nb = 1'
+        parsed = parse_str(text)
+        self.assertEqual(parsed["s"].original, '"""first\n    indented\nlast"""')
+        self.assertEqual(parsed["b"], 1)
+
+    def test_call_with_keywords_on_several_lines(self):
+        text = "f(\nx=1,\n)\ny = 2"
+        self.assertEqual(self.parse(text), {"y": (2, 2)})
+
+    def test_spans(self):
+        text = "a = 1\nb = [\n1,\n]\nc = 3"
+        spans = [(st.param, st.start, st.end) for st in iter_statements(text)]
+        self.assertEqual(spans, [("a", 0, 0), ("b", 1, 3), ("c", 4, 4)])
+
+    def test_generated_config(self):
+        parsed = parse_str(generate_config(100))
+        self.assertEqual(parsed["param_3_link"], 3)
+        self.assertEqual(parsed["param_3_str"].original, "'text # not a comment ( = 3'")
+        self.assertEqual(parsed["param_3_call"].original, "dict(x=3, y=[1, 2])")
+        self.assertNotIn("commented_3", parsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import types
+import unittest
+
+from labmate.parsing import parse_str
+from labmate.parsing.saving import _annotate, append_values_from_module_to_file
+
+
+BODY = """a = 1
+b = a
+c = f'{a}'
+d = (
+    a * 2.5
+)  # comment
+e = [a]
+s = 'x'
+"""
+
+
+class AppendValuesTest(unittest.TestCase):
+    """Test that values of the module are appended to the file."""
+
+    def setUp(self):
+        self.module = types.ModuleType("config")
+        self.module.__dict__.update(a=1, b=1, c="1", d=2.5, e=[1], s="x")
+
+    def test_append(self):
+        result = append_values_from_module_to_file(BODY, self.module)
+        lines = result.split("\n")
+        self.assertEqual(lines[0], "a = 1")
+        self.assertEqual(lines[1], "b = a  # value: 1")
+        self.assertEqual(lines[2], "c = f'{a}'  # value: 1")
+        self.assertEqual(lines[3], "d = (")
+        self.assertEqual(lines[5], ")  # comment  # value: 2.5")
+        self.assertEqual(lines[6], "e = [a]")
+        self.assertEqual(lines[7], "s = 'x'")
+
+    def test_parse_appended(self):
+        parsed = parse_str(append_values_from_module_to_file(BODY, self.module))
+        self.assertEqual(parsed["b"], 1)
+        self.assertEqual(parsed["d"], 2.5)
+        self.assertEqual(parsed["d"].original, "(a * 2.5\n)")
+
+    def test_cache(self):
+        first = append_values_from_module_to_file(BODY, self.module)
+        hits = _annotate.cache_info().hits
+        self.assertEqual(append_values_from_module_to_file(BODY, self.module), first)
+        self.assertEqual(_annotate.cache_info().hits, hits + 1)
+
+        self.module.b = 2
+        self.assertIn("b = a  # value: 2", append_values_from_module_to_file(BODY, self.module))
+
+
+if __name__ == "__main__":
+    unittest.main()
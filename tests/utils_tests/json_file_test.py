@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import threading
+import unittest
+
+from dh5 import jsn
+
+from labmate.utils.json_file import FileLock, JsonFile
+
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_json_file")
+
+
+class JsonFileTest(unittest.TestCase):
+    """Test atomic writes, locking and caching of a shared json file."""
+
+    def setUp(self):
+        self.filepath = os.path.join(DATA_DIR, "temp.json")
+        self.file = JsonFile(self.filepath)
+
+    def test_read_write(self):
+        self.assertIsNone(self.file.read())
+        data = {"experiment_name": "abc", "configs": {"a.py": "a = 1"}, "value": 1.5}
+        self.file.write(data)
+        self.assertEqual(self.file.read(), data)
+        self.assertEqual(jsn.read(self.filepath), data)
+        self.assertEqual(sorted(os.listdir(DATA_DIR)), ["temp.json", "temp.json.lock"])
+
+    def test_mode(self):
+        self.file.write({"a": 1})
+        reference = os.path.join(DATA_DIR, "reference")
+        with open(reference, "w", encoding="utf-8"):
+            pass
+        self.assertEqual(os.stat(self.filepath).st_mode, os.stat(reference).st_mode)
+        os.remove(reference)
+        os.chmod(self.filepath, 0o664)
+        self.file.write({"a": 2})
+        self.assertEqual(os.stat(self.filepath).st_mode & 0o777, 0o664)
+
+    def test_cached_while_unchanged(self):
+        JsonFile(self.filepath).write({"a": 1})
+        for _ in range(3):
+            self.assertEqual(self.file.read(), {"a": 1})
+        self.assertEqual(self.file.reads, 1)
+
+        JsonFile(self.filepath).write({"a": 2})  # same size, maybe the same mtime
+        self.assertEqual(self.file.read(), {"a": 2})
+        self.assertEqual(self.file.reads, 2)
+
+    def test_concurrent_writes_are_never_torn(self):
+        contents = [{"configs": {"file.py": str(i) * 10_000}} for i in range(2)]
+        errors = []
+
+        def write(content):
+            writer = JsonFile(self.filepath)
+            for _ in range(30):
+                writer.write(content)
+
+        def read():
+            for _ in range(100):
+                try:
+                    with open(self.filepath, encoding="utf-8") as file:
+                        data = json.load(file)
+                    self.assertIn(data, contents)
+                except FileNotFoundError:
+                    pass
+                except Exception as error:  # pylint: disable=broad-except
+                    errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(content,)) for content in contents]
+        threads.append(threading.Thread(target=read))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIn(self.file.read(), contents)
+
+    def test_lock_timeout(self):
+        lock_filepath = os.path.join(DATA_DIR, "file.lock")
+        with FileLock(lock_filepath):
+            self.assertRaises(TimeoutError, FileLock(lock_filepath, timeout=0.05).__enter__)
+        with FileLock(lock_filepath, shared=True), FileLock(lock_filepath, shared=True):
+            pass
+
+    def tearDown(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()